@@ -0,0 +1,16 @@
+""" Package with tools which measure the performance of server and client
+
+    Modules
+    -------
+    load.py
+        Drives a server with many simulated clients and reports 
+        throughput and latencies of commands
+    micro.py
+        Microbenchmarks of the framing and handler hot paths, checked
+        against baselines stored in `baselines/micro.json`
+    logging_bench.py
+        Measures the cost of one log record for the logging thread
+    socket_latency.py
+        Compares round-trip latencies of small commands over plain and
+        tuned sockets
+"""
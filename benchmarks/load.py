@@ -0,0 +1,433 @@
+""" Load generator and end-to-end benchmark of the server.
+
+    The module starts `server.server.Server` in a separate process on
+    localhost, connects many simulated clients to it (all of them run on
+    one asyncio event loop through `client.aio.AsyncClient`) and drives
+    a mixed workload of commands for a given time. Reported results are
+    throughput, p50/p99/p999 latencies and errors per command, messages
+    delivered through the push channel, and CPU/RSS of the server
+    process.
+
+    Run from the root directory, e.g.:
+        python -m benchmarks.load --clients 50 --duration 10 \
+            --mix lu=2,lf=1,send=4,read=2,write=1 --output new.json \
+            --compare old.json
+
+    Used built-in modules
+    ---------------------
+    os, sys, json, time, random, socket, shutil, asyncio, argparse,
+    tempfile, threading, subprocess
+
+    Used custom modules
+    -------------------
+    client.aio
+
+    Defined classes
+    ---------------
+    ServerProcess
+        Runs the server in a separate process and samples its usage
+    Recorder
+        Collects latencies and errors of executed commands
+
+    Defined functions
+    -----------------
+    percentile(values: list[float], q: float) -> float
+        Returns the `q` percentile of sorted `values`
+    run_benchmark(args) -> dict
+        Runs the whole benchmark and returns its results
+    compare(results: dict, baseline: dict) -> str
+        Describes how `results` differ from `baseline`
+    main()
+        Parses command line options and runs the benchmark
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from threading import Thread, Event
+
+from client.aio import AsyncClient, ServerError
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_CODE = "from server.server import Server; " \
+    "Server({ip!r}, {port1}, {port2}, **{settings!r}).start()"
+DEFAULT_MIX = "lu=2,lf=1,send=4,read=2,write=1"
+DEFAULT_FILE_SIZES = "1024,65536,1048576"
+SAMPLE_INTERVAL = 0.5    # Seconds between samples of server's CPU and RSS
+WRITE_FILES = 4          # Number of distinct files every client writes
+
+
+def percentile(values: list[float], q: float) -> float:
+    """ Returns the `q` percentile (0 < q <= 100) of sorted `values`
+        using the nearest-rank method.
+    """
+    if not values:
+        return 0.0
+    rank = max(int(len(values) * q / 100 + 0.5), 1)
+    return values[min(rank, len(values)) - 1]
+
+
+class ServerProcess:
+    """ Runs the server in a separate process and samples its usage.
+
+        The server works in a temporary directory, which contains the
+        `server` folder seeded with files for READ commands.
+
+        Object attributes
+        -----------------
+        ip : str
+            IP address the server binds to
+        port1 : int
+            Port for commands
+        port2 : int
+            Port for pushed messages
+        files : dict[str, int]
+            Names and sizes of files created before the server starts
+        settings : dict
+            Keyword arguments of `Server`, e.g. {"tcp_nodelay": False}
+        workdir : str | None
+            The temporary working directory of the server
+        proc : subprocess.Popen | None
+            The server process
+        samples : list[tuple[float, float, int]]
+            (time, cpu seconds, rss bytes) samples of the server process
+
+        Methods
+        -------
+        start(self)
+            Starts the server and waits until it accepts connections
+        stop(self)
+            Stops the server and returns its resource usage
+    """
+    def __init__(self, ip: str, port1: int, port2: int,
+                 files: dict[str, int], settings: dict | None = None):
+        self.ip = ip
+        self.port1 = port1
+        self.port2 = port2
+        self.files = files
+        self.settings = settings or {}
+        self.workdir: str | None = None
+        self.proc: subprocess.Popen | None = None
+        self.samples: list[tuple[float, float, int]] = []
+        self._stop_sampling = Event()
+        self._sampler: Thread | None = None
+
+    def start(self) -> None:
+        """ Starts the server and waits until it accepts connections.
+        """
+        self.workdir = tempfile.mkdtemp(prefix="bench_server_")
+        os.mkdir(os.path.join(self.workdir, "server"))
+        for name, size in self.files.items():
+            with open(os.path.join(self.workdir, "server", name), "w") as f:
+                f.write("x" * size)
+        env = dict(os.environ)
+        env["PYTHONPATH"] = ROOT_DIR + os.pathsep + env.get("PYTHONPATH", "")
+        code = SERVER_CODE.format(ip=self.ip, port1=self.port1,
+                                  port2=self.port2, settings=self.settings)
+        self.proc = subprocess.Popen(
+            [sys.executable, "-c", code], cwd=self.workdir, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection((self.ip, self.port1), 0.2).close()
+                break
+            except OSError:
+                if self.proc.poll() is not None:
+                    raise RuntimeError("Server process exited on start")
+                time.sleep(0.05)
+        else:
+            raise RuntimeError("Server didn't start in time")
+        self._sampler = Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def _read_usage(self) -> tuple[float, int] | None:
+        """ Returns (cpu seconds, rss bytes) of the server process, read
+            from /proc, or None where /proc is not available.
+        """
+        try:
+            with open(f"/proc/{self.proc.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu = (int(fields[11]) + int(fields[12])) / \
+                os.sysconf("SC_CLK_TCK")
+            rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+            return cpu, rss
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def _sample(self) -> None:
+        while not self._stop_sampling.is_set():
+            usage = self._read_usage()
+            if usage is None:
+                return
+            self.samples.append((time.monotonic(), *usage))
+            self._stop_sampling.wait(SAMPLE_INTERVAL)
+
+    def stop(self) -> dict:
+        """ Stops the server and returns its resource usage.
+
+            Returns
+            -------
+            dict
+                CPU time, average CPU utilisation and peak/last RSS of
+                the server, empty if usage couldn't be sampled
+        """
+        usage = self._read_usage()
+        if usage is not None:
+            self.samples.append((time.monotonic(), *usage))
+        self._stop_sampling.set()
+        if self.proc is not None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        if self.workdir is not None:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+        if len(self.samples) < 2:
+            return {}
+        (t0, cpu0, _), (t1, cpu1, rss1) = self.samples[0], self.samples[-1]
+        return {
+            "cpu_seconds": round(cpu1 - cpu0, 3),
+            "cpu_percent": round(100 * (cpu1 - cpu0) / max(t1 - t0, 1e-9), 1),
+            "rss_peak_bytes": max(rss for _, _, rss in self.samples),
+            "rss_last_bytes": rss1,
+        }
+
+
+class Recorder:
+    """ Collects latencies and errors of executed commands.
+
+        Object attributes
+        -----------------
+        latencies : dict[str, list[float]]
+            Latencies of successful commands in seconds by command
+        errors : dict[str, int]
+            Number of failed commands by command
+    """
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    def record(self, command: str, seconds: float, ok: bool) -> None:
+        """ Records one executed command.
+        """
+        if ok:
+            self.latencies.setdefault(command, []).append(seconds)
+        else:
+            self.errors[command] = self.errors.get(command, 0) + 1
+
+    def summary(self, duration: float) -> dict:
+        """ Returns count, throughput and latency percentiles (in
+            milliseconds) of every command.
+        """
+        result = {}
+        for command in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies.get(command, []))
+            result[command] = {
+                "count": len(values),
+                "errors": self.errors.get(command, 0),
+                "ops_per_sec": round(len(values) / duration, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+                "p999_ms": round(percentile(values, 99.9) * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+            }
+        return result
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    """ Parses `lu=2,send=4` into {"lu": 2.0, "send": 4.0}.
+    """
+    weights = {}
+    for item in mix.split(","):
+        command, _, weight = item.partition("=")
+        if command not in ("lu", "lf", "send", "read", "write"):
+            raise ValueError(f"Unknown command in mix: {command}")
+        weights[command] = float(weight or 1)
+    return weights
+
+
+async def timed(recorder: Recorder, command: str, coro) -> bool:
+    """ Awaits `coro` and records its latency under `command`.
+    """
+    started = time.perf_counter()
+    try:
+        await coro
+        ok = True
+    except (ServerError, ConnectionError, asyncio.IncompleteReadError):
+        ok = False
+    recorder.record(command, time.perf_counter() - started, ok)
+    return ok
+
+
+async def consume_messages(client: AsyncClient, counter: list[int]) -> None:
+    """ Counts messages delivered to `client` until it disconnects.
+    """
+    async for _ in client.messages():
+        counter[0] += 1
+
+
+async def client_loop(client: AsyncClient, index: int, usernames: list[str],
+                      read_files: list[str], sizes: list[int],
+                      weights: dict[str, float], deadline: float,
+                      think_time: float, recorder: Recorder) -> None:
+    """ Executes random commands of the mix until `deadline`.
+    """
+    rng = random.Random(index)
+    commands, command_weights = list(weights), list(weights.values())
+    others = [name for name in usernames if name != client.username]
+    written = 0
+    while time.perf_counter() < deadline:
+        command = rng.choices(commands, command_weights)[0]
+        match command:
+            case "lu":
+                coro = client.lu()
+            case "lf":
+                coro = client.lf()
+            case "send":
+                coro = client.send(rng.choice(others) if others else
+                                   client.username, f"\"msg {written}\"")
+            case "read":
+                coro = client.read(rng.choice(read_files))
+            case "write":
+                # A few names per client keep LF replies small #
+                written += 1
+                content = "x" * rng.choice(sizes)
+                file_name = f"w{index}_{written % WRITE_FILES}.txt"
+                coro = client.overwrite(file_name, content)
+        await timed(recorder, command, coro)
+        if think_time:
+            await asyncio.sleep(think_time)
+
+
+async def run_workload(args, weights: dict[str, float], sizes: list[int],
+                       read_files: list[str]) -> dict:
+    """ Connects clients (a connect storm), runs the mixed workload and
+        disconnects them.
+    """
+    recorder = Recorder()
+    usernames = [f"bench{i:05d}" for i in range(args.clients)]
+    clients = [AsyncClient(args.ip, args.port, args.port + 1)
+               for _ in usernames]
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(recorder, "connect", c.connect(name))
+                           for c, name in zip(clients, usernames)))
+    connect_storm = time.perf_counter() - started
+    online = [c for c in clients if c.username is not None]
+    delivered = [0]
+    consumers = [asyncio.create_task(consume_messages(c, delivered))
+                 for c in online]
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(
+        client_loop(c, i, usernames, read_files, sizes, weights, deadline,
+                    args.think_time, recorder)
+        for i, c in enumerate(online)))
+    duration = time.perf_counter() - started
+    await asyncio.gather(*(timed(recorder, "disconnect", c.disconnect())
+                           for c in online))
+    await asyncio.gather(*consumers)
+    commands = recorder.summary(duration)
+    total = sum(stats["count"] for name, stats in commands.items()
+                if name not in ("connect", "disconnect"))
+    return {
+        "connect_storm_seconds": round(connect_storm, 3),
+        "duration_seconds": round(duration, 3),
+        "total_ops": total,
+        "total_ops_per_sec": round(total / duration, 2),
+        "messages_delivered": delivered[0],
+        "commands": commands,
+    }
+
+
+def run_benchmark(args) -> dict:
+    """ Runs the whole benchmark and returns its results.
+    """
+    weights = parse_mix(args.mix)
+    sizes = [int(size) for size in args.file_sizes.split(",")]
+    files = {f"bench_{size}.txt": size for size in sizes}
+    server = ServerProcess(args.ip, args.port, args.port + 1, files)
+    server.start()
+    try:
+        results = asyncio.run(run_workload(args, weights, sizes,
+                                           list(files)))
+    finally:
+        results_usage = server.stop()
+    results["server"] = results_usage
+    results["config"] = {
+        "clients": args.clients,
+        "duration": args.duration,
+        "mix": weights,
+        "file_sizes": sizes,
+        "think_time": args.think_time,
+        "python": sys.version.split()[0],
+    }
+    return results
+
+
+def compare(results: dict, baseline: dict) -> str:
+    """ Describes how `results` differ from `baseline` per command.
+    """
+    lines = [f"{'command':<12}{'ops/s':>22}{'p50 ms':>22}{'p99 ms':>22}"]
+    old_commands = baseline.get("commands", {})
+    for command, new in results["commands"].items():
+        old = old_commands.get(command)
+        if old is None:
+            continue
+        cells = []
+        for key in ("ops_per_sec", "p50_ms", "p99_ms"):
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] \
+                else 0.0
+            cells.append(f"{old[key]:>9} -> {new[key]:<9}{change:+.0f}%")
+        lines.append(f"{command:<12}" + "".join(f"{c:>22}" for c in cells))
+    return "\n".join(lines)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """ Parses command line options of the benchmark.
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load")
+    parser.add_argument("--clients", type=int, default=20,
+                        help="number of simulated clients")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="seconds of the mixed workload")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help="weights of commands, e.g. lu=2,send=4")
+    parser.add_argument("--file-sizes", default=DEFAULT_FILE_SIZES,
+                        help="comma separated sizes of READ/WRITE files")
+    parser.add_argument("--think-time", type=float, default=0.0,
+                        help="seconds a client waits between commands")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3021,
+                        help="port1 of the server, port2 is port + 1")
+    parser.add_argument("--output", help="save results as JSON to file")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="JSON results of a previous run to compare")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """ Parses command line options and runs the benchmark.
+    """
+    args = parse_args(argv)
+    results = run_benchmark(args)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(results, json.load(f)))
+
+
+if __name__ == "__main__":
+    main()
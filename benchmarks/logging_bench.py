@@ -0,0 +1,198 @@
+""" Benchmark of the cost of one log record for the thread which logs it.
+
+    Compares the logging setups used before and after moving logging off
+    the hot path:
+      - the old client formatter, which created a `logging.Formatter` on
+        every record, and `CustomFormatter` with precompiled formatters
+      - a synchronous `StreamHandler` (old server) and the queue based
+        pipeline of `server/logs.py` (current server)
+      - a disabled debug record built with an f-string, with lazy
+        %-style arguments and behind an `isEnabledFor` check
+
+    Records are written to `os.devnull` by default, which is the
+    cheapest possible target. `--write-delay-us` makes every write
+    sleep like a slow terminal or a full pipe does: the synchronous
+    handlers pay it in the logging thread, the queue pipeline pays it
+    in the listener thread. The queue is measured twice: with the
+    listener running (it shares the GIL with the logging thread) and
+    with the listener stopped, which is the cost of enqueueing alone.
+
+    Run from the root directory, e.g.:
+        python -m benchmarks.logging_bench --records 200000
+        python -m benchmarks.logging_bench --write-delay-us 20
+
+    Used built-in modules
+    ---------------------
+    os, json, time, queue, logging, argparse
+
+    Used custom modules
+    -------------------
+    client.logging_formatter, server.logs
+
+    Defined classes
+    ---------------
+    LegacyCustomFormatter(CustomFormatter)
+        `CustomFormatter` as it was, creating a formatter per record
+    SlowStream
+        A stream which sleeps on every write
+
+    Defined functions
+    -----------------
+    make_logger(name: str, handler: logging.Handler, level: int)
+        Returns a logger which writes only to `handler`
+    per_record_ns(log, records: int) -> float
+        Returns the best time of one `log()` call in nanoseconds
+    run_benchmarks(records: int, target: str, write_delay: float) 
+        -> dict[str, float]
+        Runs all cases and returns nanoseconds per record by names
+    main()
+        Parses command line options and runs benchmarks
+"""
+
+import os
+import json
+import time
+import queue
+import logging
+import argparse
+from logging.handlers import QueueListener
+
+from client.logging_formatter import CustomFormatter
+from server.logs import DeferredQueueHandler, LOG_FORMAT
+
+REPEATS = 3  # The best of REPEATS measurements is taken
+
+
+class LegacyCustomFormatter(CustomFormatter):
+    """ `CustomFormatter` as it was, creating a formatter per record.
+    """
+    def format(self, record):
+        log_fmt = self.FORMATS.get(record.levelno)
+        formatter = logging.Formatter(log_fmt)
+        return formatter.format(record)
+
+
+class SlowStream:
+    """ A stream which sleeps for `delay` seconds on every write.
+    """
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text: str) -> None:
+        if self.delay:
+            time.sleep(self.delay)
+        self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def make_logger(name: str, handler: logging.Handler,
+                level: int = logging.INFO) -> logging.Logger:
+    """ Returns a logger which writes only to `handler`.
+    """
+    logger = logging.Logger(name, level)
+    logger.propagate = False
+    logger.addHandler(handler)
+    return logger
+
+
+def per_record_ns(log, records: int) -> float:
+    """ Returns the best time of one `log()` call in nanoseconds.
+    """
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter_ns()
+        for _ in range(records):
+            log()
+        best = min(best, (time.perf_counter_ns() - started) / records)
+    return best
+
+
+def run_benchmarks(records: int, target: str,
+                   write_delay: float = 0.0) -> dict[str, float]:
+    """ Runs all cases and returns nanoseconds per record by names.
+    """
+    results = {}
+    username, addr = "alice", ("127.0.0.1", 50000)
+    with open(target, "w") as f:
+        stream = SlowStream(f, write_delay)
+
+        def stream_handler(formatter: logging.Formatter) -> logging.Handler:
+            handler = logging.StreamHandler(stream)
+            handler.setFormatter(formatter)
+            return handler
+
+        logger = make_logger("legacy", stream_handler(
+            LegacyCustomFormatter("%(levelname)s: %(message)s")))
+        results["client: formatter per record"] = per_record_ns(
+            lambda: logger.info("The file was received successfully!"),
+            records)
+        logger = make_logger("precompiled", stream_handler(
+            CustomFormatter("%(levelname)s: %(message)s")))
+        results["client: precompiled formatters"] = per_record_ns(
+            lambda: logger.info("The file was received successfully!"),
+            records)
+
+        logger = make_logger("sync", stream_handler(
+            logging.Formatter(LOG_FORMAT)))
+        results["server: synchronous stream handler"] = per_record_ns(
+            lambda: logger.info(f"User {username} is fully connected"),
+            records)
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, stream_handler(
+            logging.Formatter(LOG_FORMAT)))
+        logger = make_logger("queued", DeferredQueueHandler(log_queue))
+        results["server: queue handler, enqueue only"] = per_record_ns(
+            lambda: logger.info("User %s is fully connected", username),
+            records)
+        listener.start()
+        listener.stop()  # Writes the records queued above
+        listener.start()
+        results["server: queue handler + listener"] = per_record_ns(
+            lambda: logger.info("User %s is fully connected", username),
+            records)
+        listener.stop()
+
+        logger = make_logger("disabled", stream_handler(
+            logging.Formatter(LOG_FORMAT)))
+        results["disabled debug: f-string"] = per_record_ns(
+            lambda: logger.debug(f"Rejected connection to port 2 from {addr}"),
+            records)
+        results["disabled debug: lazy arguments"] = per_record_ns(
+            lambda: logger.debug("Rejected connection to port 2 from %s",
+                                 addr),
+            records)
+
+        def guarded():
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Rejected connection to port 2 from {addr}")
+        results["disabled debug: isEnabledFor check"] = per_record_ns(
+            guarded, records)
+    return results
+
+
+def main(argv=None):
+    """ Parses command line options and runs benchmarks.
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.logging_bench")
+    parser.add_argument("--records", type=int, default=100000,
+                        help="records logged by every measurement")
+    parser.add_argument("--target", default=os.devnull,
+                        help="file to which records are written")
+    parser.add_argument("--write-delay-us", type=float, default=0.0,
+                        help="microseconds every write to target sleeps")
+    parser.add_argument("--output", help="save results as JSON to file")
+    args = parser.parse_args(argv)
+    results = run_benchmarks(args.records, args.target,
+                             args.write_delay_us / 1e6)
+    for name, value in results.items():
+        print(f"{name:<40}{value:>10.0f} ns/record")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+""" Microbenchmarks of the framing and handler hot paths.
+
+    Every benchmark runs over a `socket.socketpair()`, so no network is
+    involved. Measured paths are:
+      - framing: `utils.send_msg_through_socket` + `receive_whole_data`
+        for message sizes from bytes to hundreds of MB and receive
+        buffer sizes from 128 B to 1 MB
+      - small messages: `send_msg_through_socket` + `receive_msg`
+      - builders of `client.cmd_handlers`
+      - `Server.communicate_with_client` dispatch of LU commands
+
+    Results are throughputs (MB/s or ops/s, higher is better). They can
+    be stored as a baseline and later checked against it; the check
+    fails when a throughput dropped more than a threshold. Baselines
+    depend on the machine, so compare runs made on the same host.
+
+    Run from the root directory, e.g.:
+        python -m benchmarks.micro --save-baseline
+        python -m benchmarks.micro --check --threshold 0.25
+        python -m benchmarks.micro --max-size 268435456 --filter framing
+
+    Used built-in modules
+    ---------------------
+    os, sys, json, time, socket, argparse, threading
+
+    Used custom modules
+    -------------------
+    utils, client.cmd_handlers, server.server
+
+    Defined functions
+    -----------------
+    bench_framing(size: int, buffer_size: int) -> float
+        MB/s of sending and receiving one (size + space + data) frame
+    bench_small_messages(size: int) -> float
+        Round trips per second of small messages
+    bench_cmd_handler(name: str) -> float
+        Calls per second of a `cmd_handlers` builder
+    bench_dispatch() -> float
+        LU commands per second served by `communicate_with_client`
+    run_benchmarks(args) -> dict[str, float]
+        Runs selected benchmarks and returns their throughputs
+    check(results: dict, baseline: dict, threshold: float) -> list[str]
+        Returns descriptions of regressions beyond `threshold`
+    main()
+        Parses command line options and runs benchmarks
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+from threading import Thread
+
+from utils import send_msg_through_socket, receive_whole_data, receive_msg
+from client import cmd_handlers
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "baselines", "micro.json")
+MESSAGE_SIZES = [16, 1024, 65536, 1 << 20, 16 << 20, 64 << 20, 256 << 20]
+BUFFER_SIZES = [128, 1024, 4096, 65536, 1 << 20]
+DEFAULT_MAX_SIZE = 16 << 20   # Larger messages are skipped unless asked
+BYTES_PER_RUN = 32 << 20      # Data moved by one measurement of framing
+MAX_FRAMES_PER_RUN = 2000    # Limits the number of small frames
+MAX_BYTES_128B_BUFFER = 1 << 20  # Tiny buffers are too slow for big frames
+MIN_RUN_SECONDS = 0.2         # Small benchmarks repeat at least this long
+REPEATS = 3                   # The best of REPEATS measurements is taken
+
+
+def best_of(run, repeats: int = REPEATS) -> float:
+    """ Returns the shortest of `repeats` durations of `run()`.
+    """
+    durations = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        durations.append(time.perf_counter() - started)
+    return min(durations)
+
+
+def count_per_second(call) -> float:
+    """ Returns how many times per second `call()` can be executed.
+    """
+    calls = 1
+    while True:
+        duration = best_of(lambda: [call() for _ in range(calls)])
+        if duration >= MIN_RUN_SECONDS:
+            return calls / duration
+        calls *= 2
+
+
+def drain(sock: socket.socket) -> Thread:
+    """ Starts a thread which reads and drops everything from `sock`.
+    """
+    def run():
+        try:
+            while sock.recv(1 << 20):
+                pass
+        except OSError:
+            pass
+    t = Thread(target=run, daemon=True)
+    t.start()
+    return t
+
+
+def bench_framing(size: int, buffer_size: int) -> float:
+    """ MB/s of sending and receiving one (size + space + data) frame
+        with `receive_whole_data` reading by `buffer_size` bytes.
+    """
+    frame = f"{size} {'x' * size}"
+    frames = max(1, min(BYTES_PER_RUN // size, MAX_FRAMES_PER_RUN))
+    left, right = socket.socketpair()
+
+    # The protocol is not framed, so a frame is sent only after the
+    # previous one was acknowledged, like clients wait for replies #
+    def sender():
+        for _ in range(frames):
+            send_msg_through_socket(left, frame)
+            left.recv(1)
+
+    def run():
+        t = Thread(target=sender)
+        t.start()
+        for _ in range(frames):
+            receive_whole_data(right, buffer_size)
+            right.sendall(b"k")
+        t.join()
+
+    try:
+        duration = best_of(run)
+    finally:
+        left.close()
+        right.close()
+    return frames * size / duration / 1e6
+
+
+def bench_small_messages(size: int) -> float:
+    """ Round trips per second of `size` bytes messages sent with
+        `send_msg_through_socket` and received with `receive_msg`.
+    """
+    message = "x" * size
+    left, right = socket.socketpair()
+
+    def echo():
+        try:
+            while True:
+                data = receive_msg(right, 4096)
+                if not data:
+                    return
+                send_msg_through_socket(right, data)
+        except OSError:
+            pass
+
+    t = Thread(target=echo, daemon=True)
+    t.start()
+
+    def round_trip():
+        send_msg_through_socket(left, message)
+        receive_msg(left, 4096)
+
+    try:
+        return count_per_second(round_trip)
+    finally:
+        left.close()
+        right.close()
+
+
+def bench_cmd_handler(name: str) -> float:
+    """ Calls per second of a `cmd_handlers` builder, whose output is
+        sent to a socket drained by another thread.
+    """
+    left, right = socket.socketpair()
+    drain(right)
+    calls = {
+        "connect_cmd": lambda: cmd_handlers.connect_cmd(left, "username"),
+        "lu_cmd": lambda: cmd_handlers.lu_cmd(left),
+        "send_cmd": lambda: cmd_handlers.send_cmd(left, "username",
+                                                  "\"hello world\""),
+        "readif_cmd": lambda: cmd_handlers.readif_cmd(left, "file.txt", 1),
+        "send_file_cmd": lambda: cmd_handlers.send_file_cmd(
+            left, "x" * 1024, 1024),
+    }
+    try:
+        return count_per_second(calls[name])
+    finally:
+        left.close()
+        right.close()
+
+
+def bench_dispatch() -> float:
+    """ LU commands per second served by `Server.communicate_with_client`
+        including the round trip through a socketpair.
+    """
+    from server.server import Server
+    from server.stats import MeteredSocket
+    server = Server("127.0.0.1", 0, 0)
+    client_end, server_end = socket.socketpair()
+    server_end = MeteredSocket(server_end)
+    addr = ("127.0.0.1", 0)
+    server.clients_port1["benchuser"] = (server_end, addr)
+    server.active_connections.append(server_end)
+    t = Thread(target=server.communicate_with_client,
+               args=[server_end, addr], daemon=True)
+    t.start()
+
+    def round_trip():
+        send_msg_through_socket(client_end, "LU")
+        receive_msg(client_end, 4096)
+
+    try:
+        return count_per_second(round_trip)
+    finally:
+        client_end.close()
+        server.com_socket.close()
+        server.redirect_socket.close()
+
+
+def run_benchmarks(args) -> dict[str, float]:
+    """ Runs selected benchmarks and returns their throughputs by names.
+    """
+    benchmarks = {}
+    for size in MESSAGE_SIZES:
+        if size > args.max_size:
+            continue
+        for buffer_size in BUFFER_SIZES:
+            if buffer_size == 128 and size > MAX_BYTES_128B_BUFFER:
+                continue
+            name = f"framing[size={size},buf={buffer_size}] MB/s"
+            benchmarks[name] = (bench_framing, size, buffer_size)
+    for size in (2, 64, 1024):
+        benchmarks[f"small_message[size={size}] ops/s"] = \
+            (bench_small_messages, size)
+    for handler in ("connect_cmd", "lu_cmd", "send_cmd", "readif_cmd",
+                    "send_file_cmd"):
+        benchmarks[f"cmd_handlers.{handler} ops/s"] = \
+            (bench_cmd_handler, handler)
+    benchmarks["server.dispatch[LU] ops/s"] = (bench_dispatch,)
+
+    results = {}
+    for name, (func, *params) in benchmarks.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = round(func(*params), 2)
+        print(f"{name:<50}{results[name]:>14.2f}", flush=True)
+    return results
+
+
+def check(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """ Returns descriptions of benchmarks, whose throughput dropped by
+        more than `threshold` (0.25 is 25%) compared to `baseline`.
+    """
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if old and value < old * (1 - threshold):
+            drop = (old - value) / old * 100
+            regressions.append(f"{name}: {old} -> {value} (-{drop:.0f}%)")
+    return regressions
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """ Parses command line options of microbenchmarks.
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.micro")
+    parser.add_argument("--max-size", type=int, default=DEFAULT_MAX_SIZE,
+                        help="largest framing message size in bytes")
+    parser.add_argument("--filter", help="run benchmarks containing text")
+    parser.add_argument("--baseline", default=BASELINE_PATH,
+                        help="path of the baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store results as the new baseline")
+    parser.add_argument("--check", action="store_true",
+                        help="fail if results regressed from baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed throughput drop for --check")
+    parser.add_argument("--output", help="save results as JSON to file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """ Parses command line options and runs benchmarks.
+    """
+    args = parse_args(argv)
+    results = run_benchmarks(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+    if args.check:
+        with open(args.baseline) as f:
+            regressions = check(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+""" Benchmark of round-trip latency of small commands with and without
+    the socket tuning of `utils.tune_socket`.
+
+    The server is started in a separate process (`load.ServerProcess`)
+    twice: with plain sockets (TCP_NODELAY and keepalive off on both
+    ends) and with the default options. Two blocking clients connect to
+    it; one of them sends LU and MESSAGE (to the other one) and READ
+    commands and waits for every reply. The server replies to READ with
+    two writes ("OK" and the frame of file), which is where Nagle's
+    algorithm and delayed ACKs stall plain sockets.
+
+    Run from the root directory, e.g.:
+        python -m benchmarks.socket_latency --rounds 500
+
+    Used built-in modules
+    ---------------------
+    json, time, socket, argparse, threading
+
+    Used custom modules
+    -------------------
+    utils, client.cmd_handlers, benchmarks.load
+
+    Defined functions
+    -----------------
+    connect_client(ip: str, port1: int, port2: int, username: str,
+        socket_options: dict) -> tuple[socket, socket]
+        Connects a client to both ports of server
+    drain(sock: socket)
+        Receives and drops data until `sock` is closed
+    measure(call, rounds: int) -> dict[str, float]
+        Returns latency percentiles of `call` in microseconds
+    run_mode(args, server_settings: dict, socket_options: dict)
+        -> dict[str, dict]
+        Starts a server and measures LU, MESSAGE and READ round trips
+    main()
+        Parses command line options and runs benchmarks
+"""
+
+import json
+import time
+import socket
+import argparse
+from threading import Thread
+
+from utils import receive_msg, tune_socket, send_msg_through_socket
+from client.cmd_handlers import connect_cmd, lu_cmd, send_cmd
+from .load import ServerProcess, percentile
+
+BUF_SIZE = 4096
+READ_FILE = "small.txt"
+READ_FILE_SIZE = 100
+READ_REPLY_SIZE = len(f"OK{READ_FILE_SIZE} ") + READ_FILE_SIZE
+# (server settings, client socket options) of compared modes #
+MODES = {
+    "plain": ({"tcp_nodelay": False, "keepalive": False},
+              {"nodelay": False, "keepalive": False}),
+    "tuned": ({}, {}),
+}
+
+
+def connect_client(ip: str, port1: int, port2: int, username: str,
+                   socket_options: dict) -> tuple[socket.socket,
+                                                  socket.socket]:
+    """ Connects a client to both ports of server and returns the
+        sockets of port1 and port2.
+    """
+    s = socket.create_connection((ip, port1))
+    tune_socket(s, **socket_options)
+    connect_cmd(s, username)
+    response = receive_msg(s, BUF_SIZE).split()
+    if not response or response[0] != "OK":
+        raise RuntimeError(f"{username} cannot connect: {response}")
+    push = socket.create_connection((ip, port2))
+    tune_socket(push, **socket_options)
+    send_msg_through_socket(push, f"{username} {response[1]}")
+    return s, push
+
+
+def drain(sock: socket.socket) -> None:
+    """ Receives and drops data until `sock` is closed.
+    """
+    try:
+        while sock.recv(65536):
+            pass
+    except OSError:
+        pass
+
+
+def measure(call, rounds: int) -> dict[str, float]:
+    """ Returns mean, p50 and p99 latencies of `call` in microseconds.
+    """
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - started) * 1e6)
+    latencies.sort()
+    return {"mean_us": round(sum(latencies) / rounds, 1),
+            "p50_us": round(percentile(latencies, 50), 1),
+            "p99_us": round(percentile(latencies, 99), 1)}
+
+
+def run_mode(args, server_settings: dict,
+             socket_options: dict) -> dict[str, dict]:
+    """ Starts a server with `server_settings` and measures LU, MESSAGE
+        and READ round trips of clients with `socket_options`.
+    """
+    server = ServerProcess(args.ip, args.port, args.port + 1,
+                           {READ_FILE: READ_FILE_SIZE}, server_settings)
+    server.start()
+    sockets = []
+    try:
+        alice, alice_push = connect_client(args.ip, args.port, args.port + 1,
+                                           "alice", socket_options)
+        bob, bob_push = connect_client(args.ip, args.port, args.port + 1,
+                                       "bob", socket_options)
+        sockets = [alice, alice_push, bob, bob_push]
+        Thread(target=drain, args=[bob_push], daemon=True).start()
+        time.sleep(0.2)  # Let server register the port2 sockets
+
+        def lu():
+            lu_cmd(alice)
+            receive_msg(alice, BUF_SIZE)
+
+        def message():
+            send_cmd(alice, "bob", "ping")
+            reply = receive_msg(alice, BUF_SIZE)
+            if reply != "OK":
+                raise RuntimeError(reply)
+
+        def read():
+            send_msg_through_socket(alice, f"READ {READ_FILE}")
+            # "OK" and the frame may arrive together or one by one #
+            received = 0
+            while received < READ_REPLY_SIZE:
+                received += len(alice.recv(BUF_SIZE))
+
+        return {"LU": measure(lu, args.rounds),
+                "MESSAGE": measure(message, args.rounds),
+                "READ": measure(read, args.rounds)}
+    finally:
+        for s in sockets:
+            s.close()
+        server.stop()
+
+
+def main(argv=None):
+    """ Parses command line options and runs benchmarks.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.socket_latency")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3021,
+                        help="port1 of server, port2 is the next one")
+    parser.add_argument("--rounds", type=int, default=500,
+                        help="round trips of every command")
+    parser.add_argument("--output", help="save results as JSON to file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for mode, (server_settings, socket_options) in MODES.items():
+        results[mode] = run_mode(args, server_settings, socket_options)
+    print(f"{'COMMAND':<10}{'MODE':<8}{'MEAN us':>10}{'P50 us':>10}"
+          f"{'P99 us':>10}")
+    for command in results["plain"]:
+        for mode in MODES:
+            r = results[mode][command]
+            print(f"{command:<10}{mode:<8}{r['mean_us']:>10}{r['p50_us']:>10}"
+                  f"{r['p99_us']:>10}")
+        speedup = results["plain"][command]["mean_us"] / \
+            max(results["tuned"][command]["mean_us"], 1e-9)
+        print(f"{command:<10}{'speedup':<8}{speedup:>9.1f}x")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
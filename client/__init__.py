@@ -2,6 +2,12 @@
 
     Modules
     -------
+    aio.py
+        Programmatic asyncio client of the server
+    batch.py
+        Module runs client commands from a script without prompts
+    cache.py
+        Module keeps metadata of the files read from server
     client.py
         The module defines all the logic of the TCP client
     cmd_handlers.py
@@ -0,0 +1,684 @@
+""" Programmatic asyncio client of the server.
+
+    Unlike `client.py`, which is driven by the user's input and logs the
+    results, this module returns results to the caller and raises
+    `ServerError` when server replies with an error. It uses the same
+    commands defined in `protocol.py`.
+
+    Module is not intended to be runned! Example of usage:
+
+        async with AsyncClient("127.0.0.1") as c:
+            await c.connect("alice")
+            users = await c.lu()
+            await c.send("bobby", "hello")
+            async for message in c.messages():
+                print(message)
+
+    Requests sent through one `AsyncClient` are executed one after
+    another, as server answers them in order over a single socket. Many
+    `AsyncClient` objects can work concurrently on the same event loop.
+
+    Used built-in modules
+    ---------------------
+    json, codecs, hashlib, asyncio, typing
+
+    Used custom modules
+    -------------------
+    protocol, utils, global_vars
+
+    Defined classes
+    ---------------
+    ServerError(Exception)
+        Raised when server replies with an error message
+    FileData
+        Content of a file read from server with its version and checksum
+    AsyncClient
+        Asyncio client of the server
+"""
+
+import json
+import codecs
+import hashlib
+import asyncio
+from typing import AsyncIterator, Iterable
+
+from protocol import CONNECT, DISCONNECT, LU, LF, MESSAGE, READIF, WRITE, \
+    OVERWRITE, APPEND, APPENDFILE, UNCHANGED, TAIL, UNTAIL, WATCH, UNWATCH, \
+    SEARCH, STATS, PROFILE, HEARTBEAT, PONG
+from utils import content_checksum, missing_bytes
+from .global_vars import MAIN_PORT, RECEIVE_PORT, SERVER_BUF_SIZE, \
+    error_prefix
+
+
+class ServerError(Exception):
+    """ Raised when server replies with an error message.
+    """
+
+
+class FileData:
+    """ Content of a file read from server with its version and checksum.
+
+        Object attributes
+        -----------------
+        name : str
+            The name of the file in server
+        version : int
+            The version of the file in server
+        checksum : str | None
+            Checksum of the content, None if the content wasn't sent
+        content : str | None
+            The content of the file, None if the file wasn't changed
+            since the version given to `read_if()`
+    """
+    def __init__(self, name: str, version: int, checksum: str | None,
+                 content: str | None):
+        self.name = name
+        self.version = version
+        self.checksum = checksum
+        self.content = content
+
+    def __repr__(self):
+        return f"FileData({self.name!r}, version={self.version})"
+
+
+class AsyncClient:
+    """ Asyncio client of the server.
+
+        Object attributes
+        -----------------
+        host : str
+            IP address of server
+        port : int
+            Port for the commands of client
+        push_port : int
+            Port from which messages of other users are received
+        buffer_size : int
+            Maximum number of bytes read from socket at once
+        username : str | None
+            The username of connected client
+        session_token : str | None
+            Resume token given by server on connection
+
+        Methods
+        -------
+        connect(self, username: str)
+            Connects to server as `username`
+        disconnect(self)
+            Disconnects from server
+        lu(self)
+            Returns usernames of online users
+        lf(self, **options)
+            Returns names of files in server
+        lf_page(self, **options)
+            Returns one page of files with metadata and the next cursor
+        send(self, username: str, message: str)
+            Sends `message` to another user
+        read(self, file_name: str)
+            Returns the content of server's `file_name`
+        read_if(self, file_name: str, version: int)
+            Reads `file_name` only if it's not at `version`
+        read_stream(self, file_name: str)
+            Yields the content of `file_name` chunk by chunk
+        write(self, file_name: str, content: str)
+            Creates a new file in server
+        overwrite(self, file_name: str, content: str)
+            Creates or replaces a file in server
+        write_stream(self, file_name: str, size: int, chunks)
+            Sends a new file chunk by chunk
+        append(self, file_name: str, data: str)
+            Appends a line to server's file
+        appendfile(self, file_name: str, content: str)
+            Appends content of a local file to server's file
+        tail(self, file_name: str, lines: int | None = None, 
+            follow: bool = False)
+            Returns the last lines of server's `file_name`
+        untail(self, file_name: str)
+            Stops following server's `file_name`
+        watch(self, pattern: str = "*")
+            Subscribes to changes of files matching `pattern`
+        unwatch(self, pattern: str | None = None)
+            Cancels a subscription or all of them
+        search(self, query: str, limit: int | None = None)
+            Returns lines of server's files which match `query`
+        stats(self)
+            Returns statistics of commands served by server
+        profile(self, mode: str, seconds: float)
+            Profiles server and returns the path of its report
+        messages(self)
+            Yields messages sent by other users
+        tails(self)
+            Yields data appended to followed files
+        changes(self)
+            Yields changes of watched files
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = MAIN_PORT,
+                 push_port: int = RECEIVE_PORT,
+                 buffer_size: int = SERVER_BUF_SIZE):
+        self.host = host
+        self.port = port
+        self.push_port = push_port
+        self.buffer_size = buffer_size
+        self.username: str | None = None
+        self.session_token: str | None = None
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._push_writer: asyncio.StreamWriter | None = None
+        self._push_task: asyncio.Task | None = None
+        self._messages: asyncio.Queue = asyncio.Queue()
+        self._tails: asyncio.Queue = asyncio.Queue()
+        self._changes: asyncio.Queue = asyncio.Queue()
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "AsyncClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.disconnect()
+
+    # Low level helpers #
+
+    async def _send(self, message: str) -> None:
+        if self._writer is None:
+            raise ConnectionError("Not connected to server")
+        self._writer.write(message.encode())
+        await self._writer.drain()
+
+    async def _receive(self) -> str:
+        """ Receives one reply, like `receive_msg` does.
+        """
+        data = await self._reader.read(self.buffer_size)
+        if not data:
+            raise ConnectionResetError("Server closed the connection")
+        missing = missing_bytes(data)
+        if missing:
+            # A character split by the buffer is completed #
+            data += await self._reader.readexactly(missing)
+        return data.decode()
+
+    async def _receive_status(self) -> str:
+        """ Receives one reply and raises ServerError if it's an error.
+        """
+        reply = await self._receive()
+        if reply.startswith(error_prefix):
+            raise ServerError(reply.removeprefix(error_prefix))
+        return reply
+
+    async def _receive_field(self) -> str:
+        """ Receives one space terminated field of a reply.
+        """
+        field = await self._reader.readuntil(b" ")
+        return field[:-1].decode()
+
+    async def _receive_chunks(self, size: int) -> AsyncIterator[str]:
+        """ Yields `size` characters of data chunk by chunk.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        received = 0
+        while received < size:
+            data = await self._reader.read(
+                min(self.buffer_size, max(size - received, 1)))
+            if not data:
+                raise ConnectionResetError("Server closed the connection")
+            chunk = decoder.decode(data)
+            received += len(chunk)
+            yield chunk
+
+    async def _drain_chunks(self, chunks: AsyncIterator[str]) -> None:
+        """ Receives and drops the rest of `chunks`, or closes the
+            connection if the stream cannot be brought back in sync.
+        """
+        try:
+            async for _ in chunks:
+                pass
+        except BaseException:
+            self._abort()
+            raise
+
+    def _abort(self) -> None:
+        """ Closes the connection without DISCONNECT, the client must
+            connect again.
+        """
+        for writer in (self._writer, self._push_writer):
+            if writer is not None:
+                writer.close()
+        if self._push_task is not None:
+            self._push_task.cancel()
+        self._reader = self._writer = self._push_writer = None
+        self._push_task = None
+
+    async def _send_file(self, command: str, file_name: str,
+                         content: str) -> None:
+        async with self._lock:
+            await self._send(f"{command} {file_name}")
+            await self._receive_status()
+            await self._send(f"{len(content)} {content}")
+            await self._receive_status()
+
+    async def _push_loop(self, reader: asyncio.StreamReader) -> None:
+        """ Puts messages, data appended to followed files and changes
+            of watched files, which are received from push port, to 
+            their queues and answers HEARTBEAT frames of server with 
+            PONG.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        try:
+            while True:
+                command = (await reader.readuntil(b" "))[:-1].decode()
+                size = int((await reader.readuntil(b" "))[:-1])
+                chunks, received = [], 0
+                while received < size:
+                    # Sizes are in characters, so bytes of the frame 
+                    # are never fewer than the characters left #
+                    data = await reader.read(
+                        min(self.buffer_size, size - received))
+                    if not data:
+                        return
+                    chunks.append(decoder.decode(data))
+                    received += len(chunks[-1])
+                payload = "".join(chunks)
+                if command == MESSAGE:
+                    await self._messages.put(payload)
+                elif command == TAIL:
+                    file_name, _, data = payload.partition(" ")
+                    await self._tails.put((file_name, data))
+                elif command == WATCH:
+                    for event in json.loads(payload):
+                        await self._changes.put(event)
+                elif command == HEARTBEAT and self._push_writer is not None:
+                    self._push_writer.write(PONG.encode())
+                    await self._push_writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            await self._messages.put(None)
+            await self._tails.put(None)
+            await self._changes.put(None)
+
+    # Commands #
+
+    async def connect(self, username: str) -> None:
+        """ Connects to server as `username` and opens the push channel.
+
+            Raises
+            ------
+            ServerError
+                If server refused the connection
+            RuntimeError
+                If the client is already connected
+        """
+        if self._writer is not None:
+            raise RuntimeError("Already connected")
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host, self.port)
+        try:
+            async with self._lock:
+                await self._send(f"{CONNECT} {username}")
+                reply = (await self._receive_status()).split()
+        except BaseException:
+            self._abort()
+            raise
+        self.username = username
+        self.session_token = reply[1] if len(reply) > 1 else None
+        try:
+            push_reader, self._push_writer = await asyncio.open_connection(
+                self.host, self.push_port)
+            self._push_writer.write(
+                f"{username} {self.session_token}".encode())
+            await self._push_writer.drain()
+        except BaseException:
+            await self.disconnect()
+            raise
+        self._push_task = asyncio.create_task(self._push_loop(push_reader))
+
+    async def disconnect(self) -> None:
+        """ Disconnects from server, does nothing if not connected.
+        """
+        if self._writer is None:
+            return
+        try:
+            async with self._lock:
+                await self._send(DISCONNECT)
+                await self._receive()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self._writer.close()
+            self._writer = None
+            if self._push_writer is not None:
+                self._push_writer.close()
+                self._push_writer = None
+            if self._push_task is not None:
+                await self._push_task
+                self._push_task = None
+
+    async def lu(self) -> list[str]:
+        """ Returns usernames of online users.
+        """
+        async with self._lock:
+            await self._send(LU)
+            return (await self._receive_status()).split()
+
+    async def lf(self, **options) -> list[str]:
+        """ Returns names of files in server, reading all pages.
+            `options` are the ones of `lf_page` except `cursor`.
+        """
+        names, cursor = [], None
+        while True:
+            if cursor is not None:
+                options["cursor"] = cursor
+            files, cursor = await self.lf_page(**options)
+            names.extend(meta["name"] for meta in files)
+            if cursor is None:
+                return names
+
+    async def lf_page(self, **options) -> tuple[list[dict], str | None]:
+        """ Returns one page of files in server with their metadata
+            and the cursor of the next page, None after the last one.
+
+            Options are the ones of LF, e.g. `match="*.txt"`, 
+            `sort="-size"`, `limit=100`, `cursor=...`.
+
+            Raises
+            ------
+            ServerError
+                If an option is invalid
+        """
+        request = " ".join([LF, *(f"{key}={value}" 
+                                  for key, value in options.items())])
+        async with self._lock:
+            await self._send(request)
+            status = await self._receive_field()
+            if status == error_prefix.strip():
+                raise ServerError(await self._receive())
+            size = int(await self._receive_field())
+            chunks = [chunk async for chunk in self._receive_chunks(size)]
+        page = json.loads("".join(chunks))
+        return page["files"], page["next"]
+
+    async def send(self, username: str, message: str) -> None:
+        """ Sends `message` to another user with username=`username`.
+
+            Raises
+            ------
+            ServerError
+                If the user is not online
+        """
+        async with self._lock:
+            # Server accepts the frame together with the command #
+            await self._send(f"{MESSAGE} {username} {len(message)} {message}")
+            await self._receive_status()
+
+    async def _read_header(self, file_name: str,
+                           version: int) -> tuple[int, str | None, int]:
+        """ Sends READIF and receives the header of its reply.
+
+            Returns
+            -------
+            tuple[int, str | None, int]
+                Version, checksum and size of the file. Checksum is None
+                if the file is still at `version`
+        """
+        await self._send(f"{READIF} {file_name} {version}")
+        status = await self._receive_field()
+        if status == error_prefix.strip():
+            raise ServerError(await self._receive())
+        if status == UNCHANGED:
+            return int(await self._receive()), None, 0
+        new_version = int(await self._receive_field())
+        checksum = await self._receive_field()
+        size = int(await self._receive_field())
+        return new_version, checksum, size
+
+    async def read_if(self, file_name: str, version: int = 0) -> FileData:
+        """ Reads `file_name` only if it's not at `version`.
+
+            Returns
+            -------
+            FileData
+                The file data, with content=None if the file in server
+                is still at `version`
+        """
+        async with self._lock:
+            new_version, checksum, size = await self._read_header(
+                file_name, version)
+            if checksum is None:
+                return FileData(file_name, new_version, None, None)
+            chunks = [chunk async for chunk in self._receive_chunks(size)]
+        content = "".join(chunks)
+        if content_checksum(content) != checksum:
+            raise ServerError(f"{file_name} was damaged during transfer")
+        return FileData(file_name, new_version, checksum, content)
+
+    async def read(self, file_name: str) -> str:
+        """ Returns the content of server's `file_name`.
+        """
+        return (await self.read_if(file_name)).content
+
+    async def read_stream(self, file_name: str) -> AsyncIterator[str]:
+        """ Yields the content of `file_name` chunk by chunk, without
+            keeping the whole file in memory.
+
+            If the caller stops iterating early, the rest of the file is
+            still received and dropped once the generator is closed, so
+            the next reply isn't mixed with it. If it cannot be dropped
+            (e.g. the task is cancelled), the client is disconnected.
+
+            Raises
+            ------
+            ServerError
+                If the file is missing or was damaged during transfer
+        """
+        async with self._lock:
+            _, checksum, size = await self._read_header(file_name, 0)
+            digest = hashlib.blake2b(digest_size=16)
+            chunks = self._receive_chunks(size)
+            finished = False
+            try:
+                async for chunk in chunks:
+                    digest.update(chunk.encode())
+                    yield chunk
+                finished = True
+            finally:
+                if not finished:
+                    await self._drain_chunks(chunks)
+        if digest.hexdigest() != checksum:
+            raise ServerError(f"{file_name} was damaged during transfer")
+
+    async def write(self, file_name: str, content: str) -> None:
+        """ Creates a new file `file_name` in server.
+        """
+        await self._send_file(WRITE, file_name, content)
+
+    async def overwrite(self, file_name: str, content: str) -> None:
+        """ Creates or replaces the file `file_name` in server.
+        """
+        await self._send_file(OVERWRITE, file_name, content)
+
+    async def write_stream(self, file_name: str, size: int,
+                           chunks: Iterable[str] | AsyncIterator[str],
+                           command: str = WRITE) -> None:
+        """ Sends a new file chunk by chunk, without keeping the whole
+            file in memory.
+
+            Parameters
+            ----------
+            file_name : str
+                The name of the file in server
+            size : int
+                Total number of characters in `chunks`
+            chunks : Iterable[str] | AsyncIterator[str]
+                The content of the file
+            command : str, optional
+                WRITE (default) or OVERWRITE
+        """
+        async with self._lock:
+            await self._send(f"{command} {file_name}")
+            await self._receive_status()
+            await self._send(f"{size} ")
+            if hasattr(chunks, "__aiter__"):
+                async for chunk in chunks:
+                    await self._send(chunk)
+            else:
+                for chunk in chunks:
+                    await self._send(chunk)
+            await self._receive_status()
+
+    async def append(self, file_name: str, data: str) -> None:
+        """ Appends `data` as a new line to server's `file_name`.
+        """
+        await self._send_file(APPEND, file_name, data)
+
+    async def appendfile(self, file_name: str, content: str,
+                         src_name: str = "-") -> None:
+        """ Appends `content` of a local file to server's `file_name`.
+        """
+        async with self._lock:
+            await self._send(f"{APPENDFILE} {src_name} {file_name}")
+            await self._receive_status()
+            await self._send(f"{len(content)} {content}")
+            await self._receive_status()
+
+    async def tail(self, file_name: str, lines: int | None = None,
+                   follow: bool = False) -> str:
+        """ Returns the last `lines` lines of server's `file_name`
+            (server's default if None). With `follow` data appended to
+            the file later is yielded by `tails`.
+
+            Raises
+            ------
+            ServerError
+                If there's no such file or `lines` is invalid
+        """
+        request = " ".join([TAIL, file_name, 
+                            *([str(lines)] if lines is not None else []),
+                            *(["follow"] if follow else [])])
+        async with self._lock:
+            await self._send(request)
+            status = await self._receive_field()
+            if status == error_prefix.strip():
+                raise ServerError(await self._receive())
+            size = int(await self._receive_field())
+            chunks = [chunk async for chunk in self._receive_chunks(size)]
+        return "".join(chunks)
+
+    async def untail(self, file_name: str) -> None:
+        """ Stops following server's `file_name`.
+
+            Raises
+            ------
+            ServerError
+                If the file is not followed
+        """
+        async with self._lock:
+            await self._send(f"{UNTAIL} {file_name}")
+            await self._receive_status()
+
+    async def watch(self, pattern: str = "*") -> None:
+        """ Subscribes to changes of files whose names match the shell
+            `pattern`, they're yielded by `changes`.
+
+            Raises
+            ------
+            ServerError
+                If too many patterns are watched
+        """
+        async with self._lock:
+            await self._send(f"{WATCH} {pattern}")
+            await self._receive_status()
+
+    async def unwatch(self, pattern: str | None = None) -> None:
+        """ Cancels the subscription to `pattern`, all subscriptions if
+            it's None.
+
+            Raises
+            ------
+            ServerError
+                If nothing is watched
+        """
+        request = UNWATCH if pattern is None else f"{UNWATCH} {pattern}"
+        async with self._lock:
+            await self._send(request)
+            await self._receive_status()
+
+    async def search(self, query: str, 
+                     limit: int | None = None) -> list[dict]:
+        """ Returns lines of server's files which contain all words
+            and "quoted phrases" of `query`, as dictionaries with the
+            `file`, the `line` number and the byte `offset` of the line.
+
+            Raises
+            ------
+            ServerError
+                If the query has no words or `limit` is invalid
+        """
+        if limit is not None:
+            query = f"{query} limit={limit}"
+        async with self._lock:
+            await self._send(f"{SEARCH} {query}")
+            status = await self._receive_field()
+            if status == error_prefix.strip():
+                raise ServerError(await self._receive())
+            size = int(await self._receive_field())
+            chunks = [chunk async for chunk in self._receive_chunks(size)]
+        return json.loads("".join(chunks))["matches"]
+
+    async def stats(self) -> dict:
+        """ Returns statistics of commands served by server.
+
+            Raises
+            ------
+            ServerError
+                If the user is not an admin
+        """
+        async with self._lock:
+            await self._send(STATS)
+            status = await self._receive_field()
+            if status == error_prefix.strip():
+                raise ServerError(await self._receive())
+            size = int(await self._receive_field())
+            chunks = [chunk async for chunk in self._receive_chunks(size)]
+        return json.loads("".join(chunks))
+
+    async def profile(self, mode: str, seconds: float) -> str:
+        """ Asks server to profile itself in `mode` ("sample" or 
+            "cprofile") for `seconds`.
+
+            Returns
+            -------
+            str
+                The path in server where the report will be written
+        """
+        async with self._lock:
+            await self._send(f"{PROFILE} {mode} {seconds}")
+            return (await self._receive_status()).split(" ", 1)[1]
+
+    async def messages(self) -> AsyncIterator[str]:
+        """ Yields messages sent by other users until disconnection.
+        """
+        while True:
+            message = await self._messages.get()
+            if message is None:
+                return
+            yield message
+
+    async def tails(self) -> AsyncIterator[tuple[str, str]]:
+        """ Yields (file name, appended data) of files followed by
+            `tail` until disconnection.
+        """
+        while True:
+            appended = await self._tails.get()
+            if appended is None:
+                return
+            yield appended
+
+    async def changes(self) -> AsyncIterator[dict]:
+        """ Yields changes of watched files until disconnection, as
+            dictionaries with the `file`, the `event` (created, 
+            overwritten, appended or deleted) and the new `size` and 
+            `version` of the file.
+        """
+        while True:
+            change = await self._changes.get()
+            if change is None:
+                return
+            yield change
@@ -0,0 +1,179 @@
+""" Module runs client commands from a script or stdin without prompts
+    and prints machine-readable results.
+
+    Module is not intended to be runned! It is used by `main.py` when
+    `--script` option is given.
+
+    Every executed command produces one JSON line on stdout:
+    {"line": 3, "command": "lu", "status": "ok", "output": ["..."],
+     "elapsed_ms": 0.84}
+    Messages delivered by other users while the script runs produce
+    {"event": "message", "output": "..."} lines.
+
+    Used built-in modules
+    ---------------------
+    sys, json, time, logging, threading
+
+    Used custom modules
+    -------------------
+    client, loggers
+
+    Defined classes
+    ---------------
+    RecordCollector(logging.Handler)
+        Keeps log records of a command instead of printing them
+    PushPrinter(logging.Handler)
+        Prints messages from other users as JSON event lines
+    BatchRunner
+        Executes commands back-to-back and reports their results
+"""
+
+import sys
+import json
+import time
+import logging
+from threading import Lock
+
+from .client import Client
+from .loggers import main_logger, sec_logger
+
+
+class RecordCollector(logging.Handler):
+    """ Keeps log records of a command instead of printing them.
+
+        Object attributes
+        -----------------
+        records : list[logging.LogRecord]
+            Records logged since the last `reset()`
+    """
+    def __init__(self):
+        super().__init__()
+        self.records: list[logging.LogRecord] = []
+
+    def emit(self, record):
+        """ Keeps the `record`.
+        """
+        self.records.append(record)
+
+    def reset(self) -> list[logging.LogRecord]:
+        """ Returns kept records and forgets them.
+        """
+        records, self.records = self.records, []
+        return records
+
+
+class PushPrinter(logging.Handler):
+    """ Prints messages from other users as JSON event lines.
+    """
+    def __init__(self, runner: "BatchRunner"):
+        super().__init__()
+        self.runner = runner
+
+    def emit(self, record):
+        """ Prints the `record` as an event line.
+        """
+        self.runner.write({"event": "message",
+                           "level": record.levelname.lower(),
+                           "output": record.getMessage().strip()})
+
+
+class BatchRunner:
+    """ Executes commands back-to-back and reports their results.
+
+        A command is considered failed, when the client logged a warning
+        or an error while executing it.
+
+        Object attributes
+        -----------------
+        client : Client
+            The client which executes commands
+        out : TextIO
+            The stream to which result lines are written
+        stop_on_error : bool
+            Whether to stop executing the script after a failed command
+        collector : RecordCollector
+            Handler which collects the output of current command
+        write_lock : Lock
+            Prevents result and event lines from being interleaved
+
+        Methods
+        -------
+        write(self, result: dict)
+            Writes one JSON line to `out`
+        run_line(self, line_no: int, line: str)
+            Executes one command and returns its result
+        run(self, lines)
+            Executes all commands and returns the number of failed ones
+    """
+    def __init__(self, client: Client, out=sys.stdout,
+                 stop_on_error: bool = False):
+        self.client = client
+        self.out = out
+        self.stop_on_error = stop_on_error
+        self.collector = RecordCollector()
+        self.write_lock = Lock()
+
+    def write(self, result: dict) -> None:
+        """ Writes one JSON line to `out`.
+        """
+        with self.write_lock:
+            self.out.write(json.dumps(result) + "\n")
+            self.out.flush()
+
+    def run_line(self, line_no: int, line: str) -> tuple[dict, bool]:
+        """ Executes one command and returns its result.
+
+            Returns
+            -------
+            tuple[dict, bool]
+                The result of command and False if it was `quit`
+        """
+        started = time.perf_counter()
+        keep_going = self.client.run_command(line)
+        elapsed = time.perf_counter() - started
+        records = self.collector.reset()
+        failed = any(r.levelno >= logging.WARNING for r in records)
+        result = {
+            "line": line_no,
+            "command": line,
+            "status": "error" if failed else "ok",
+            "output": [r.getMessage() for r in records],
+            "elapsed_ms": round(elapsed * 1000, 3),
+        }
+        return result, keep_going
+
+    def run(self, lines) -> int:
+        """ Executes all commands and returns the number of failed ones.
+
+            Empty lines and lines starting with `#` are skipped. The
+            client is disconnected at the end if the script didn't do it.
+
+            Parameters
+            ----------
+            lines : Iterable[str]
+                Command lines, e.g. an opened file or `sys.stdin`
+        """
+        main_handlers, sec_handlers = main_logger.handlers, sec_logger.handlers
+        main_logger.handlers = [self.collector]
+        sec_logger.handlers = [PushPrinter(self)]
+        failed = 0
+        try:
+            for line_no, line in enumerate(lines, start=1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                result, keep_going = self.run_line(line_no, line)
+                self.write(result)
+                if result["status"] == "error":
+                    failed += 1
+                    if self.stop_on_error:
+                        break
+                if not keep_going:
+                    break
+            if self.client.connected:
+                self.client.disconnect()
+                self.collector.reset()
+        finally:
+            main_logger.handlers = main_handlers
+            sec_logger.handlers = sec_handlers
+        return failed
@@ -0,0 +1,127 @@
+""" Module keeps metadata of the files read from server, so that they are
+    transferred again only when they were changed in server.
+
+    Module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    os, json
+
+    Used custom modules
+    -------------------
+    utils
+
+    Defined class
+    -------------
+    FileCache
+        Metadata (version, mtime, checksum) of cached files by their
+        names in server
+"""
+
+import os
+import json
+
+from utils import content_checksum
+
+
+class FileCache:
+    """ Metadata (version, mtime, checksum) of cached files by their
+        names in server.
+
+        The metadata is saved in the client's directory to a file which
+        starts with `__`, so it is not taken as a client's file.
+
+        Object attributes
+        -----------------
+        directory : str
+            The directory where the client keeps files
+        path : str
+            Path to the file where metadata is saved
+        entries : dict[str, dict]
+            Metadata of cached files by their names
+
+        Methods
+        -------
+        load(self)
+            Loads saved metadata
+        save(self)
+            Saves metadata to `path`
+        lookup(self, file_name: str)
+            Returns the cached version of `file_name` if the local copy
+            is still the one received from server
+        store(self, file_name: str, version: int, checksum: str)
+            Remembers the version of `file_name` which was just saved
+        forget(self, file_name: str)
+            Removes `file_name` from cache
+    """
+    def __init__(self, directory: str = "client",
+                 file_name: str = "__cache__.json"):
+        self.directory = directory
+        self.path = os.path.join(directory, file_name)
+        self.entries: dict[str, dict] = {}
+        self.load()
+
+    def load(self) -> None:
+        """ Loads saved metadata, starts with an empty cache if there is
+            no saved metadata or it is broken.
+        """
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self) -> None:
+        """ Saves metadata to `path`.
+        """
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, file_name: str) -> int | None:
+        """ Returns the cached version of `file_name` if the local copy
+            is still the one received from server.
+
+            If the modification time of the local copy changed, its
+            checksum is compared with the cached one.
+
+            Returns
+            -------
+            int
+                Cached version of the file
+            None
+                If the file is not cached or the local copy was changed
+        """
+        entry = self.entries.get(file_name)
+        if entry is None:
+            return None
+        local_path = os.path.join(self.directory, file_name)
+        try:
+            mtime = os.stat(local_path).st_mtime_ns
+            if mtime != entry["mtime"]:
+                with open(local_path, "r") as f:
+                    if content_checksum(f.read()) != entry["checksum"]:
+                        return None
+                entry["mtime"] = mtime
+        except (OSError, UnicodeDecodeError):
+            return None
+        return entry["version"]
+
+    def store(self, file_name: str, version: int, checksum: str) -> None:
+        """ Remembers the version of `file_name` which was just saved to
+            the client's directory.
+        """
+        local_path = os.path.join(self.directory, file_name)
+        self.entries[file_name] = {
+            "version": version,
+            "checksum": checksum,
+            "mtime": os.stat(local_path).st_mtime_ns,
+        }
+        self.save()
+
+    def forget(self, file_name: str) -> None:
+        """ Removes `file_name` from cache.
+        """
+        if self.entries.pop(file_name, None) is not None:
+            self.save()
@@ -4,11 +4,11 @@
 
     Used built-in modules
     ---------------------
-    os, threading, socket
+    os, json, time, logging, threading, socket
 
     Used custom modules
     -------------------
-    utils, loggers, global_vars, cmd_handlers
+    protocol, utils, loggers, global_vars, cmd_handlers, cache
 
     Defined class
     -------------
@@ -17,16 +17,27 @@
 """
 
 import os
+import json
+import time
+import logging
 from threading import Thread, Lock
-from socket import socket, AF_INET, SOCK_STREAM, gaierror, timeout
+from socket import socket, AF_INET, SOCK_STREAM, SHUT_RDWR, gaierror
 
-from utils import receive_whole_data, receive_msg
+from protocol import UNCHANGED, HEARTBEAT, PONG, SHUTDOWN, TAIL, WATCH, \
+    SESSION_ATTACHED
+from utils import send_msg_through_socket, receive_msg, \
+    receive_remaining_data, content_checksum, tune_socket, FrameReader
 from .loggers import main_logger, sec_logger
+from .cache import FileCache
 from .global_vars import SERVER_IP, MAIN_PORT, RECEIVE_PORT, BUF_SIZE, \
-    SERVER_BUF_SIZE, prompt_msg, error_prefix
+    SERVER_BUF_SIZE, CONNECT_TIMEOUT, RECONNECT_ATTEMPTS, \
+    RECONNECT_BASE_DELAY, RECONNECT_MAX_DELAY, TCP_NODELAY, KEEPALIVE, \
+    SEND_BUFFER, RECEIVE_BUFFER, HEARTBEAT_TIMEOUT, prompt_msg, \
+    error_prefix
 from .cmd_handlers import connect_cmd, disconnect_cmd, lu_cmd, lf_cmd, \
-    send_cmd, read_cmd, write_cmd, send_file_cmd, overwrite_cmd, \
-        overread_cmd, append_cmd, appendfile_cmd
+    send_cmd, write_cmd, send_file_cmd, overwrite_cmd, append_cmd, \
+        appendfile_cmd, resume_cmd, readif_cmd, tail_cmd, untail_cmd, \
+        watch_cmd, unwatch_cmd, search_cmd, stats_cmd, profile_cmd
 
 
 class Client:
@@ -49,6 +60,39 @@ class Client:
         receiving_thread : Thread
             The thread which is used for listening at `port2` for any
             messages sent by other clients
+        session_token : str
+            The token given by server on connection, which is used to
+            resume the session after losing connection
+        reconnect_lock : Lock
+            The lock which lets only one thread to reconnect at a time
+        cache : FileCache
+            Versions of files read from server, used to skip transfers
+            of files which weren't changed
+        server_ip : str
+            IP address of server, it's changed by `connect`
+        main_port : int
+            The port of server used for main communication
+        receive_port : int
+            The port of server which delivers messages of other clients
+        buf_size : int
+            The buffer size of the client
+        server_buf_size : int
+            The buffer size of server, the longest accepted input
+        connect_timeout : float | None
+            Seconds to wait for connecting to server, None waits as long
+            as the system does
+        heartbeat_timeout : float | None
+            Seconds of silence at port2 after which the server is taken
+            as dead and the client reconnects, None waits forever
+        reconnect_attempts : int
+            How many times the client tries to resume a lost session
+        reconnect_base_delay : float
+            Seconds to wait before the first reconnection attempt
+        reconnect_max_delay : float
+            The upper bound of the delay between reconnection attempts
+        socket_options : dict
+            Keyword arguments of `tune_socket` for sockets connected to
+            server
         
         Methods
         -------
@@ -60,6 +104,13 @@ class Client:
             Validates the `username` with some logic
         disconnect_attrs(self)
             Resets all necessary client's attributes while disconencting
+        close_sockets(self)
+            Closes `com_socket` and `receive_socket`
+        connection_lost(self, s: socket)
+            Is called when `s` socket stopped working, resumes session
+        reconnect(self)
+            Reconnects to server with exponential backoff and resumes 
+            the session
         debug_attrs(self)
             Keeps track of client attributes [for debugging]
         check_user_input_size(self, user_input: str)
@@ -71,22 +122,28 @@ class Client:
         ask_command(self)
             Always asks the user for input, matches it with appropriate 
             methods
+        run_command(self, user_input: str)
+            Matches one command typed by the user with appropriate 
+            method and logs the errors raised by it
         connect_to_server(self, ip: str, port: int)
             Creates the socket, connects it to the server at `port1`
         connect_to_port2(self)
-            Connect `receive_socket` to the server's `port2`
+            Connect `receive_socket` to the server's `port2` and 
+            introduce the client with its username and session token
         connect(self, username: str, ip: str)
             Establishes a full connection with server
         disconnect(self)
             Disconnects client from the server
         lu(self)
             Lists all users connected to our server
-        lf(self)
-            Lists all the files of our server's folder
+        lf(self, *options)
+            Lists files of our server's folder with their metadata
         send(self, username: str, message: str)
             Sends a `message` to another user with username = `username`
         read(self, file_name: str)
             Requests the server's `file_name` content and saves it
+        receive_file(self, file_name: str)
+            Receives the reply to READIF command and saves the file
         write(self, file_name: str)
             Sends the content of `file_name` to server
         overwrite(self, file_name: str)
@@ -95,9 +152,35 @@ class Client:
             Appends a string to server's file
         appendfile(self, src_fname: str, dst_fname)
             Appends the content of client's file to server's file
+        tail(self, *args)
+            Shows the last lines of server's file and follows it
+        untail(self, file_name: str)
+            Stops following server's `file_name`
+        watch(self, pattern: str = "")
+            Asks server to push changes of files matching `pattern`
+        unwatch(self, pattern: str = "")
+            Stops watching `pattern` or all watched files
+        send_subscription(self, cmd_handler, pattern: str)
+            Sends WATCH or UNWATCH and logs an error reply
+        search(self, *query)
+            Lists lines of server's files which match a query
+        stats(self)
+            Shows statistics of commands served by server [admins only]
+        profile(self, mode: str, seconds: str)
+            Asks server to profile itself for `seconds` [admins only]
     """
-    def __init__(self) -> None:
-        """ Initialization of client object.
+    def __init__(self, server_ip=SERVER_IP, main_port=MAIN_PORT,
+        receive_port=RECEIVE_PORT, buf_size=BUF_SIZE, 
+        server_buf_size=SERVER_BUF_SIZE, connect_timeout=CONNECT_TIMEOUT,
+        reconnect_attempts=RECONNECT_ATTEMPTS, 
+        reconnect_base_delay=RECONNECT_BASE_DELAY,
+        reconnect_max_delay=RECONNECT_MAX_DELAY, tcp_nodelay=TCP_NODELAY,
+        keepalive=KEEPALIVE, send_buffer=SEND_BUFFER, 
+        receive_buffer=RECEIVE_BUFFER,
+        heartbeat_timeout=HEARTBEAT_TIMEOUT) -> None:
+        """ Initialization of client object, keyword arguments are the
+            names of `SETTINGS` in `main.py` and their defaults are 
+            defined in `global_vars.py`.
         """
         self.username = None
         self.connected = False
@@ -105,6 +188,22 @@ class Client:
         self.com_socket: socket = None
         self.receive_socket: socket = None
         self.receiving_thread: Thread = None
+        self.session_token: str = None
+        self.reconnect_lock = Lock()
+        self.cache = FileCache()
+        self.server_ip = server_ip
+        self.main_port = main_port
+        self.receive_port = receive_port
+        self.buf_size = buf_size
+        self.server_buf_size = server_buf_size
+        self.connect_timeout = connect_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_base_delay = reconnect_base_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.socket_options = {
+            "nodelay": tcp_nodelay, "keepalive": keepalive,
+            "send_buffer": send_buffer, "receive_buffer": receive_buffer}
     
     def whoami(self) -> str:
         """ Shows the username of a client on terminal.
@@ -162,22 +261,127 @@ class Client:
             self.connected = False
         if self.connected_port2:
             self.connected_port2 = False
+        self.close_sockets()
+        self.username = ""
+        self.session_token = None
+
+    def close_sockets(self):
+        """ Closes `com_socket` and `receive_socket`.
+
+            `receive_socket` is shut down first, so that the receiving 
+            thread blocked on it wakes up.
+        """
         if not self.is_socket_closed(self.receive_socket):
+            try:
+                self.receive_socket.shutdown(SHUT_RDWR)
+            except OSError:
+                pass
             self.receive_socket.close()
         if not self.is_socket_closed(self.com_socket):
             self.com_socket.close()
-        self.username = ""
+
+    def connection_lost(self, s: socket) -> bool:
+        """ Is called when `s` socket stopped working, resumes session.
+
+            Parameters
+            ----------
+            s : socket
+                The socket object which failed
+
+            Returns
+            -------
+            bool
+                True if the client is connected again, otherwise False
+        """
+        with self.reconnect_lock:
+            # The client disconnected or another thread has already 
+            # handled the lost connection #
+            if not self.connected:
+                return False
+            if s is not self.com_socket and s is not self.receive_socket:
+                return True
+            if not self.session_token:
+                self.disconnect_attrs()
+                return False
+            return self.reconnect()
+
+    def reconnect(self) -> bool:
+        """ Reconnects to server with exponential backoff and resumes 
+            the session.
+
+            While the server hasn't noticed yet that the old connection
+            was lost, RESUME is tried again after the next delay. If the
+            server doesn't know the session anymore (for example it was 
+            restarted), a new connection with the same username is 
+            established.
+
+            Returns
+            -------
+            bool
+                True if the client is connected again, otherwise False
+        """
+        username, token = self.username, self.session_token
+        self.connected = False
+        self.connected_port2 = False
+        self.close_sockets()
+        delay = self.reconnect_base_delay
+        for attempt in range(1, self.reconnect_attempts + 1):
+            sec_logger.warning("Connection lost, reconnecting in %ss (%s/%s)",
+                               delay, attempt, self.reconnect_attempts)
+            time.sleep(delay)
+            delay = min(delay * 2, self.reconnect_max_delay)
+            s = self.connect_to_server(self.server_ip, self.main_port)
+            if not s:
+                continue
+            try:
+                resume_cmd(s, username, token)
+                message = receive_msg(s, self.buf_size)
+                if message.startswith(SESSION_ATTACHED):
+                    # The old session isn't detached yet, CONNECT would 
+                    # be refused as the username is taken #
+                    s.close()
+                    continue
+                if message.startswith(error_prefix):
+                    # Session is unknown to server, start a new one #
+                    connect_cmd(s, username)
+                    message = receive_msg(s, self.buf_size)
+            except OSError:
+                s.close()
+                continue
+            response = message.split()
+            if not response or response[0] != "OK":
+                s.close()
+                sec_logger.error(message)
+                break
+            self.com_socket = s
+            self.connected = True
+            self.session_token = response[1] if len(response) > 1 else token
+            self.connect_to_port2()
+            self.receiving_thread = Thread(
+                target=self.receive_msg_from_other_users)
+            self.receiving_thread.start()
+            sec_logger.info("Reconnected to server")
+            return True
+        self.disconnect_attrs()
+        sec_logger.error("Could not reconnect to server")
+        return False
     
     def debug_attrs(self):
         """ Keeps track of client attributes [for debugging].
         """
+        # It's called after every command, so skip it unless debugging #
+        if not main_logger.isEnabledFor(logging.DEBUG):
+            return None
         try:
-            main_logger.debug(f"username: {self.username}")
-            main_logger.debug(f"connected: {self.connected}")
-            main_logger.debug(f"connected_port2: {self.connected_port2}")
-            main_logger.debug(f"com_socket: {not self.is_socket_closed(self.com_socket)}")
-            main_logger.debug(f"receive_socket: {not self.is_socket_closed(self.receive_socket)}")
-            main_logger.debug(f"receiving_thread: {self.receiving_thread.is_alive()}")
+            main_logger.debug("username: %s", self.username)
+            main_logger.debug("connected: %s", self.connected)
+            main_logger.debug("connected_port2: %s", self.connected_port2)
+            main_logger.debug("com_socket: %s",
+                              not self.is_socket_closed(self.com_socket))
+            main_logger.debug("receive_socket: %s",
+                              not self.is_socket_closed(self.receive_socket))
+            main_logger.debug("receiving_thread: %s",
+                              self.receiving_thread.is_alive())
         except Exception:
             pass
     
@@ -189,9 +393,9 @@ class Client:
             TypeError   
                 When the input size is too much
         """
-        if len(user_input) > SERVER_BUF_SIZE:
+        if len(user_input) > self.server_buf_size:
             raise TypeError(
-                f"Too long input. Max input size is {SERVER_BUF_SIZE}")
+                f"Too long input. Max input size is {self.server_buf_size}")
 
     def print_file_content(self, file_content: str):
         """ Prints given `file_content` in a beautiful way.
@@ -205,26 +409,49 @@ class Client:
     def receive_msg_from_other_users(self):
         """ Always wait at port 2 for a new message from other users.
 
-            Receives the message content according to protocol.
+            Receives the message content according to protocol, 
+            answers HEARTBEAT frames of server with PONG, shows data
+            appended to followed files and changes of watched files and
+            warns about SHUTDOWN of server.
         """
+        receive_socket = self.receive_socket
+        reader = FrameReader(receive_socket, self.buf_size)
         # Always wait for a new message #
         while True:
             try:
                 # BLOCKED HERE #
-                command = receive_msg(self.receive_socket, BUF_SIZE)
-                if command:
-                    msg = receive_whole_data(self.receive_socket, BUF_SIZE)
-                    sec_logger.info(f"{msg}")
+                frame = reader.read_frame()
+                if frame:
+                    command, msg = frame
+                    if command == HEARTBEAT:
+                        send_msg_through_socket(receive_socket, PONG)
+                    elif command == TAIL:
+                        file_name, _, data = msg.partition(" ")
+                        sec_logger.info("%s: %s", file_name, data.rstrip())
+                    elif command == WATCH:
+                        sec_logger.info("\n".join(
+                            f"{event['file']} {event['event']} "
+                            f"(size {event['size']}, "
+                            f"version {event['version']})"
+                            for event in json.loads(msg)))
+                    elif command == SHUTDOWN:
+                        # The connection is lost soon, then resumed #
+                        sec_logger.warning("Server is shutting down in "
+                                           "at most %s s", msg)
+                    else:
+                        sec_logger.info("%s", msg)
                 else:
                     break
 
             except ConnectionResetError as exc:
-                sec_logger.error(f"{exc.strerror}")
-                self.disconnect_attrs()
+                sec_logger.error("%s", exc.strerror)
                 break
             except Exception as exc:
                 # main_logger.error(exc)
                 break
+        # Reconnection starts a new receiving thread #
+        if self.connected and receive_socket is self.receive_socket:
+            self.connection_lost(receive_socket)
     
     def ask_command(self):
         """ Always asks the user for input, matches it with appropriate 
@@ -237,65 +464,98 @@ class Client:
         while True:
             try:
                 user_input = input(prompt_msg)
-                self.check_user_input_size(user_input)
-                user_input = user_input.split(maxsplit=2)
-                command = user_input[0].lower()
-                params = user_input[1:] if len(user_input)>1 else []
-                match command:
-                    case "connect":
-                        self.connect(*params)
-                        # self.debug_attrs()
-                    case "disconnect":
-                        self.disconnect(*params)
-                        self.debug_attrs()
-                        continue
-                    case "lu":
-                        self.lu(*params)
-                        self.debug_attrs()
-                    case "lf":
-                        self.lf(*params)
-                        self.debug_attrs()
-                    case "send":
-                        self.send(*params)
-                        self.debug_attrs()
-                    case "read":
-                        self.read(*params)
-                    case "write":
-                        self.write(*params)
-                    case "overwrite":
-                        self.overwrite(*params)
-                    case "overread":
-                        self.overread(*params)
-                    case "append":
-                        self.append(*params)
-                    case "appendfile":
-                        self.appendfile(*params)
-                    case "whoami":
-                        main_logger.info(self.whoami())
-                    case "quit":
-                        # Disconnect from server and finish the client program
-                        self.disconnect(*params)
-                        main_logger.info("Client finished his job!")
-                        self.debug_attrs()
-                        break
-                    case _:
-                        main_logger.warning(f"Command '{command}' not found")
-            except IndexError:
-                main_logger.warning("Type a valid input")
-            except ValueError as exc:
-                main_logger.warning(exc)
-            except TypeError as exc:
-                main_logger.error(exc)
-            except ConnectionResetError as exc:
-                main_logger.error(exc.strerror)
-            except ConnectionRefusedError as exc:
-                main_logger.error(f"{exc.strerror}")
+                if not self.run_command(user_input):
+                    break
             except KeyboardInterrupt:
                 main_logger.error("KeyboardInterrupt")
                 self.disconnect()
                 break
-            except Exception as exc:
-                main_logger.error(f"{exc}")
+
+    def run_command(self, user_input: str) -> bool:
+        """ Matches one command typed by the user with appropriate 
+            method and logs the errors raised by it.
+
+            Parameters
+            ----------
+            user_input : str
+                The command line, e.g. `send username "msg"`
+
+            Returns
+            -------
+            bool
+                False if the client was asked to quit, otherwise True
+        """
+        try:
+            self.check_user_input_size(user_input)
+            user_input = user_input.split(maxsplit=2)
+            command = user_input[0].lower()
+            params = user_input[1:] if len(user_input)>1 else []
+            match command:
+                case "connect":
+                    self.connect(*params)
+                    # self.debug_attrs()
+                case "disconnect":
+                    self.disconnect(*params)
+                    self.debug_attrs()
+                case "lu":
+                    self.lu(*params)
+                    self.debug_attrs()
+                case "lf":
+                    self.lf(*params)
+                    self.debug_attrs()
+                case "send":
+                    self.send(*params)
+                    self.debug_attrs()
+                case "read":
+                    self.read(*params)
+                case "write":
+                    self.write(*params)
+                case "overwrite":
+                    self.overwrite(*params)
+                case "overread":
+                    self.overread(*params)
+                case "append":
+                    self.append(*params)
+                case "appendfile":
+                    self.appendfile(*params)
+                case "tail":
+                    self.tail(*params)
+                case "untail":
+                    self.untail(*params)
+                case "watch":
+                    self.watch(*params)
+                case "unwatch":
+                    self.unwatch(*params)
+                case "search":
+                    self.search(*params)
+                case "stats":
+                    self.stats(*params)
+                case "profile":
+                    self.profile(*params)
+                case "whoami":
+                    main_logger.info(self.whoami())
+                case "quit":
+                    # Disconnect from server and finish the client program
+                    self.disconnect(*params)
+                    main_logger.info("Client finished his job!")
+                    self.debug_attrs()
+                    return False
+                case _:
+                    main_logger.warning("Command '%s' not found", command)
+        except IndexError:
+            main_logger.warning("Type a valid input")
+        except ValueError as exc:
+            main_logger.warning(exc)
+        except TypeError as exc:
+            main_logger.error(exc)
+        except (ConnectionResetError, BrokenPipeError) as exc:
+            main_logger.error(exc.strerror)
+            self.connection_lost(self.com_socket)
+        except ConnectionRefusedError as exc:
+            main_logger.error("%s", exc.strerror)
+        except Exception as exc:
+            main_logger.error("%s", exc)
+        return True
     
     def connect_to_server(self, ip: str, port: int) -> socket | None:
         """ Creates the socket, connects it to the server at port1.
@@ -316,14 +576,17 @@ class Client:
         """
         try:
             s = socket(AF_INET, SOCK_STREAM)
+            tune_socket(s, **self.socket_options)
+            s.settimeout(self.connect_timeout)
             s.connect((ip, port))
+            s.settimeout(None)
             return s
         except ConnectionRefusedError as exc:
-            main_logger.error(f"{exc.strerror}")
+            main_logger.error("%s", exc.strerror)
         except gaierror:
             main_logger.error("Invalid IP address")
         except TimeoutError as exc:
-            main_logger.error(exc.strerror)
+            main_logger.error(exc.strerror or "Connection timed out")
         return None
 
     def connect_to_port2(self):
@@ -335,7 +598,14 @@ class Client:
         """
         try:
             self.receive_socket = socket(AF_INET, SOCK_STREAM)
-            self.receive_socket.connect((SERVER_IP, RECEIVE_PORT))
+            tune_socket(self.receive_socket, **self.socket_options)
+            self.receive_socket.settimeout(self.connect_timeout)
+            self.receive_socket.connect((self.server_ip, self.receive_port))
+            # Server pushes heartbeats, so silence means it's gone #
+            self.receive_socket.settimeout(self.heartbeat_timeout)
+            # Introduce ourselves, so server knows whose socket it is #
+            send_msg_through_socket(self.receive_socket,
+                                    f"{self.username} {self.session_token}")
             self.connected_port2 = True
         except Exception as exc:
             main_logger.debug(exc)
@@ -353,25 +623,27 @@ class Client:
             ip : str
                 IP address of server
         """
-        global SERVER_IP        
         ip = "127.0.0.1" if ip == "localhost" else ip
         ip = ip.rstrip()
-        SERVER_IP = ip
-        port = MAIN_PORT
+        self.server_ip = ip
+        port = self.main_port
 
         username_msg = self.check_username(username)
         if username_msg != username:
-            main_logger.warning(f"{username_msg}")
+            main_logger.warning("%s", username_msg)
             return None
 
         if not self.connected:
             self.com_socket = self.connect_to_server(ip, port)
             if self.com_socket:
                 if connect_cmd(self.com_socket, username):
-                    message = receive_msg(self.com_socket, BUF_SIZE)
-                    if message == "OK":
+                    message = receive_msg(self.com_socket, self.buf_size)
+                    response = message.split()
+                    if response and response[0] == "OK":
                         self.connected = True if self.com_socket else False
                         self.username = username
+                        if len(response) > 1:
+                            self.session_token = response[1]
                         self.connect_to_port2()
                         self.receiving_thread = Thread(
                             target=self.receive_msg_from_other_users)
@@ -394,12 +666,15 @@ class Client:
             None
         """
         if self.connected:
-            disconnect_cmd(self.com_socket)
-            message = receive_msg(self.com_socket, BUF_SIZE)
-            if message.startswith("Error"):
-                main_logger.error(message.removeprefix(error_prefix))
-                return None
-            self.disconnect_attrs()
+            # Server closes port2 socket, which must not be taken as a 
+            # lost connection #
+            with self.reconnect_lock:
+                disconnect_cmd(self.com_socket)
+                message = receive_msg(self.com_socket, self.buf_size)
+                if message.startswith("Error"):
+                    main_logger.error(message.removeprefix(error_prefix))
+                    return None
+                self.disconnect_attrs()
             main_logger.info(message)
         else:
             main_logger.warning("There was no connection")
@@ -409,27 +684,56 @@ class Client:
         """
         if self.connected:
             if lu_cmd(self.com_socket):
-                server_response = receive_msg(self.com_socket, BUF_SIZE)
+                server_response = receive_msg(self.com_socket, self.buf_size)
                 if server_response.startswith(error_prefix):
                     main_logger.error(server_response)
                 else:
                     main_logger.info(server_response)
             else:
-                self.disconnect_attrs()
+                self.connection_lost(self.com_socket)
         else:
             main_logger.warning("There was no connection")
     
-    def lf(self):
-        """ List all the files of our server's folder.
+    def lf(self, *options):
+        """ Lists files of our server's folder with their metadata.
+
+            Options are `key=value` words of LF, e.g. `match=*.txt 
+            sort=-size`, see `parse_list_options` of server. All pages
+            are listed, unless `limit` is given: then only one page is 
+            listed together with the cursor of the next one.
         """
-        if self.connected:
-            if lf_cmd(self.com_socket):
-                server_response = receive_msg(self.com_socket, BUF_SIZE)
-                main_logger.info(server_response)
-            else:
-                self.disconnect_attrs()
-        else:
+        if not self.connected:
             main_logger.warning("There was no connection")
+            return None
+        options = " ".join(options).split()
+        single_page = any(option.startswith("limit=") for option in options)
+        lines = [f"{'NAME':<32}{'SIZE':>12}{'VERSION':>22}  MODIFIED"]
+        cursor = None
+        while True:
+            page_options = options + [f"cursor={cursor}"] if cursor \
+                else options
+            if not lf_cmd(self.com_socket, page_options):
+                self.connection_lost(self.com_socket)
+                return None
+            server_response = receive_msg(self.com_socket, self.buf_size)
+            if server_response.startswith(error_prefix):
+                main_logger.error(server_response.removeprefix(error_prefix))
+                return None
+            rest = server_response.split(" ", 1)[1]
+            page = json.loads(receive_remaining_data(self.com_socket, 
+                self.buf_size, rest))
+            for meta in page["files"]:
+                modified = time.strftime("%Y-%m-%d %H:%M:%S", 
+                                         time.localtime(meta["mtime"]))
+                lines.append(f"{meta['name']:<32}{meta['size']:>12}"
+                             f"{meta['version']:>22}  {modified}")
+            cursor = page["next"]
+            if cursor is None or single_page:
+                break
+        if cursor is not None:
+            lines.append(f"More files: lf {' '.join(options)} "
+                         f"cursor={cursor}")
+        main_logger.info("\n".join(lines))
 
     def send(self, username: str, message: str):
         """ Sends a `message` to another user with username = `username`
@@ -453,7 +757,7 @@ class Client:
         # If everything is OK #
         if self.connected:
             if send_cmd(self.com_socket, username, message):
-                server_response = receive_msg(self.com_socket, BUF_SIZE)
+                server_response = receive_msg(self.com_socket, self.buf_size)
                 if server_response.startswith(error_prefix):
                     error_msg = server_response.removeprefix(error_prefix)
                     main_logger.error(error_msg)
@@ -465,6 +769,9 @@ class Client:
     def read(self, file_name: str):
         """ Requests the server's `file_name` content and saves it.
 
+            If `file_name` is already in client, it is only updated 
+            when it's a cached copy which wasn't changed locally.
+
             Parameters
             ----------
             file_name : str
@@ -478,37 +785,52 @@ class Client:
         directory_items = [item for item in directory_items 
                                 if not item.startswith("__")]
         if self.connected:
-            if file_name in directory_items:
-                main_logger.error(f"{file_name} is already in client")
+            cached_version = self.cache.lookup(file_name)
+            if file_name in directory_items and cached_version is None:
+                main_logger.error("%s is already in client", file_name)
                 return None
-            if read_cmd(self.com_socket, file_name):
-                server_response = receive_msg(self.com_socket, BUF_SIZE)
-                if server_response.startswith(error_prefix):
-                    error_msg = server_response.removeprefix(error_prefix)
-                    main_logger.error(error_msg)
-                else:
-                    main_logger.info(server_response)
-                    server_response2 = receive_whole_data(
-                        self.com_socket, BUF_SIZE)
-                    if server_response2.startswith(error_prefix):
-                        error_msg = server_response2.removeprefix(error_prefix)
-                        main_logger.error(error_msg)
-                    else:
-                        file_content = server_response2
-                        try:
-                            with open(os.path.join("client", file_name), "w") \
-                                as f:
-                                f.write(file_content)
-                        except Exception as exc:
-                            main_logger.error(exc)
-                        else:
-                            m = "The file was received successfully!"
-                            main_logger.info(m)
-                        # self.print_file_content(file_content)
+            if readif_cmd(self.com_socket, file_name, cached_version or 0):
+                self.receive_file(file_name)
             else:
-                self.disconnect_attrs(os.path.join(os.getcwd(), "client"))
+                self.connection_lost(self.com_socket)
         else:
             main_logger.warning("There was no connection")
+
+    def receive_file(self, file_name: str):
+        """ Receives the reply to READIF command and saves the file.
+
+            Parameters
+            ----------
+            file_name : str
+                The name of the requested server's file
+
+            Returns
+            -------
+            None
+        """
+        server_response = receive_msg(self.com_socket, self.buf_size)
+        if server_response.startswith(error_prefix):
+            error_msg = server_response.removeprefix(error_prefix)
+            main_logger.error(error_msg)
+            return None
+        fields = server_response.split(" ", 3)
+        if fields[0] == UNCHANGED:
+            main_logger.info("%s is up to date", file_name)
+            return None
+        _, version, checksum, rest = fields
+        file_content = receive_remaining_data(self.com_socket, self.buf_size, rest)
+        if content_checksum(file_content) != checksum:
+            main_logger.error("%s was damaged during transfer", file_name)
+            return None
+        try:
+            with open(os.path.join("client", file_name), "w") as f:
+                f.write(file_content)
+            self.cache.store(file_name, int(version), checksum)
+        except Exception as exc:
+            main_logger.error(exc)
+        else:
+            m = "The file was received successfully!"
+            main_logger.info(m)
         
     def write(self, file_name: str):
         """ Sends the content of `file_name` to server.
@@ -527,7 +849,7 @@ class Client:
                                 if not item.startswith("__")]
         if self.connected:
             if file_name not in directory_items:
-                main_logger.error(f"{file_name} is not found in client")
+                main_logger.error("%s is not found in client", file_name)
                 return None
             
             with open(os.path.join("client", file_name), "r") as f:
@@ -535,23 +857,24 @@ class Client:
                 file_size = len(file_data)
             
             if write_cmd(self.com_socket, file_name):
-                server_response = receive_msg(self.com_socket, BUF_SIZE)
+                server_response = receive_msg(self.com_socket, self.buf_size)
                 if server_response.startswith(error_prefix):
                     error_msg = server_response.removeprefix(error_prefix)
                     main_logger.error(error_msg)
                 else:
-                    main_logger.info(f"Server is ready to get contents of {file_name}...")
+                    main_logger.info("Server is ready to get contents of %s...",
+                                     file_name)
                     if send_file_cmd(self.com_socket, file_data, file_size):
-                        server_response2 = receive_msg(self.com_socket, BUF_SIZE)
+                        server_response2 = receive_msg(self.com_socket, self.buf_size)
                         if server_response.startswith(error_prefix):
                             error_msg = server_response2.removeprefix(error_prefix)
                             main_logger.error(error_msg)
                         else:
                             main_logger.info(server_response2)
                     else:
-                        self.disconnect_attrs()
+                        self.connection_lost(self.com_socket)
             else:
-                self.disconnect_attrs()
+                self.connection_lost(self.com_socket)
         else:
             main_logger.warning("There was no connection")
     
@@ -575,35 +898,39 @@ class Client:
                                 if not item.startswith("__")]
         if self.connected:
             if file_name not in directory_items:
-                main_logger.error(f"{file_name} is not found in client")
+                main_logger.error("%s is not found in client", file_name)
                 return None
             with open(os.path.join("client", file_name), "r") as f:
                 file_data = f.read()
                 file_size = len(file_data)
             if overwrite_cmd(self.com_socket, file_name):
-                server_response = receive_msg(self.com_socket, BUF_SIZE)
+                server_response = receive_msg(self.com_socket, self.buf_size)
                 if server_response.startswith(error_prefix):
                     error_msg = server_response.removeprefix(error_prefix)
                     main_logger.error(error_msg)
                 else:
-                    main_logger.info(f"Server is ready to get contents of {file_name}...")
+                    main_logger.info("Server is ready to get contents of %s...",
+                                     file_name)
                     if send_file_cmd(self.com_socket, file_data, file_size):
-                        server_response2 = receive_msg(self.com_socket, BUF_SIZE)
+                        server_response2 = receive_msg(self.com_socket, self.buf_size)
                         if server_response2.startswith(error_prefix):
                             error_msg = server_response2.removeprefix(error_prefix)
                             main_logger.error(error_msg)
                         else:
                             main_logger.info(server_response2)
                     else:
-                        self.disconnect_attrs()
+                        self.connection_lost(self.com_socket)
             else:
-                self.disconnect_attrs()
+                self.connection_lost(self.com_socket)
         else:
             main_logger.warning("There was no connection")
     
     def overread(self, file_name: str):
         """ Updates `file_name` in client from the one in server.
 
+            The file is transferred only if the server's version differs
+            from the cached one.
+
             Parameters
             ----------
             file_name : str
@@ -618,34 +945,13 @@ class Client:
                                 if not item.startswith("__")]
         if self.connected:
             if file_name in directory_items and file_name.endswith(".py"):
-                main_logger.error(f"{file_name} cannot be modified")
+                main_logger.error("%s cannot be modified", file_name)
                 return None
-            if overread_cmd(self.com_socket, file_name):
-                server_response = receive_msg(self.com_socket, BUF_SIZE)
-                if server_response.startswith(error_prefix):
-                    error_msg = server_response.removeprefix(error_prefix)
-                    main_logger.error(error_msg)
-                else:
-                    main_logger.info(server_response)
-                    server_response2 = receive_whole_data(
-                        self.com_socket, BUF_SIZE)
-                    if server_response2.startswith(error_prefix):
-                        error_msg = server_response2.removeprefix(error_prefix)
-                        main_logger.error(error_msg)
-                    else:
-                        file_content = server_response2
-                        try:
-                            with open(os.path.join("client", file_name), "w") \
-                                as f:
-                                f.write(file_content)
-                        except Exception as exc:
-                            main_logger.error(exc)
-                        else:
-                            m = "The file was received successfully!"
-                            main_logger.info(m)
-                        # self.print_file_content(file_content)
+            cached_version = self.cache.lookup(file_name)
+            if readif_cmd(self.com_socket, file_name, cached_version or 0):
+                self.receive_file(file_name)
             else:
-                self.disconnect_attrs()
+                self.connection_lost(self.com_socket)
         else:
             main_logger.warning("There was no connection")
  
@@ -673,15 +979,15 @@ class Client:
 
         if self.connected:
             if append_cmd(self.com_socket, file_name):
-                server_response = receive_msg(self.com_socket, BUF_SIZE)
+                server_response = receive_msg(self.com_socket, self.buf_size)
                 if server_response.startswith(error_prefix):
                     error_msg = server_response.removeprefix(error_prefix)
                     main_logger.error(error_msg)
                 else:
-                    main_logger.info(f"Server is ready to update {file_name}")
+                    main_logger.info("Server is ready to update %s", file_name)
                     if send_file_cmd(self.com_socket, new_content, 
                         len(new_content)):
-                        server_response2 = receive_msg(self.com_socket, BUF_SIZE)
+                        server_response2 = receive_msg(self.com_socket, self.buf_size)
                         if server_response2.startswith(error_prefix):
                             err_m = server_response2.removeprefix(error_prefix)
                             main_logger.error(err_m)
@@ -689,9 +995,9 @@ class Client:
                             m = f"Finished appending {file_name} in server"
                             main_logger.info(m)
                     else:
-                        self.disconnect_attrs()
+                        self.connection_lost(self.com_socket)
             else:
-                self.disconnect_attrs()
+                self.connection_lost(self.com_socket)
         else:
             main_logger.warning("There was no connection")
     
@@ -722,7 +1028,7 @@ class Client:
                 main_logger.error(m)
                 return None
             if appendfile_cmd(self.com_socket, src_fname, dst_fname):
-                server_response = receive_msg(self.com_socket, BUF_SIZE)
+                server_response = receive_msg(self.com_socket, self.buf_size)
                 if server_response.startswith(error_prefix):
                     error_msg = server_response.removeprefix(error_prefix)
                     main_logger.error(error_msg)
@@ -731,7 +1037,7 @@ class Client:
                     main_logger.info(m)
                     if send_file_cmd(self.com_socket, src_content, 
                         src_content_size):
-                        server_response2 = receive_msg(self.com_socket, BUF_SIZE)
+                        server_response2 = receive_msg(self.com_socket, self.buf_size)
                         if server_response2.startswith(error_prefix):
                             err_m = server_response2.removeprefix(error_prefix)
                             main_logger.error(err_m)
@@ -739,8 +1045,161 @@ class Client:
                             m = f"Finished appending {src_fname} to {dst_fname}"
                             main_logger.info(m)
                     else:
-                        self.disconnect_attrs()
+                        self.connection_lost(self.com_socket)
             else:
-                self.disconnect_attrs()
+                self.connection_lost(self.com_socket)
+        else:
+            main_logger.warning("There was no connection")
+
+    def tail(self, *args):
+        """ Shows the last lines of server's file, `args` are 
+            `file_name [lines] [follow]`. With `follow` data appended 
+            to the file is shown as it comes, until `untail`.
+        """
+        if self.connected:
+            if tail_cmd(self.com_socket, " ".join(args)):
+                server_response = receive_msg(self.com_socket, self.buf_size)
+                if server_response.startswith(error_prefix):
+                    error_msg = server_response.removeprefix(error_prefix)
+                    main_logger.error(error_msg)
+                    return None
+                rest = server_response.split(" ", 1)[1]
+                lines = receive_remaining_data(self.com_socket, 
+                    self.buf_size, rest)
+                main_logger.info(lines.rstrip())
+            else:
+                self.connection_lost(self.com_socket)
+        else:
+            main_logger.warning("There was no connection")
+
+    def untail(self, file_name: str):
+        """ Stops following server's `file_name`.
+        """
+        if self.connected:
+            if untail_cmd(self.com_socket, file_name):
+                server_response = receive_msg(self.com_socket, self.buf_size)
+                if server_response.startswith(error_prefix):
+                    main_logger.error(
+                        server_response.removeprefix(error_prefix))
+            else:
+                self.connection_lost(self.com_socket)
+        else:
+            main_logger.warning("There was no connection")
+
+    def watch(self, pattern: str = ""):
+        """ Asks server to push changes of files whose names match the
+            shell `pattern`, all files if it's empty.
+        """
+        self.send_subscription(watch_cmd, pattern)
+
+    def unwatch(self, pattern: str = ""):
+        """ Stops watching `pattern`, all watched files if it's empty.
+        """
+        self.send_subscription(unwatch_cmd, pattern)
+
+    def send_subscription(self, cmd_handler, pattern: str):
+        """ Sends WATCH or UNWATCH by `cmd_handler` and logs an error
+            reply.
+        """
+        if self.connected:
+            if cmd_handler(self.com_socket, pattern):
+                server_response = receive_msg(self.com_socket, self.buf_size)
+                if server_response.startswith(error_prefix):
+                    main_logger.error(
+                        server_response.removeprefix(error_prefix))
+            else:
+                self.connection_lost(self.com_socket)
+        else:
+            main_logger.warning("There was no connection")
+
+    def search(self, *query):
+        """ Lists lines of server's files which contain all words and
+            "quoted phrases" of the query, `limit=N` changes how many
+            lines are listed.
+        """
+        if self.connected:
+            if search_cmd(self.com_socket, " ".join(query)):
+                server_response = receive_msg(self.com_socket, self.buf_size)
+                if server_response.startswith(error_prefix):
+                    error_msg = server_response.removeprefix(error_prefix)
+                    main_logger.error(error_msg)
+                    return None
+                rest = server_response.split(" ", 1)[1]
+                result = json.loads(receive_remaining_data(self.com_socket, 
+                    self.buf_size, rest))
+                lines = [f"{match['file']}:{match['line']}" 
+                         for match in result["matches"]]
+                if not lines:
+                    lines.append("Nothing was found")
+                if result["more"]:
+                    lines.append("More lines match, use limit=N")
+                if not result["complete"]:
+                    lines.append("Server is still indexing files")
+                main_logger.info("\n".join(lines))
+            else:
+                self.connection_lost(self.com_socket)
+        else:
+            main_logger.warning("There was no connection")
+
+    def stats(self):
+        """ Shows statistics of commands served by server, only admins
+            are allowed to get them.
+        """
+        if self.connected:
+            if stats_cmd(self.com_socket):
+                server_response = receive_msg(self.com_socket, self.buf_size)
+                if server_response.startswith(error_prefix):
+                    error_msg = server_response.removeprefix(error_prefix)
+                    main_logger.error(error_msg)
+                    return None
+                rest = server_response.split(" ", 1)[1]
+                stats = json.loads(receive_remaining_data(self.com_socket, 
+                    self.buf_size, rest))
+                lines = [f"Uptime: {stats['uptime_s']} s",
+                         f"{'COMMAND':<12}{'COUNT':>8}{'ERRORS':>8}"
+                         f"{'BYTES IN':>12}{'BYTES OUT':>12}{'P50 us':>10}"
+                         f"{'P99 us':>10}{'MAX us':>10}"]
+                for name, cmd in stats["commands"].items():
+                    latency = cmd["latency"]
+                    lines.append(f"{name:<12}{cmd['count']:>8}"
+                                 f"{cmd['errors']:>8}{cmd['bytes_in']:>12}"
+                                 f"{cmd['bytes_out']:>12}"
+                                 f"{latency['p50_us']:>10}"
+                                 f"{latency['p99_us']:>10}"
+                                 f"{latency['max_us']:>10}")
+                main_logger.info("\n".join(lines))
+            else:
+                self.connection_lost(self.com_socket)
+        else:
+            main_logger.warning("There was no connection")
+
+    def profile(self, mode: str, seconds: str):
+        """ Asks server to profile itself for `seconds`, only admins are
+            allowed to do it.
+
+            Parameters
+            ----------
+            mode : str
+                "sample" writes sampled stacks for flamegraphs, 
+                "cprofile" writes cProfile reports of every command
+            seconds : str
+                Duration of profiling
+
+            Returns
+            -------
+            None
+        """
+        if self.connected:
+            if profile_cmd(self.com_socket, mode, seconds):
+                server_response = receive_msg(self.com_socket, self.buf_size)
+                if server_response.startswith(error_prefix):
+                    error_msg = server_response.removeprefix(error_prefix)
+                    main_logger.error(error_msg)
+                else:
+                    path = server_response.split(" ", 1)[1]
+                    main_logger.info("Server will write the report to %s",
+                                     path)
+            else:
+                self.connection_lost(self.com_socket)
         else:
             main_logger.warning("There was no connection")
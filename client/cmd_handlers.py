@@ -9,14 +9,24 @@
     `CONNECT USERNAME`              - connect_cmd(*params)
     `DISCONNECT`                    - disconnect_cmd(*params)
     `LU`                            - lu_cmd(*params)
-    `LF`                            - lf_cmd(*params)
-    `MESSAGE USER\nMSGSIZE MSGDATA` - send_cmd(*params)
+    `LF [KEY=VALUE ...]`            - lf_cmd(*params)
+    `MESSAGE USER MSGSIZE MSGDATA`  - send_cmd(*params)
+    `RESUME USERNAME TOKEN`         - resume_cmd(*params)
+    `READIF FILENAME VERSION`       - readif_cmd(*params)
+    `TAIL FILENAME [LINES] [follow]` - tail_cmd(*params)
+    `UNTAIL FILENAME`               - untail_cmd(*params)
+    `WATCH [PATTERN]`               - watch_cmd(*params)
+    `UNWATCH [PATTERN]`             - unwatch_cmd(*params)
+    `SEARCH QUERY`                  - search_cmd(*params)
+    `STATS`                         - stats_cmd(*params)
+    `PROFILE MODE SECONDS`          - profile_cmd(*params)
 """
 
 from socket import socket
 from utils import send_msg_through_socket
 from protocol import CONNECT, DISCONNECT, LU, LF, MESSAGE, READ, WRITE,\
-    OVERWRITE, OVERREAD, APPEND, APPENDFILE
+    OVERWRITE, OVERREAD, APPEND, APPENDFILE, RESUME, READIF, TAIL, UNTAIL, \
+    WATCH, UNWATCH, SEARCH, STATS, PROFILE
 from .loggers import main_logger
 
 
@@ -28,7 +38,18 @@ def connect_cmd(s: socket, username: str):
         send_msg_through_socket(s, m)
         return 1
     except Exception as exc:
-        main_logger.error(f"{exc}")
+        main_logger.error("%s", exc)
+    return 0
+
+def resume_cmd(s: socket, username: str, token: str):
+    """ Asks server to resume the lost session of `username`.
+    """
+    try:
+        m = f"{RESUME} {username} {token}"
+        send_msg_through_socket(s, m)
+        return 1
+    except Exception as exc:
+        main_logger.error("%s", exc)
     return 0
 
 def disconnect_cmd(s: socket):
@@ -40,7 +61,7 @@ def disconnect_cmd(s: socket):
     except ConnectionResetError as exc:
         pass
     except Exception as exc:
-        main_logger.error(f"{exc}")
+        main_logger.error("%s", exc)
     return 0
 
 
@@ -51,31 +72,31 @@ def lu_cmd(s: socket):
         send_msg_through_socket(s, LU)
         return 1
     except Exception as exc:
-        main_logger.error(f"{exc}")
+        main_logger.error("%s", exc)
     return 0
 
 
-def lf_cmd(s: socket):
-    """ Asks server to get list of all files in server's directory
+def lf_cmd(s: socket, options: list[str] = ()):
+    """ Asks server to get a page of files in server's directory,
+        `options` are `key=value` filters, sort, limit and cursor.
     """
     try:
-        send_msg_through_socket(s, LF)
+        send_msg_through_socket(s, " ".join([LF, *options]))
         return 1
     except Exception as exc:
-        main_logger.error(f"{exc}")
+        main_logger.error("%s", exc)
         return 0
 
 
 def send_cmd(s: socket, username: str, message: str):
     """ Sends to server a message for another user with username=`username`.
-        The two-step process is carried out.
+        The command and the frame of message are sent in one write, so
+        they aren't delayed by TCP and can't be glued without a space.
     """
     try:
         USER = username
         MSGSIZE, MSGDATA = len(message), message
-        m = f"{MESSAGE} {USER}"
-        send_msg_through_socket(s, m)
-        m = f"{MSGSIZE} {MSGDATA}"
+        m = f"{MESSAGE} {USER} {MSGSIZE} {MSGDATA}"
         send_msg_through_socket(s, m)
         return 1
     except Exception as exc:
@@ -96,6 +117,20 @@ def read_cmd(s: socket, file_name: str):
         return 0
 
 
+def readif_cmd(s: socket, file_name: str, version: int):
+    """ Ask server for a content of `file_name` file, unless its version
+        is `version`.
+    """
+    try:
+        FILENAME = file_name
+        m = f"{READIF} {FILENAME} {version}"
+        send_msg_through_socket(s, m)
+        return 1
+    except Exception as exc:
+        main_logger.error(exc)
+        return 0
+
+
 def write_cmd(s: socket, file_name: str):
     """ Sends to server the request write `file_name`.
     """
@@ -172,3 +207,90 @@ def appendfile_cmd(s: socket, client_fname: str, server_fname):
     except Exception as exc:
         main_logger.error(exc)
         return 0
+
+
+def tail_cmd(s: socket, args: str):
+    """ Ask server for the last lines of a file, `args` are 
+        `FILENAME [LINES] [follow]`.
+    """
+    try:
+        m = f"{TAIL} {args}"
+        send_msg_through_socket(s, m)
+        return 1
+    except Exception as exc:
+        main_logger.error(exc)
+        return 0
+
+
+def untail_cmd(s: socket, file_name: str):
+    """ Ask server to stop pushing data appended to `file_name`.
+    """
+    try:
+        m = f"{UNTAIL} {file_name}"
+        send_msg_through_socket(s, m)
+        return 1
+    except Exception as exc:
+        main_logger.error(exc)
+        return 0
+
+
+def watch_cmd(s: socket, pattern: str = ""):
+    """ Ask server to push changes of files matching `pattern`, all 
+        files if it's empty.
+    """
+    try:
+        m = f"{WATCH} {pattern}".strip()
+        send_msg_through_socket(s, m)
+        return 1
+    except Exception as exc:
+        main_logger.error(exc)
+        return 0
+
+
+def unwatch_cmd(s: socket, pattern: str = ""):
+    """ Ask server to stop pushing changes of files matching `pattern`,
+        of all watched files if it's empty.
+    """
+    try:
+        m = f"{UNWATCH} {pattern}".strip()
+        send_msg_through_socket(s, m)
+        return 1
+    except Exception as exc:
+        main_logger.error(exc)
+        return 0
+
+
+def search_cmd(s: socket, query: str):
+    """ Ask server for lines of files which match `query`.
+    """
+    try:
+        m = f"{SEARCH} {query}"
+        send_msg_through_socket(s, m)
+        return 1
+    except Exception as exc:
+        main_logger.error(exc)
+        return 0
+
+
+def stats_cmd(s: socket):
+    """ Ask server for statistics of served commands.
+    """
+    try:
+        m = f"{STATS}"
+        send_msg_through_socket(s, m)
+        return 1
+    except Exception as exc:
+        main_logger.error(exc)
+        return 0
+
+
+def profile_cmd(s: socket, mode: str, seconds: str):
+    """ Ask server to profile itself in `mode` for `seconds`.
+    """
+    try:
+        m = f"{PROFILE} {mode} {seconds}"
+        send_msg_through_socket(s, m)
+        return 1
+    except Exception as exc:
+        main_logger.error(exc)
+        return 0
@@ -1,7 +1,9 @@
 """ Module that defines some global variables for client application.
 
     The module is not intended to be runned. Only constants are 
-    imported by other modules.
+    imported by other modules. They are defaults of `Client`, which can
+    be changed by `client.main` options, environment variables and a
+    config file (see `config.py`).
 
     Defined constants
     -----------------
@@ -16,6 +18,28 @@
         The buffer size of a client
     SERVER_BUF_SIZE : str
         The buffer size of a server
+    CONNECT_TIMEOUT : float | None
+        Seconds to wait for connecting to server, None waits as long as
+        the system does
+    TCP_NODELAY : bool
+        Whether commands are sent at once, without Nagle's algorithm
+    KEEPALIVE : bool
+        Whether a dead server is detected by TCP keepalive probes
+    SEND_BUFFER : int | None
+        SO_SNDBUF of the client's sockets, None keeps the system's one
+    RECEIVE_BUFFER : int | None
+        SO_RCVBUF of the client's sockets, None keeps the system's one
+    HEARTBEAT_TIMEOUT : float | None
+        Seconds of silence at port2 after which the server is taken as
+        dead and the client reconnects, it must be longer than the 
+        server's heartbeat interval. None waits forever
+    RECONNECT_ATTEMPTS : int
+        How many times the client tries to resume a lost session
+    RECONNECT_BASE_DELAY : float
+        Seconds to wait before the first reconnection attempt, the delay
+        is doubled after each failed attempt
+    RECONNECT_MAX_DELAY : float
+        The upper bound of the delay between reconnection attempts
     prompt_msg : str
         The message which is prompted when receiving input from user
     error_prefix : str
@@ -27,5 +51,14 @@ MAIN_PORT = 2021
 RECEIVE_PORT = 2022
 BUF_SIZE = 128
 SERVER_BUF_SIZE = 4096
+CONNECT_TIMEOUT = 10.0
+TCP_NODELAY = True
+KEEPALIVE = True
+SEND_BUFFER = None
+RECEIVE_BUFFER = None
+HEARTBEAT_TIMEOUT = 90.0
+RECONNECT_ATTEMPTS = 6
+RECONNECT_BASE_DELAY = 0.5
+RECONNECT_MAX_DELAY = 8.0
 prompt_msg = "Enter a command: "
 error_prefix = "Error: "
@@ -35,6 +35,11 @@ class CustomFormatter(logging.Formatter):
             Format of log messages
         self.FORMATS : dict[int, str]
             Dictionary of log_level and its ANSI color key-value pairs
+        self.formatters : dict[int, logging.Formatter]
+            Formatters of `FORMATS`, created once instead of on every
+            record
+        self.default_formatter : logging.Formatter
+            Formatter of records with levels missing in `FORMATS`
         
         Methods
         -------
@@ -62,10 +67,15 @@ class CustomFormatter(logging.Formatter):
             logging.ERROR: self.red + self.fmt + self.reset,
             logging.CRITICAL: self.bold_red + self.fmt + self.reset
         }
+        self.formatters = {
+            levelno: logging.Formatter(log_fmt) 
+            for levelno, log_fmt in self.FORMATS.items()
+        }
+        self.default_formatter = logging.Formatter(self.fmt)
 
     def format(self, record):
         """ Format specified `record` as text.
         """
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt)
-        return formatter.format(record)
\ No newline at end of file
+        formatter = self.formatters.get(record.levelno, 
+                                        self.default_formatter)
+        return formatter.format(record)
@@ -1,24 +1,104 @@
 """ This module must be runned to start a client
 
+    Without options the client asks for commands interactively. With
+    `--script FILE` commands are read from FILE (or stdin if FILE is 
+    `-`) and executed without prompts, printing one JSON result line 
+    per command.
+
+    Settings of the client (server address, ports, buffer sizes, 
+    timeouts, ...) are taken from command line options, environment 
+    variables and a config file, see `config.py` and 
+    `python -m client.main --help`.
+
+    Used built-in modules
+    ---------------------
+    sys, argparse
+
     Used custom modules
     -------------------
-    client
+    config, client, batch, global_vars
 
     Defined function
     ----------------
+    parse_args()
+        Parses command line options and settings of the client
     main()
         Creates a client and starts it
 """
 
+import sys
+import argparse
+
+from config import load_config, optional_int, optional_float, str_bool
 from .client import Client
+from .batch import BatchRunner
+from .global_vars import SERVER_IP, MAIN_PORT, RECEIVE_PORT, BUF_SIZE, \
+    SERVER_BUF_SIZE, CONNECT_TIMEOUT, RECONNECT_ATTEMPTS, \
+    RECONNECT_BASE_DELAY, RECONNECT_MAX_DELAY, TCP_NODELAY, KEEPALIVE, \
+    SEND_BUFFER, RECEIVE_BUFFER, HEARTBEAT_TIMEOUT
+
+# Settings which can be changed without editing the code, see `config.py`.
+# Every setting is (name, default, convert, help), where the name is
+# the keyword argument of `Client` #
+SETTINGS = [
+    ("server_ip", SERVER_IP, str, 
+     "address of server used for reconnecting before `connect`"),
+    ("main_port", MAIN_PORT, int, "port of server for commands"),
+    ("receive_port", RECEIVE_PORT, int,
+     "port of server which delivers messages"),
+    ("buf_size", BUF_SIZE, int, "buffer size of the client"),
+    ("server_buf_size", SERVER_BUF_SIZE, int,
+     "buffer size of server, the longest accepted input"),
+    ("connect_timeout", CONNECT_TIMEOUT, optional_float,
+     "seconds to wait for connecting to server, none waits as long as "
+     "the system does"),
+    ("heartbeat_timeout", HEARTBEAT_TIMEOUT, optional_float,
+     "seconds of silence at port2 before reconnecting, none waits "
+     "forever"),
+    ("reconnect_attempts", RECONNECT_ATTEMPTS, int,
+     "attempts to resume a lost session"),
+    ("reconnect_base_delay", RECONNECT_BASE_DELAY, float,
+     "seconds before the first reconnection attempt"),
+    ("reconnect_max_delay", RECONNECT_MAX_DELAY, float,
+     "the longest delay between reconnection attempts"),
+    ("tcp_nodelay", TCP_NODELAY, str_bool, "set TCP_NODELAY on sockets"),
+    ("keepalive", KEEPALIVE, str_bool, "set SO_KEEPALIVE on sockets"),
+    ("send_buffer", SEND_BUFFER, optional_int,
+     "SO_SNDBUF of sockets in bytes, none is system's"),
+    ("receive_buffer", RECEIVE_BUFFER, optional_int,
+     "SO_RCVBUF of sockets in bytes, none is system's"),
+]
+
+
+def parse_args(argv=None) -> tuple[argparse.Namespace, dict]:
+    """ Parses command line options and settings of the client.
+    """
+    parser = argparse.ArgumentParser(prog="python -m client.main")
+    parser.add_argument(
+        "--script", metavar="FILE",
+        help="execute commands from FILE ('-' for stdin) without prompts")
+    parser.add_argument(
+        "--stop-on-error", action="store_true",
+        help="stop the script after the first failed command")
+    return load_config("client", SETTINGS, parser, argv)
 
 
 def main():
     """ Creates a client and starts it.
     """
-    client = Client()
-    client.ask_command()
+    args, settings = parse_args()
+    client = Client(**settings)
+    if args.script is None:
+        client.ask_command()
+        return
+    runner = BatchRunner(client, stop_on_error=args.stop_on_error)
+    if args.script == "-":
+        failed = runner.run(sys.stdin)
+    else:
+        with open(args.script, "r") as f:
+            failed = runner.run(f)
+    sys.exit(1 if failed else 0)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
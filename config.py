@@ -0,0 +1,183 @@
+""" Module reads settings of client and server from a config file,
+    environment variables and command line options.
+
+    Every setting has a default value in the code. A setting is looked
+    up in this order, the first found value wins:
+      1. the command line option, e.g. `--buf-size 65536`
+      2. the environment variable `OS_<SECTION>_<NAME>`, e.g.
+         `OS_SERVER_BUF_SIZE=65536`
+      3. the option `name` in section `[section]` of the config file,
+         which is given by `--config FILE`, by the environment variable
+         `OS_PROJECT_CONFIG` or is `os_project.ini` in the current
+         directory
+      4. the default value
+
+    The module is not intended to be runned! The module is used by
+    `client.main` and `server.main`.
+
+    Used built-in modules
+    ---------------------
+    os, argparse, configparser
+
+    Defined functions
+    -----------------
+    optional_int(value: str) -> int | None
+        Converts a string to int, "none" and "" give None
+    optional_float(value: str) -> float | None
+        Converts a string to float, "none" and "" give None
+    str_list(value: str) -> list[str]
+        Splits a comma separated string to a list
+    str_bool(value: str) -> bool
+        Converts yes/no, true/false, on/off and 1/0 to bool
+    add_config_arguments(parser: ArgumentParser, settings: list[tuple])
+        Adds `--config` and an option for every setting to `parser`
+    resolve_settings(args: Namespace, section: str, settings: list[tuple])
+        -> dict
+        Returns values of settings from options, environment, config
+        file and defaults
+    load_config(section: str, settings: list[tuple],
+        parser: ArgumentParser, argv: list[str] | None)
+        -> tuple[Namespace, dict]
+        Parses command line options and resolves settings
+"""
+
+import os
+import argparse
+import configparser
+
+CONFIG_ENV = "OS_PROJECT_CONFIG"  # Environment variable with config path
+DEFAULT_CONFIG_FILE = "os_project.ini"  # Config read from the current dir
+ENV_PREFIX = "OS_"
+
+
+def optional_int(value: str) -> int | None:
+    """ Converts a string to int, "none" and "" give None.
+    """
+    if value.strip().lower() in ("", "none"):
+        return None
+    return int(value)
+
+
+def optional_float(value: str) -> float | None:
+    """ Converts a string to float, "none" and "" give None.
+    """
+    if value.strip().lower() in ("", "none"):
+        return None
+    return float(value)
+
+
+def str_list(value: str) -> list[str]:
+    """ Splits a comma separated string to a list of non-empty items.
+    """
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def str_bool(value: str) -> bool:
+    """ Converts yes/no, true/false, on/off and 1/0 to bool.
+    """
+    value = value.strip().lower()
+    if value in ("1", "yes", "true", "on"):
+        return True
+    if value in ("0", "no", "false", "off"):
+        return False
+    raise ValueError(f"{value} is not a boolean")
+
+
+def add_config_arguments(parser: argparse.ArgumentParser,
+                         settings: list[tuple]) -> None:
+    """ Adds `--config` and an option for every setting to `parser`.
+
+        Parameters
+        ----------
+        parser : ArgumentParser
+            The parser of command line options
+        settings : list[tuple]
+            Settings as (name, default, convert, help) tuples, where
+            `convert` turns a string to the value of setting
+    """
+    parser.add_argument(
+        "--config", metavar="FILE",
+        help=f"config file (default is ${CONFIG_ENV} or "
+             f"{DEFAULT_CONFIG_FILE} if it exists)")
+    group = parser.add_argument_group("settings")
+    for name, default, convert, help_text in settings:
+        # Options which weren't given are missing in parsed options #
+        group.add_argument(f"--{name.replace('_', '-')}", dest=name,
+                           type=convert, default=argparse.SUPPRESS,
+                           help=f"{help_text} (default is {default})")
+
+
+def resolve_settings(args: argparse.Namespace, section: str,
+                     settings: list[tuple]) -> dict:
+    """ Returns values of settings from options, environment, config
+        file and defaults.
+
+        Parameters
+        ----------
+        args : Namespace
+            Parsed options, including those added by
+            `add_config_arguments`
+        section : str
+            The section of config file and the part of environment
+            variables, e.g. "server"
+        settings : list[tuple]
+            Settings as (name, default, convert, help) tuples
+
+        Returns
+        -------
+        dict
+            Values of settings by their names
+
+        Raises
+        ------
+        ValueError
+            If a value can't be converted or the given config file
+            doesn't exist
+    """
+    path = args.config or os.environ.get(CONFIG_ENV)
+    if path and not os.path.isfile(path):
+        raise ValueError(f"Config file {path} is not found")
+    path = path or (DEFAULT_CONFIG_FILE if os.path.isfile(DEFAULT_CONFIG_FILE)
+                    else None)
+    parser = configparser.ConfigParser(interpolation=None)
+    if path:
+        parser.read(path)
+    file_values = parser[section] if parser.has_section(section) else {}
+
+    values = {}
+    for name, default, convert, _ in settings:
+        env_name = f"{ENV_PREFIX}{section}_{name}".upper()
+        if name in vars(args):
+            values[name] = getattr(args, name)
+        elif env_name in os.environ:
+            source, raw = env_name, os.environ[env_name]
+        elif name in file_values:
+            source, raw = f"{path} [{section}] {name}", file_values[name]
+        else:
+            values[name] = default
+        if name not in values:
+            try:
+                values[name] = convert(raw)
+            except ValueError:
+                raise ValueError(f"Invalid value {raw!r} of {source}")
+    return values
+
+
+def load_config(section: str, settings: list[tuple],
+                parser: argparse.ArgumentParser,
+                argv: list[str] | None = None
+                ) -> tuple[argparse.Namespace, dict]:
+    """ Parses command line options and resolves settings, errors are
+        reported by `parser` and stop the program.
+
+        Returns
+        -------
+        tuple[Namespace, dict]
+            Parsed options and values of settings by their names
+    """
+    add_config_arguments(parser, settings)
+    args = parser.parse_args(argv)
+    try:
+        return args, resolve_settings(args, section, settings)
+    except ValueError as exc:
+        parser.error(str(exc))
@@ -13,7 +13,8 @@
     LU : str
         The command protocol used for listing the online users in server
     LF : str
-        The command protovol user for listing the files in server
+        The command protovol user for listing the files in server, one
+        page with metadata per request
     MESSAGE : str
         The command protovol user for communication of clients through
         a server
@@ -33,6 +34,46 @@
     APPENDFILE : str
         The command protovol user for appending client's file data to
         server's file
+    RESUME : str
+        The command protocol used for resuming a lost session with the
+        resume token given by server on connection
+    SESSION_ATTACHED : str
+        The reply to RESUME when server hasn't noticed yet that the 
+        connection of the session was lost, client should try again
+    READIF : str
+        The command protocol used for reading a file from server only
+        if its version differs from the one cached by client
+    UNCHANGED : str
+        The reply to READIF when the cached version is still current
+    TAIL : str
+        The command protocol used for reading the last lines of a file
+        and following data appended to it, which server pushes to port2
+        as `TAIL SIZE FILE_NAME DATA`
+    UNTAIL : str
+        The command protocol used for stopping to follow a file
+    WATCH : str
+        The command protocol used for subscribing to changes of files,
+        which server pushes to port2 as `WATCH SIZE EVENTS`
+    UNWATCH : str
+        The command protocol used for cancelling subscriptions
+    SEARCH : str
+        The command protocol used for finding lines of server's files
+        which contain some words or phrases
+    STATS : str
+        The command protocol used by admins for getting statistics of
+        commands served by server
+    PROFILE : str
+        The command protocol used by admins for profiling server for 
+        some seconds
+    HEARTBEAT : str
+        The frame which server pushes to port2 of clients periodically,
+        so both ends notice dead connections (`HEARTBEAT 0 `)
+    PONG : str
+        The reply of client to HEARTBEAT, sent through its port2 socket
+    SHUTDOWN : str
+        The frame which server pushes to port2 when it starts shutting
+        down, its data is the number of seconds it waits for commands
+        being served (`SHUTDOWN SIZE SECONDS`)
 """
 
 CONNECT = "CONNECT"
@@ -45,4 +86,18 @@ WRITE = "WRITE"
 OVERWRITE = "OVERWRITE"
 OVERREAD = "OVERREAD"
 APPEND = "APPEND"
-APPENDFILE = "APPENDFILE"
\ No newline at end of file
+APPENDFILE = "APPENDFILE"
+RESUME = "RESUME"
+SESSION_ATTACHED = "Error: Session is still attached"
+READIF = "READIF"
+UNCHANGED = "UNCHANGED"
+TAIL = "TAIL"
+UNTAIL = "UNTAIL"
+WATCH = "WATCH"
+UNWATCH = "UNWATCH"
+SEARCH = "SEARCH"
+STATS = "STATS"
+PROFILE = "PROFILE"
+HEARTBEAT = "HEARTBEAT"
+PONG = "PONG"
+SHUTDOWN = "SHUTDOWN"
@@ -6,4 +6,46 @@
         This module must be runned to start a server
     server.py
         The module defines the logic of a TCP server in a class Server
+    sessions.py
+        The module keeps track of clients' sessions for resuming them
+    file_index.py
+        The module keeps metadata of the files in server's directory
+    stats.py
+        The module collects counts, bytes, errors and latencies of 
+        served commands
+    metrics_http.py
+        The module serves statistics of server in Prometheus format
+    profiler.py
+        The module profiles a running server on demand
+    logs.py
+        The module writes log messages of server in a background thread
+    access_log.py
+        The module keeps a structured log of every served command and
+        can be runned to read it
+    reaper.py
+        The module pushes heartbeats to clients and reaps dead sessions
+    rate_limiter.py
+        The module paces users who exceed their rates of commands and
+        bytes
+    quota.py
+        The module accounts storage of files by users and enforces 
+        storage quotas
+    workers.py
+        The module serves clients by several processes which share 
+        ports, sessions and messages
+    cluster.py
+        The module joins several server nodes to a cluster, which share
+        their users and route messages to each other
+    replication.py
+        The module replicates files of a primary server to read-only
+        replicas
+    search_index.py
+        The module keeps an inverted index of words in server's text
+        files for SEARCH
+    tail.py
+        The module serves the last lines of files and follows data 
+        appended to them
+    watch.py
+        The module pushes coalesced changes of files to users who watch
+        them
 """
\ No newline at end of file
@@ -0,0 +1,287 @@
+""" The module keeps an access log of every command served by server:
+    who sent it, which file it touched, bytes, duration and result.
+
+    Threads serving clients only append a tuple to a deque. A writer
+    thread takes the collected records every `FLUSH_INTERVAL` seconds
+    and writes them as JSON lines in one batch to the current segment.
+    When a segment grows over `max_segment_bytes`, a new one is started
+    and the oldest segments over `max_segments` are removed.
+
+    Every line is an object with keys:
+        ts     - Unix time when the command finished
+        user   - username of the client, null before CONNECT
+        cmd    - the command
+        file   - the file in server the command touched, or null
+        in     - bytes received from the client
+        out    - bytes sent to the client
+        us     - microseconds spent serving the command
+        result - "ok" or "error"
+
+    The module can be runned to read the log:
+        python -m server.access_log [--dir DIR] [--user U] [--cmd C]
+                                    [--since UNIX_TIME] [--summary]
+
+    Used built-in modules
+    ---------------------
+    os, json, time, logging, argparse, threading, collections
+
+    Classes
+    -------
+    Class AccessLog:
+        Collects records of served commands and writes them in batches
+        to rotated segments
+
+    Functions
+    ---------
+    segment_paths(directory: str) -> list[str]
+        Returns paths of segments from the oldest one
+    read_records(directory: str)
+        Yields records of all segments from the oldest one
+    summarize(records)
+        Returns per command statistics of records as text
+    main()
+        Prints records or their summary
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from collections import deque, defaultdict
+
+ACCESS_LOG_DIR = os.path.join("server", "__logs__")
+SEGMENT_PREFIX = "access-"
+SEGMENT_SUFFIX = ".jsonl"
+FLUSH_INTERVAL = 0.5  # Seconds between two batches written by the writer
+
+
+class AccessLog:
+    """ Collects records of served commands and writes them in batches
+        to rotated segments.
+
+        Attributes
+        ----------
+        directory : str
+            The directory of segments
+        max_segment_bytes : int
+            Size after which a new segment is started
+        max_segments : int
+            Number of kept segments, older ones are removed
+        records : deque[tuple]
+            Records waiting for the writer
+        running : bool
+            Whether the writer is running, records are dropped otherwise
+        segment : TextIO | None
+            The open segment
+        segment_size : int
+            Bytes written to the open segment
+        stop_event : Event
+            Is set to stop the writer
+        writer : Thread | None
+            The writer thread
+
+        Methods
+        -------
+        start(self)
+            Starts the writer thread
+        log(self, user: str | None, command: str, file_name: str | None,
+            bytes_in: int, bytes_out: int, duration_us: int, ok: bool)
+            Adds a record of a served command
+        close(self)
+            Writes the remaining records and stops the writer
+        run_writer(self)
+            Writes collected records until `close()` is called
+        write_pending(self)
+            Writes all collected records as one batch
+        open_segment(self)
+            Starts a new segment and removes the oldest ones
+    """
+    def __init__(self, directory: str = ACCESS_LOG_DIR,
+                 max_segment_bytes: int = 64 * 1024 * 1024,
+                 max_segments: int = 20):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self.records: deque[tuple] = deque()
+        self.running = False
+        self.segment = None
+        self.segment_size = 0
+        self.stop_event = threading.Event()
+        self.writer: threading.Thread | None = None
+
+    def start(self) -> None:
+        """ Starts the writer thread.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.stop_event.clear()
+        self.running = True
+        self.writer = threading.Thread(target=self.run_writer,
+                                       name="access-log", daemon=True)
+        self.writer.start()
+
+    def log(self, user: str | None, command: str, file_name: str | None,
+            bytes_in: int, bytes_out: int, duration_us: int,
+            ok: bool) -> None:
+        """ Adds a record of a served command, it's written by the
+            writer thread later. Does nothing if the writer isn't
+            running.
+        """
+        if self.running:
+            # deque.append is atomic, so no lock is needed #
+            self.records.append((time.time(), user, command, file_name,
+                                 bytes_in, bytes_out, duration_us, ok))
+
+    def close(self) -> None:
+        """ Writes the remaining records and stops the writer.
+        """
+        if not self.running:
+            return None
+        self.running = False
+        self.stop_event.set()
+        self.writer.join()
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+    def run_writer(self) -> None:
+        """ Writes collected records every `FLUSH_INTERVAL` seconds
+            until `close()` is called.
+        """
+        while not self.stop_event.wait(FLUSH_INTERVAL):
+            self.write_pending()
+        self.write_pending()
+
+    def write_pending(self) -> None:
+        """ Writes all collected records as one batch.
+        """
+        records = self.records
+        lines = []
+        # Only strings need JSON escaping, the rest is formatted directly,
+        # which is a few times faster than `json.dumps` of a dictionary #
+        quote = json.dumps
+        while records:
+            ts, user, command, file_name, bytes_in, bytes_out, us, ok = \
+                records.popleft()
+            lines.append(f'{{"ts":{ts:.3f},"user":{quote(user)},'
+                         f'"cmd":{quote(command)},"file":{quote(file_name)},'
+                         f'"in":{bytes_in},"out":{bytes_out},"us":{us},'
+                         f'"result":"{"ok" if ok else "error"}"}}')
+        if not lines:
+            return None
+        batch = "\n".join(lines) + "\n"
+        try:
+            if self.segment is None or \
+                    self.segment_size >= self.max_segment_bytes:
+                self.open_segment()
+            self.segment.write(batch)
+            self.segment.flush()
+            self.segment_size += len(batch)
+        except OSError as exc:
+            logging.error("Access log cannot be written: %s", exc)
+
+    def open_segment(self) -> None:
+        """ Starts a new segment and removes the oldest ones over
+            `max_segments`.
+        """
+        if self.segment is not None:
+            self.segment.close()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.directory,
+                            f"{SEGMENT_PREFIX}{stamp}-{time.time_ns()}"
+                            f"{SEGMENT_SUFFIX}")
+        self.segment = open(path, "a")
+        self.segment_size = 0
+        segments = segment_paths(self.directory)
+        for old_path in segments[:-self.max_segments]:
+            os.remove(old_path)
+
+
+def segment_paths(directory: str) -> list[str]:
+    """ Returns paths of segments in `directory` from the oldest one.
+    """
+    try:
+        names = sorted(name for name in os.listdir(directory)
+                       if name.startswith(SEGMENT_PREFIX) and
+                       name.endswith(SEGMENT_SUFFIX))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in names]
+
+
+def read_records(directory: str = ACCESS_LOG_DIR):
+    """ Yields records of all segments from the oldest one, skipping
+        broken lines (e.g. the last line of a crashed server).
+    """
+    for path in segment_paths(directory):
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def summarize(records) -> str:
+    """ Returns per command statistics of records as text: count,
+        errors, bytes and duration percentiles.
+    """
+    durations = defaultdict(list)
+    totals = defaultdict(lambda: [0, 0, 0])
+    users = set()
+    first = last = None
+    for record in records:
+        command = record["cmd"]
+        durations[command].append(record["us"])
+        total = totals[command]
+        total[0] += record["result"] != "ok"
+        total[1] += record["in"]
+        total[2] += record["out"]
+        users.add(record["user"])
+        first = record["ts"] if first is None else first
+        last = record["ts"]
+    if first is None:
+        return "No records"
+    span = max(last - first, 1e-9)
+    lines = [f"{sum(map(len, durations.values()))} records of "
+             f"{len(users - {None})} users in {span:.1f} s",
+             f"{'COMMAND':<12}{'COUNT':>9}{'PER SEC':>9}{'ERRORS':>8}"
+             f"{'BYTES IN':>12}{'BYTES OUT':>12}{'P50 us':>9}{'P99 us':>9}"]
+    for command, values in sorted(durations.items()):
+        values.sort()
+        p50 = values[(len(values) - 1) // 2]
+        p99 = values[min(len(values) - 1, int(len(values) * 0.99))]
+        errors, bytes_in, bytes_out = totals[command]
+        lines.append(f"{command:<12}{len(values):>9}"
+                     f"{len(values) / span:>9.1f}{errors:>8}{bytes_in:>12}"
+                     f"{bytes_out:>12}{p50:>9}{p99:>9}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """ Prints records of the access log or their summary.
+    """
+    parser = argparse.ArgumentParser(prog="python -m server.access_log")
+    parser.add_argument("--dir", default=ACCESS_LOG_DIR,
+                        help="directory of segments")
+    parser.add_argument("--user", help="only records of this user")
+    parser.add_argument("--cmd", help="only records of this command")
+    parser.add_argument("--since", type=float, default=0,
+                        help="only records after this Unix time")
+    parser.add_argument("--summary", action="store_true",
+                        help="print statistics instead of records")
+    args = parser.parse_args(argv)
+    records = (record for record in read_records(args.dir)
+               if record["ts"] >= args.since and
+               (args.user is None or record["user"] == args.user) and
+               (args.cmd is None or record["cmd"] == args.cmd.upper()))
+    if args.summary:
+        print(summarize(records))
+    else:
+        for record in records:
+            print(json.dumps(record))
+
+
+if __name__ == "__main__":
+    main()
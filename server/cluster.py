@@ -0,0 +1,462 @@
+""" The module joins several server nodes to a cluster, so that users
+    connected to different nodes see and message each other.
+
+    Nodes are listed statically in the config of every node (see
+    `parse_peers`) and talk over a separate TCP port with frames of
+    `utils.FrameReader` (COMMAND SIZE DATA):
+      - GOSSIP carries the usernames of all sessions of a node, which
+        is sent to every peer each `gossip_interval` seconds and right
+        after a user connected or left. Peers cache it as a directory
+        of users by nodes, entries which weren't refreshed for
+        `DIRECTORY_TTL` intervals belong to a node which is gone.
+      - FORWARD carries a MESSAGE to a user of the receiving node, it's
+        answered by REPLY with the reply for the sender (OK or Error).
+
+    Only nodes of the list may join: a connection from an address which
+    isn't one of the listed hosts is closed at once, and both sides
+    prove that they know the shared `secret` before any other frame
+    (see `utils.authenticate_peer`), so a stranger can neither learn
+    users nor forward messages.
+
+    So LU returns the online users of all nodes, MESSAGE reaches a user
+    at any node and a username taken at one node is refused by the
+    others. The directory is a cache: two nodes may accept the same
+    username at the same moment, before their gossip meets.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    json, time, socket, logging, threading, collections
+
+    Used custom modules
+    -------------------
+    utils
+
+    Functions
+    ---------
+    parse_peers(value: str) -> dict[str, tuple[str, int]]
+        Converts `name=host:port, ...` to addresses of nodes
+
+    Classes
+    -------
+    Class PeerLink:
+        The connection to one peer node
+    Class Cluster:
+        The directory of users at other nodes and the routing of
+        messages to them
+"""
+
+import json
+import time
+import socket
+import logging
+import threading
+from collections import Counter
+
+from utils import FrameReader, tune_socket, authenticate_peer
+
+GOSSIP = "GOSSIP"
+FORWARD = "FORWARD"
+REPLY = "REPLY"
+OK = "OK"
+PEER_TIMEOUT = 2.0       # Seconds to connect to a peer and to get a reply
+DIRECTORY_TTL = 3        # Gossip intervals after which a node is gone
+NODE_BUF_SIZE = 65536
+
+
+def parse_peers(value: str) -> dict[str, tuple[str, int]]:
+    """ Converts `name=host:port, ...` to addresses of nodes by their
+        names.
+
+        Raises
+        ------
+        ValueError
+            If an entry has no name, no host or its port isn't a number
+    """
+    peers = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, separator, address = item.partition("=")
+        host, _, port = address.strip().rpartition(":")
+        if not separator or not name.strip() or not host:
+            raise ValueError(f"Invalid peer {item!r}")
+        peers[name.strip()] = (host, int(port))
+    return peers
+
+
+class PeerLink:
+    """ The connection to one peer node, it's opened when it's first
+        needed and again after it failed.
+
+        Attributes
+        ----------
+        name : str
+            The name of the peer
+        address : tuple[str, int]
+            The cluster address of the peer
+        secret : str
+            The secret shared by nodes of the cluster
+        sock : socket | None
+            The connection, None while it's closed
+        reader : FrameReader | None
+            Reads replies from `sock`
+        lock : Lock
+            Serializes frames of different threads
+
+        Methods
+        -------
+        send(self, command: str, data: str, wait_reply: bool = False)
+            Sends a frame and returns the data of the reply
+        close(self)
+            Closes the connection
+    """
+    def __init__(self, name: str, address: tuple[str, int], secret: str):
+        self.name = name
+        self.address = address
+        self.secret = secret
+        self.sock: socket.socket | None = None
+        self.reader: FrameReader | None = None
+        self.lock = threading.Lock()
+
+    def send(self, command: str, data: str,
+             wait_reply: bool = False) -> str | None:
+        """ Sends the frame `command` with `data` to the peer and, with
+            `wait_reply`, returns the data of its reply.
+
+            Raises
+            ------
+            OSError
+                If the peer cannot be reached or doesn't know the 
+                secret, the connection is closed
+        """
+        frame = f"{command} {len(data)} {data}".encode()
+        with self.lock:
+            try:
+                if self.sock is None:
+                    self.sock = socket.create_connection(self.address,
+                                                         PEER_TIMEOUT)
+                    tune_socket(self.sock)
+                    self.reader = FrameReader(self.sock, NODE_BUF_SIZE)
+                    authenticate_peer(self.sock, self.reader, self.secret,
+                                      initiator=True)
+                self.sock.sendall(frame)
+                if not wait_reply:
+                    return None
+                reply = self.reader.read_frame()
+                if reply is None:
+                    raise ConnectionError(f"{self.name} closed connection")
+                return reply[1]
+            except OSError:
+                self.close()
+                raise
+
+    def close(self) -> None:
+        """ Closes the connection, the next frame opens a new one.
+        """
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+        self.reader = None
+
+
+class Cluster:
+    """ The directory of users at other nodes and the routing of
+        messages to them.
+
+        Attributes
+        ----------
+        server : Server
+            The server of this node
+        name : str
+            The name of this node
+        address : tuple[str, int]
+            The address at which peers connect to this node
+        links : dict[str, PeerLink]
+            Connections to peers by their names
+        secret : str
+            The secret shared by nodes of the cluster
+        gossip_interval : float
+            Seconds between two gossips of this node
+        directory : dict[str, tuple[dict[str, bool], float]]
+            Users of other nodes (username: whether it's online) and
+            monotonic time when they were received, by names of nodes
+        counts : Counter
+            Gossips and forwarded messages sent and received
+        listener : socket | None
+            Accepts connections of peers
+        changed : Event
+            Is set to gossip at once, when users of this node changed
+        stop_event : Event
+            Is set to stop the cluster threads
+        lock : Lock
+            The lock which protects `directory` and `counts`
+
+        Methods
+        -------
+        start(self)
+            Starts serving peers and gossiping
+        stop(self)
+            Tells peers that this node leaves and stops the threads
+        accept_peers(self)
+            Accepts connections of peers until stopped
+        peer_hosts(self)
+            Returns IP addresses of listed peers
+        serve_peer(self, conn: socket)
+            Handles frames of a peer until it disconnects
+        handle_gossip(self, data: str)
+            Stores users of a peer in the directory
+        handle_forward(self, data: str)
+            Delivers a message forwarded by a peer
+        run_gossip(self)
+            Gossips each `gossip_interval` and on changes
+        gossip(self, leaving: bool = False)
+            Sends users of this node to all peers
+        announce(self)
+            Lets users of this node be gossiped at once
+        fresh_directory(self)
+            Returns users of nodes which gossiped lately
+        locate(self, username: str)
+            Returns the node which holds the session of `username`
+        remote_users(self)
+            Returns online users of other nodes
+        forward(self, node: str, username: str, message: str)
+            Forwards a message to a user of another node
+        snapshot(self)
+            Returns nodes and counters as a dictionary
+    """
+    def __init__(self, server, name: str, address: tuple[str, int],
+                 peers: dict[str, tuple[str, int]], gossip_interval: float,
+                 secret: str):
+        self.server = server
+        self.name = name
+        self.address = address
+        self.links = {peer: PeerLink(peer, peer_address, secret)
+                      for peer, peer_address in peers.items()
+                      if peer != name}
+        self.secret = secret
+        self.gossip_interval = gossip_interval
+        self.directory: dict[str, tuple[dict[str, bool], float]] = {}
+        self.counts = Counter()
+        self.listener: socket.socket | None = None
+        self.changed = threading.Event()
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        """ Starts serving peers and gossiping in background threads,
+            if the cluster port can be bound.
+        """
+        try:
+            self.listener = socket.create_server(self.address)
+        except OSError as exc:
+            logging.error("Node cannot join the cluster: %s", exc)
+            return None
+        threading.Thread(target=self.accept_peers, name="cluster",
+                         daemon=True).start()
+        threading.Thread(target=self.run_gossip, name="gossip",
+                         daemon=True).start()
+        logging.info("Node %s serves peers at %s:%d", self.name,
+                     *self.address)
+
+    def stop(self) -> None:
+        """ Tells peers that this node leaves, so they forget its users
+            at once, and stops the cluster threads.
+        """
+        self.stop_event.set()
+        self.changed.set()
+        if self.listener is not None:
+            self.listener.close()
+        self.gossip(leaving=True)
+        for link in self.links.values():
+            with link.lock:
+                link.close()
+
+    def accept_peers(self) -> None:
+        """ Accepts connections of peers until stopped, connections
+            from other hosts are closed.
+        """
+        while not self.stop_event.is_set():
+            try:
+                conn, addr = self.listener.accept()
+            except OSError:
+                break
+            if addr[0] not in self.peer_hosts():
+                logging.error("Refused a node at %s, it's not a peer",
+                              addr[0])
+                with self.lock:
+                    self.counts["refused"] += 1
+                conn.close()
+                continue
+            tune_socket(conn)
+            threading.Thread(target=self.serve_peer, args=[conn],
+                             daemon=True).start()
+
+    def peer_hosts(self) -> set[str]:
+        """ Returns IP addresses of hosts of listed peers, which are
+            resolved again every time, so a peer may change its address.
+        """
+        hosts = set()
+        for link in self.links.values():
+            try:
+                infos = socket.getaddrinfo(link.address[0], None,
+                                           proto=socket.IPPROTO_TCP)
+            except OSError:
+                continue
+            hosts.update(info[4][0] for info in infos)
+        return hosts
+
+    def serve_peer(self, conn: socket.socket) -> None:
+        """ Handles frames of a peer until it disconnects, a peer
+            which doesn't know the secret is disconnected at once.
+        """
+        reader = FrameReader(conn, NODE_BUF_SIZE)
+        try:
+            conn.settimeout(PEER_TIMEOUT)
+            try:
+                authenticate_peer(conn, reader, self.secret, initiator=False)
+            except ConnectionError as exc:
+                logging.error("Refused a node: %s", exc)
+                with self.lock:
+                    self.counts["refused"] += 1
+                return None
+            conn.settimeout(None)
+            while (frame := reader.read_frame()) is not None:
+                command, data = frame
+                if command == GOSSIP:
+                    self.handle_gossip(data)
+                elif command == FORWARD:
+                    reply = self.handle_forward(data)
+                    conn.sendall(f"{REPLY} {len(reply)} {reply}".encode())
+                else:
+                    logging.error("Unknown frame %s from a peer", command)
+                    break
+        except (OSError, ValueError) as exc:
+            logging.debug("Peer connection failed: %s", exc)
+        finally:
+            conn.close()
+
+    def handle_gossip(self, data: str) -> None:
+        """ Stores users of a peer in the directory, a leaving peer is
+            forgotten.
+        """
+        state = json.loads(data)
+        with self.lock:
+            self.counts["gossip_received"] += 1
+            if state.get("leaving"):
+                self.directory.pop(state["node"], None)
+            else:
+                self.directory[state["node"]] = (state["users"],
+                                                 time.monotonic())
+
+    def handle_forward(self, data: str) -> str:
+        """ Delivers a message forwarded by a peer to a user of this
+            node and returns the reply for its sender.
+        """
+        request = json.loads(data)
+        username, message = request["to"], request["message"]
+        server = self.server
+        with self.lock:
+            self.counts["forward_received"] += 1
+        entry = server.clients_port2.get(username)
+        if entry is not None:
+            try:
+                server.push_message(entry[0], message)
+                return OK
+            except OSError:
+                server.delete_client_data(username, entry[0])
+                return f"Error: Lost connection with {username}"
+        if server.sessions.queue_message(username, message):
+            return OK
+        return f"Error: {username} is not online"
+
+    def run_gossip(self) -> None:
+        """ Gossips each `gossip_interval` seconds and whenever users of
+            this node changed.
+        """
+        while not self.stop_event.is_set():
+            self.changed.clear()
+            self.gossip()
+            self.changed.wait(self.gossip_interval)
+
+    def gossip(self, leaving: bool = False) -> None:
+        """ Sends users of this node to all peers, peers which cannot
+            be reached get them next time.
+        """
+        state = {"node": self.name}
+        if leaving:
+            state["leaving"] = True
+        else:
+            state["users"] = self.server.sessions.states()
+        data = json.dumps(state)
+        for link in self.links.values():
+            try:
+                link.send(GOSSIP, data)
+            except OSError as exc:
+                logging.debug("Gossip to %s failed: %s", link.name, exc)
+            else:
+                with self.lock:
+                    self.counts["gossip_sent"] += 1
+
+    def announce(self) -> None:
+        """ Lets users of this node be gossiped at once.
+        """
+        self.changed.set()
+
+    def fresh_directory(self) -> dict[str, dict[str, bool]]:
+        """ Returns users of nodes which gossiped in the last
+            `DIRECTORY_TTL` intervals.
+        """
+        oldest = time.monotonic() - DIRECTORY_TTL * self.gossip_interval
+        with self.lock:
+            return {node: users for node, (users, received_at) in
+                    self.directory.items() if received_at >= oldest}
+
+    def locate(self, username: str) -> str | None:
+        """ Returns the name of another node which holds the session of
+            `username`, online or detached, None if there is no such
+            node.
+        """
+        for node, users in self.fresh_directory().items():
+            if username in users:
+                return node
+        return None
+
+    def remote_users(self) -> list[str]:
+        """ Returns online users of other nodes.
+        """
+        return [username for users in self.fresh_directory().values()
+                for username, online in users.items() if online]
+
+    def forward(self, node: str, username: str, message: str) -> str:
+        """ Forwards `message` to `username` at `node` and returns the
+            reply for its sender.
+        """
+        link = self.links.get(node)
+        if link is None:
+            return f"Error: {username} is not online"
+        data = json.dumps({"to": username, "message": message})
+        try:
+            reply = link.send(FORWARD, data, wait_reply=True)
+        except OSError as exc:
+            logging.error("Forwarding to %s failed: %s", node, exc)
+            with self.lock:
+                self.counts["forward_failed"] += 1
+                self.directory.pop(node, None)
+            return f"Error: Node of {username} is unreachable"
+        with self.lock:
+            self.counts["forward_sent"] += 1
+        return reply
+
+    def snapshot(self) -> dict:
+        """ Returns nodes of the cluster and counters as a dictionary.
+        """
+        now = time.monotonic()
+        with self.lock:
+            nodes = {node: {"users": len(users),
+                            "age_s": round(now - received_at, 3)}
+                     for node, (users, received_at) in
+                     sorted(self.directory.items())}
+            counts = dict(self.counts)
+        return {"node": self.name, "nodes": nodes, "counts": counts}
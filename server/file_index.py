@@ -0,0 +1,325 @@
+""" The module keeps metadata of the files in server's directory, so that
+    it doesn't have to be rescanned on every request.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    os, json, base64, fnmatch, threading
+
+    Used custom modules
+    -------------------
+    utils
+
+    Functions
+    ---------
+    parse_list_options(options: list[str]) -> dict
+        Converts `key=value` options of LF to arguments of 
+        `FileIndex.page`
+    sort_key(sort: str, meta: FileMeta) -> tuple
+        Returns the key by which `meta` is sorted
+    encode_cursor(sort: str, meta: FileMeta) -> str
+        Returns the cursor of the page which follows `meta`
+    decode_cursor(sort: str, cursor: str) -> tuple
+        Returns the sort key which a cursor points after
+
+    Classes
+    -------
+    Class FileMeta:
+        Metadata of a single file
+    Class FileIndex:
+        Metadata of all files in server's directory by their names
+"""
+
+import os
+import json
+import base64
+from fnmatch import fnmatchcase
+from threading import Lock
+
+from utils import content_checksum
+
+SORT_KEYS = ("name", "size", "mtime", "version")
+LF_PAGE_SIZE = 1000       # Files in a page of LF without `limit`
+MAX_LF_PAGE_SIZE = 10000  # The largest `limit` of LF
+
+
+def parse_list_options(options: list[str]) -> dict:
+    """ Converts `key=value` options of LF to keyword arguments of
+        `FileIndex.page` and `checksums`. Options are:
+          - match=GLOB: names which match a shell pattern
+          - prefix=PREFIX: names which start with PREFIX
+          - sort=KEY or sort=-KEY: name, size, mtime or version, `-`
+            sorts in descending order (default is name)
+          - limit=N: files in the page (default is `LF_PAGE_SIZE`)
+          - cursor=CURSOR: the page after the one which returned it
+          - checksums=yes: computes checksums which aren't known yet
+
+        Raises
+        ------
+        ValueError
+            If an option is unknown or its value is invalid
+    """
+    query = {"match": None, "prefix": "", "sort": "name",
+             "descending": False, "after": None, "limit": LF_PAGE_SIZE,
+             "checksums": False}
+    cursor = None
+    for option in options:
+        key, separator, value = option.partition("=")
+        if not separator:
+            raise ValueError(f"Option {option!r} isn't key=value")
+        match key:
+            case "match":
+                query["match"] = value
+            case "prefix":
+                query["prefix"] = value
+            case "sort":
+                query["descending"] = value.startswith("-")
+                query["sort"] = value.removeprefix("-")
+                if query["sort"] not in SORT_KEYS:
+                    raise ValueError(f"Files cannot be sorted by {value!r}")
+            case "limit":
+                query["limit"] = int(value)
+                if not 0 < query["limit"] <= MAX_LF_PAGE_SIZE:
+                    raise ValueError(f"Limit must be from 1 to "
+                                     f"{MAX_LF_PAGE_SIZE}")
+            case "cursor":
+                cursor = value
+            case "checksums":
+                query["checksums"] = value.lower() in ("1", "yes", "true")
+            case _:
+                raise ValueError(f"Unknown option {key!r}")
+    if cursor is not None:
+        query["after"] = decode_cursor(query["sort"], cursor)
+    return query
+
+
+def sort_key(sort: str, meta: "FileMeta") -> tuple:
+    """ Returns the key by which `meta` is sorted, names make keys of
+        files unique.
+    """
+    if sort == "name":
+        return (meta.name,)
+    return (getattr(meta, sort), meta.name)
+
+
+def encode_cursor(sort: str, meta: "FileMeta") -> str:
+    """ Returns the cursor of the page which follows `meta`, it's the
+        sort key of `meta`, so pages don't skip or repeat files when
+        other files are added or removed meanwhile.
+    """
+    data = json.dumps([sort, *sort_key(sort, meta)])
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(sort: str, cursor: str) -> tuple:
+    """ Returns the sort key which `cursor` points after.
+
+        Raises
+        ------
+        ValueError
+            If the cursor is invalid or belongs to another sort
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor") from None
+    if not isinstance(data, list) or not data or data[0] != sort:
+        raise ValueError("The cursor belongs to another sort")
+    key = tuple(data[1:])
+    # Keys of other types couldn't be compared with keys of files #
+    valid = (len(key) == 1 and isinstance(key[0], str)) if sort == "name" \
+        else (len(key) == 2 and isinstance(key[0], (int, float)) and
+              isinstance(key[1], str))
+    if not valid:
+        raise ValueError("Invalid cursor")
+    return key
+
+
+class FileMeta:
+    """ Metadata of a single file.
+
+        Attributes
+        ----------
+        name : str
+            The name of the file
+        size : int
+            Size of the file in bytes
+        mtime : float
+            Last modification time of the file
+        version : int
+            Grows on every modification of the file. It starts from the
+            modification time in nanoseconds, so versions stay unique
+            across server restarts
+        checksum : str | None
+            Checksum of the file content, None until it's requested
+
+        Methods
+        -------
+        as_dict(self)
+            Returns metadata which is shown to clients
+    """
+    def __init__(self, name: str, stat: os.stat_result, version: int):
+        self.name = name
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.version = version
+        self.checksum: str | None = None
+
+    def as_dict(self) -> dict:
+        """ Returns metadata which is shown to clients.
+        """
+        return {"name": self.name, "size": self.size, "mtime": self.mtime,
+                "version": self.version, "checksum": self.checksum}
+
+
+class FileIndex:
+    """ Metadata of all files in server's directory by their names.
+
+        Files whose names start with `__` are not indexed, as they are
+        not shown to clients.
+
+        Attributes
+        ----------
+        directory : str
+            The directory which is indexed
+        files : dict[str, FileMeta]
+            Metadata of files by their names
+        lock : Lock
+            The lock which protects `files`
+
+        Methods
+        -------
+        scan(self)
+            Indexes all files of `directory` from scratch
+        get(self, name: str)
+            Returns metadata of file `name`
+        update(self, name: str)
+            Refreshes metadata of file `name` after it was modified
+        checksum(self, name: str)
+            Returns the checksum of file `name`
+        set_checksum(self, name: str, version: int, checksum: str)
+            Keeps the checksum computed for a version of file `name`
+        page(self, match: str | None, prefix: str, sort: str,
+            descending: bool, after: tuple | None, limit: int)
+            Returns a sorted page of files which match filters
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.files: dict[str, FileMeta] = {}
+        self.lock = Lock()
+        self.scan()
+
+    def scan(self) -> None:
+        """ Indexes all files of `directory` from scratch.
+        """
+        files = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith("__") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                files[entry.name] = FileMeta(entry.name, stat,
+                                             stat.st_mtime_ns)
+        with self.lock:
+            self.files = files
+
+    def get(self, name: str) -> FileMeta | None:
+        """ Returns metadata of file `name`, or None if there's no such
+            file.
+        """
+        with self.lock:
+            return self.files.get(name)
+
+    def update(self, name: str) -> FileMeta | None:
+        """ Refreshes metadata of file `name` after it was modified.
+
+            Returns
+            -------
+            FileMeta
+                New metadata of the file
+            None
+                If the file doesn't exist anymore
+        """
+        try:
+            stat = os.stat(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            with self.lock:
+                self.files.pop(name, None)
+            return None
+        with self.lock:
+            old = self.files.get(name)
+            version = stat.st_mtime_ns
+            if old is not None:
+                version = max(old.version + 1, version)
+            meta = FileMeta(name, stat, version)
+            self.files[name] = meta
+            return meta
+
+    def checksum(self, name: str) -> str | None:
+        """ Returns the checksum of file `name`, computing it only once
+            per version. It's the checksum of the content which READ and
+            READIF deliver, so the file is read as text.
+
+            Raises
+            ------
+            OSError
+                If the file cannot be read
+            UnicodeDecodeError
+                If the file isn't UTF-8 text, it cannot be delivered
+        """
+        meta = self.get(name)
+        if meta is None:
+            return None
+        if meta.checksum is None:
+            with open(os.path.join(self.directory, name), "r") as f:
+                self.set_checksum(name, meta.version,
+                                  content_checksum(f.read()))
+        return meta.checksum
+
+    def set_checksum(self, name: str, version: int, checksum: str) -> None:
+        """ Keeps the checksum computed for `version` of file `name`.
+        """
+        with self.lock:
+            meta = self.files.get(name)
+            if meta is not None and meta.version == version:
+                meta.checksum = checksum
+
+    def page(self, match: str | None = None, prefix: str = "",
+             sort: str = "name", descending: bool = False,
+             after: tuple | None = None,
+             limit: int = LF_PAGE_SIZE) -> tuple[list[FileMeta], bool]:
+        """ Returns a page of files whose names start with `prefix` and
+            match the shell pattern `match`, sorted by `sort`.
+
+            Parameters
+            ----------
+            match : str | None, optional
+                The pattern of names, None matches all (default)
+            prefix : str, optional
+                The beginning of names (default is "", all names)
+            sort : str, optional
+                One of `SORT_KEYS` (default is "name")
+            descending : bool, optional
+                Whether to sort in descending order (default is False)
+            after : tuple | None, optional
+                The sort key of the last file of the previous page, 
+                None for the first page
+            limit : int, optional
+                The number of files in the page
+
+            Returns
+            -------
+            tuple[list[FileMeta], bool]
+                Files of the page and whether more files follow
+        """
+        with self.lock:
+            files = [meta for name, meta in self.files.items()
+                     if name.startswith(prefix) and
+                     (match is None or fnmatchcase(name, match))]
+        files.sort(key=lambda meta: sort_key(sort, meta), reverse=descending)
+        if after is not None:
+            files = [meta for meta in files if
+                     (sort_key(sort, meta) < after if descending
+                      else sort_key(sort, meta) > after)]
+        return files[:limit], len(files) > limit
@@ -0,0 +1,80 @@
+""" The module moves writing of server's log messages off the threads
+    serving clients.
+
+    Threads only put log records to `log_queue` through a
+    `DeferredQueueHandler`, and a `QueueListener` thread formats and
+    writes them to stderr. The queue is installed and the listener is
+    started and stopped by `Server.start()` (and `Supervisor.start()`),
+    not when the server is imported, so a program which only imports
+    it doesn't collect records which nobody writes.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    queue, logging
+
+    Defined functions
+    -----------------
+    configure_logging(level: int)
+        Sends records of the root logger through `log_queue`
+    start_logging()
+        Starts writing queued records in a background thread
+    stop_logging()
+        Writes all queued records and stops the background thread
+
+    Classes
+    -------
+    Class DeferredQueueHandler(QueueHandler):
+        Puts records to the queue without formatting them
+"""
+
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "%(levelname)s: %(message)s"
+
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+stream_handler = logging.StreamHandler()
+stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+listener = QueueListener(log_queue, stream_handler,
+                         respect_handler_level=True)
+listener_running = False
+
+
+class DeferredQueueHandler(QueueHandler):
+    """ Puts records to the queue without formatting them.
+
+        `QueueHandler.prepare()` formats the message in the logging
+        thread so that records can be pickled. The queue is read in the
+        same process, so the listener formats records instead.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """ Sends records of the root logger through `log_queue`, it does
+        nothing if the root logger has handlers already.
+    """
+    logging.basicConfig(level=level,
+                        handlers=[DeferredQueueHandler(log_queue)])
+
+
+def start_logging() -> None:
+    """ Starts writing queued records in a background thread.
+    """
+    global listener_running
+    if not listener_running:
+        listener.start()
+        listener_running = True
+
+
+def stop_logging() -> None:
+    """ Writes all queued records and stops the background thread.
+    """
+    global listener_running
+    if listener_running:
+        listener.stop()
+        listener_running = False
@@ -1,22 +1,69 @@
 """ This module must be runned to start a server.
 
+    Settings of the server (addresses, ports, buffer size, number of
+    served clients, timeouts, ...) are taken from command line options,
+    environment variables and a config file, see `config.py` and 
+    `python -m server.main --help`. With `--workers N` (N > 1) clients
+    are served by N processes, see `workers.py`.
+
+    Used built-in modules
+    ---------------------
+    argparse
+
     Used custom modules
     -------------------
-    server
+    config, server, workers
 
     Functions
     ---------
     main()
-        Creates a Server object and runs it
+        Creates a Server object, or a Supervisor of several, and runs it
 """
 
-from .server import Server
+import argparse
+
+from config import load_config
+from .server import Server, SETTINGS
+from .workers import Supervisor, WORKERS
+
+MAIN_SETTINGS = SETTINGS + [
+    ("workers", WORKERS, int,
+     "processes serving clients, more than 1 runs a supervisor"),
+]
 
 
-def main(): 
-    """ Creates a Server object and runs it.
+def main(argv=None): 
+    """ Creates a Server object, or a Supervisor of several ones, and
+        runs it.
     """
-    s = Server()
+    parser = argparse.ArgumentParser(prog="python -m server.main")
+    _, settings = load_config("server", MAIN_SETTINGS, parser, argv)
+    workers = settings.pop("workers")
+    if workers > 1 and settings["cluster_port"] is not None:
+        # Workers share users through their supervisor, not by gossip #
+        parser.error("a node of a cluster runs in one process, "
+                     "--workers cannot be used with --cluster-port")
+    if settings["cluster_port"] is not None and \
+            not settings["cluster_secret"]:
+        # Otherwise anyone could join and forward messages to users #
+        parser.error("a node of a cluster requires --cluster-secret")
+    if workers > 1 and (settings["replication_port"] is not None or
+                        settings["replicate_from"] is not None):
+        # The log must have one order of all modifications #
+        parser.error("replication runs in one process, --workers cannot "
+                     "be used with --replication-port or --replicate-from")
+    if settings["replication_port"] is not None and \
+            settings["replicate_from"] is not None:
+        parser.error("a replica cannot be a primary of other replicas")
+    if (settings["replication_port"] is not None or
+            settings["replicate_from"] is not None) and \
+            not settings["replication_secret"]:
+        # Otherwise anyone could read or write files through replication #
+        parser.error("replication requires --replication-secret")
+    if workers > 1:
+        Supervisor(settings, workers).start()
+        return None
+    s = Server(**settings)
     s.start()
 
 
@@ -0,0 +1,251 @@
+""" The module exposes statistics of server over HTTP in Prometheus text
+    exposition format, so that they can be scraped by monitoring.
+
+    The listener is started by `Server.start()` only when a metrics port
+    is given, and it serves `GET /metrics` on a local address. Rendered
+    metrics are cached for `CACHE_TTL` seconds, so frequent scrapes
+    don't slow down serving clients.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    time, threading, http.server
+
+    Used custom modules
+    -------------------
+    stats
+
+    Functions
+    ---------
+    bucket_mapping(bounds: list[float]) -> list[int]
+        Maps buckets of `Histogram` to Prometheus histogram buckets
+
+    Classes
+    -------
+    Class MetricsRenderer:
+        Renders counters, gauges and histograms of server as text
+    Class MetricsServer:
+        HTTP server which serves rendered metrics at `/metrics`
+    Class MetricsRequestHandler:
+        Answers `GET /metrics` with rendered metrics
+"""
+
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from .stats import Histogram, MAX_BUCKETS
+
+CACHE_TTL = 1.0  # Seconds during which the rendered metrics are reused
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Upper bounds of latency buckets in seconds #
+LATENCY_BOUNDS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                  0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+def bucket_mapping(bounds: list[float]) -> list[int]:
+    """ Maps every bucket of `Histogram` to the index of the first
+        bound in `bounds` (seconds) which is not below the bucket's
+        values, `len(bounds)` stands for +Inf.
+    """
+    mapping = []
+    bound_index = 0
+    for index in range(MAX_BUCKETS):
+        # The largest value of the bucket in microseconds #
+        upper_us = Histogram.bucket_lower_bound(index + 1) - 1
+        while bound_index < len(bounds) and \
+                upper_us > bounds[bound_index] * 1e6:
+            bound_index += 1
+        mapping.append(bound_index)
+    return mapping
+
+
+class MetricsRenderer:
+    """ Renders counters, gauges and histograms of server as text.
+
+        Attributes
+        ----------
+        server : Server
+            The server which metrics are rendered
+        mapping : list[int]
+            Index of the latency bound for every `Histogram` bucket
+        cached : bytes
+            The last rendered metrics
+        cached_at : float
+            Monotonic time when `cached` was rendered
+        lock : Lock
+            Lets only one thread render metrics at a time
+
+        Methods
+        -------
+        render(self)
+            Returns the metrics, rendering them if the cache is stale
+        render_now(self)
+            Renders metrics of the server
+        gauges(self)
+            Returns current values of gauges with their descriptions
+    """
+    def __init__(self, server):
+        self.server = server
+        self.mapping = bucket_mapping(LATENCY_BOUNDS)
+        self.cached = b""
+        self.cached_at = float("-inf")
+        self.lock = threading.Lock()
+
+    def render(self) -> bytes:
+        """ Returns the metrics, rendering them if the cache is older
+            than `CACHE_TTL`.
+        """
+        with self.lock:
+            if time.monotonic() - self.cached_at >= CACHE_TTL:
+                self.cached = self.render_now().encode()
+                self.cached_at = time.monotonic()
+            return self.cached
+
+    def gauges(self) -> list[tuple[str, str, float]]:
+        """ Returns current values of gauges with their descriptions.
+        """
+        server = self.server
+        indexed_bytes = sum(meta.size for meta in
+                            list(server.file_index.files.values()))
+        return [
+            ("os_server_online_users", "Users connected to port1",
+             len(server.clients_port1)),
+            ("os_server_open_sockets", "Sockets of clients at both ports",
+             len(server.active_connections) + len(server.clients_port2)),
+            ("os_server_threads", "Threads of the server process",
+             threading.active_count()),
+            ("os_server_queued_messages",
+             "Messages kept for clients which lost connection",
+             server.sessions.pending_count()),
+            ("os_server_indexed_files", "Files in the file index",
+             len(server.file_index.files)),
+            ("os_server_indexed_file_bytes",
+             "Total size of files in the file index", indexed_bytes),
+            ("os_server_uptime_seconds", "Seconds since server started",
+             time.time() - server.stats.started_at),
+        ]
+
+    def render_now(self) -> str:
+        """ Renders metrics of the server.
+        """
+        lines = []
+        for name, help_text, value in self.gauges():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        if self.server.replication is not None:
+            replicas = self.server.replication.snapshot()["replicas"]
+            for name, key, help_text in (
+                    ("os_server_replication_lag_records", "lag_records",
+                     "Records which a replica hasn't applied yet"),
+                    ("os_server_replication_lag_seconds", "lag_seconds",
+                     "Age of the oldest record a replica hasn't applied")):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(f'{name}{{replica="{replica}"}} {state[key]}'
+                             for replica, state in replicas.items())
+
+        counters = {
+            "os_server_commands_total": ("Served commands", []),
+            "os_server_command_errors_total": ("Error replies", []),
+            "os_server_received_bytes_total": ("Bytes received", []),
+            "os_server_sent_bytes_total": ("Bytes sent", []),
+        }
+        histogram_lines = []
+        histogram = "os_server_command_duration_seconds"
+        for command, stats in self.server.stats.items():
+            label = f'command="{command}"'
+            with stats.lock:
+                values = (stats.count, stats.errors, stats.bytes_in,
+                          stats.bytes_out)
+                counts = stats.latency.counts[:]
+                total_us = stats.latency.total
+            for (_, samples), value in zip(counters.values(), values):
+                samples.append(f"{{{label}}} {value}")
+            buckets = [0] * (len(LATENCY_BOUNDS) + 1)
+            for index, bucket_count in enumerate(counts):
+                if bucket_count:
+                    buckets[self.mapping[index]] += bucket_count
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BOUNDS, buckets):
+                cumulative += bucket_count
+                histogram_lines.append(
+                    f'{histogram}_bucket{{{label},le="{bound}"}} {cumulative}')
+            histogram_lines.append(
+                f'{histogram}_bucket{{{label},le="+Inf"}} {values[0]}')
+            histogram_lines.append(
+                f"{histogram}_sum{{{label}}} {total_us / 1e6}")
+            histogram_lines.append(f"{histogram}_count{{{label}}} {values[0]}")
+
+        counters["os_server_reaped_sessions_total"] = (
+            "Sessions reaped by the reaper",
+            [f'{{reason="{reason}"}} {count}' for reason, count in
+             self.server.reaper.snapshot().items()])
+        throttled = self.server.rate_limiter.snapshot()
+        counters["os_server_throttled_total"] = (
+            "Commands which waited for rate limits",
+            [f'{{limit="{name}"}} {value["count"]}'
+             for name, value in throttled.items()])
+        counters["os_server_throttled_seconds_total"] = (
+            "Seconds which commands waited for rate limits",
+            [f'{{limit="{name}"}} {value["seconds"]}'
+             for name, value in throttled.items()])
+        counters["os_server_quota_rejections_total"] = (
+            "Transfers refused by storage quotas",
+            [f" {self.server.quota.rejected}"])
+        for name, (help_text, samples) in counters.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(f"{name}{sample}" for sample in samples)
+        lines.append(f"# HELP {histogram} Time of serving commands")
+        lines.append(f"# TYPE {histogram} histogram")
+        lines.extend(histogram_lines)
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """ HTTP server which serves rendered metrics at `/metrics`.
+
+        Attributes
+        ----------
+        renderer : MetricsRenderer
+            Renders metrics of the server
+
+        Methods
+        -------
+        start(self)
+            Serves requests in a daemon thread
+    """
+    daemon_threads = True
+
+    def __init__(self, server, ip: str, port: int):
+        super().__init__((ip, port), MetricsRequestHandler)
+        self.renderer = MetricsRenderer(server)
+
+    def start(self) -> None:
+        """ Serves requests in a daemon thread, `shutdown()` stops it.
+        """
+        t = threading.Thread(target=self.serve_forever, daemon=True)
+        t.start()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """ Answers `GET /metrics` with rendered metrics, other paths are
+        not found.
+    """
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.renderer.render()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are too frequent to be logged #
+        pass
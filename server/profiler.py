@@ -0,0 +1,226 @@
+""" The module profiles a running server on demand.
+
+    Two modes are supported:
+      - "sample": a thread samples stacks of the threads serving clients
+        every `SAMPLE_INTERVAL` seconds and writes them in the collapsed
+        format (`frame;frame;frame COUNT`) used by flamegraph tools
+      - "cprofile": every command served by `communicate_with_client`
+        runs under `cProfile` and the report groups functions by
+        commands
+
+    Profiling lasts for the given number of seconds and then the report
+    is written to `PROFILES_DIR`. When profiling is off, the server only
+    checks `Profiler.cprofile_enabled` once per command.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    os, io, sys, time, pstats, cProfile, threading, collections
+
+    Classes
+    -------
+    Class Profiler:
+        Runs sampling or per-command cProfile sessions and writes
+        their reports
+"""
+
+import os
+import io
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+
+PROFILES_DIR = os.path.join("server", "__profiles__")  # Where reports go
+CLIENT_THREAD_PREFIX = "client-"  # Name prefix of threads serving clients
+SAMPLE_INTERVAL = 0.005  # Seconds between two samples of stacks
+MAX_PROFILE_SECONDS = 300  # The longest allowed profiling session
+REPORT_FUNCTIONS = 25    # Functions listed for every command by cProfile
+MODES = ("sample", "cprofile")
+
+
+class Profiler:
+    """ Runs sampling or per-command cProfile sessions and writes their
+        reports.
+
+        Attributes
+        ----------
+        directory : str
+            The directory where reports are written
+        interval : float
+            Seconds between two samples of stacks
+        running : bool
+            Whether a profiling session is in progress
+        cprofile_enabled : bool
+            Whether commands must be run under `cProfile`
+        command_stats : dict[str, pstats.Stats]
+            Collected cProfile statistics by the names of commands
+        lock : Lock
+            The lock which protects `running` and `command_stats`
+        stop_event : Event
+            Is set to finish the current session earlier
+
+        Methods
+        -------
+        start(self, mode: str, seconds: float)
+            Starts a profiling session and returns the path of report
+        stop(self)
+            Finishes the current session earlier
+        begin_command(self)
+            Starts profiling of one command if cProfile mode is on
+        end_command(self, command: str, profile: cProfile.Profile | None)
+            Stops profiling of one command and keeps its statistics
+        add_command_profile(self, command: str, profile: cProfile.Profile)
+            Adds the profile of one served command to `command_stats`
+        sample_stacks(self, seconds: float, path: str)
+            Samples stacks of client threads and writes collapsed stacks
+        run_cprofile(self, seconds: float, path: str)
+            Profiles commands for `seconds` and writes the report
+    """
+    def __init__(self, directory: str = PROFILES_DIR,
+                 interval: float = SAMPLE_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.running = False
+        self.cprofile_enabled = False
+        self.command_stats: dict[str, pstats.Stats] = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def start(self, mode: str, seconds: float) -> str:
+        """ Starts a profiling session in a background thread.
+
+            Parameters
+            ----------
+            mode : str
+                "sample" or "cprofile"
+            seconds : float
+                Duration of the session
+
+            Returns
+            -------
+            str
+                The path where the report will be written
+
+            Raises
+            ------
+            ValueError
+                If the mode or duration is wrong, or another session is
+                in progress
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode}, use one of "
+                             f"{', '.join(MODES)}")
+        if not 0 < seconds <= MAX_PROFILE_SECONDS:
+            raise ValueError(f"Profiling lasts from 0 to "
+                             f"{MAX_PROFILE_SECONDS} seconds")
+        with self.lock:
+            if self.running:
+                raise ValueError("Profiling is already running")
+            self.running = True
+        self.stop_event.clear()
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if mode == "sample":
+            path = os.path.join(self.directory, f"{stamp}.collapsed")
+            target = self.sample_stacks
+        else:
+            path = os.path.join(self.directory, f"{stamp}.cprofile.txt")
+            target = self.run_cprofile
+        t = threading.Thread(target=target, args=[seconds, path],
+                             name="profiler", daemon=True)
+        t.start()
+        return path
+
+    def stop(self) -> None:
+        """ Finishes the current session earlier, its report is still
+            written.
+        """
+        self.stop_event.set()
+
+    def begin_command(self) -> cProfile.Profile | None:
+        """ Starts profiling of one command if cProfile mode is on.
+
+            Returns
+            -------
+            cProfile.Profile | None
+                The enabled profile, None if cProfile mode is off
+        """
+        if not self.cprofile_enabled:
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def end_command(self, command: str,
+                    profile: cProfile.Profile | None) -> None:
+        """ Stops profiling of one command and keeps its statistics.
+        """
+        if profile is not None:
+            profile.disable()
+            self.add_command_profile(command, profile)
+
+    def add_command_profile(self, command: str,
+                            profile: cProfile.Profile) -> None:
+        """ Adds the profile of one served command to `command_stats`.
+        """
+        with self.lock:
+            stats = self.command_stats.get(command)
+            if stats is None:
+                self.command_stats[command] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+
+    def sample_stacks(self, seconds: float, path: str) -> None:
+        """ Samples stacks of the threads serving clients for `seconds`
+            and writes them in collapsed format to `path`.
+        """
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        try:
+            while time.monotonic() < deadline and \
+                    not self.stop_event.wait(self.interval):
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if not names.get(ident, "").startswith(
+                            CLIENT_THREAD_PREFIX):
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} "
+                                     f"({os.path.basename(code.co_filename)}"
+                                     f":{code.co_firstlineno})")
+                        frame = frame.f_back
+                    stacks[";".join(reversed(stack))] += 1
+            with open(path, "w") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        finally:
+            with self.lock:
+                self.running = False
+
+    def run_cprofile(self, seconds: float, path: str) -> None:
+        """ Profiles commands for `seconds` and writes the report of the
+            most expensive functions of every command to `path`.
+        """
+        with self.lock:
+            self.command_stats = {}
+        self.cprofile_enabled = True
+        try:
+            self.stop_event.wait(seconds)
+        finally:
+            self.cprofile_enabled = False
+            with self.lock:
+                command_stats, self.command_stats = self.command_stats, {}
+                self.running = False
+        with open(path, "w") as f:
+            for command, stats in sorted(command_stats.items()):
+                f.write(f"===== {command} =====\n")
+                report = io.StringIO()
+                stats.stream = report
+                stats.sort_stats("cumulative").print_stats(REPORT_FUNCTIONS)
+                f.write(report.getvalue())
@@ -0,0 +1,262 @@
+""" The module accounts storage of server's files by users and enforces
+    storage quotas.
+
+    Every file keeps the bytes written to it by each user: WRITE and
+    OVERWRITE make the writer the only contributor, APPEND and
+    APPENDFILE add bytes to the appender. Usage of users and the total
+    size of files are counters, which are changed by the difference of
+    every mutation, so the directory is never rescanned. Files which
+    existed before (or were changed outside of server) belong to
+    nobody, they count only to the total.
+
+    Contributions are saved to `QUOTA_FILE` when server shuts down and
+    at most every `SAVE_INTERVAL` seconds after mutations. On start
+    they are checked against the file index, so sizes always match the
+    files on disk.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    os, json, time, logging, threading, collections
+
+    Used custom modules
+    -------------------
+    file_index
+
+    Functions
+    ---------
+    parse_quotas(value: str) -> dict[str, int | None]
+        Converts `user=bytes, ...` to quotas by usernames
+
+    Classes
+    -------
+    Class QuotaManager:
+        Usage of storage by users and their quotas
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import Counter
+
+from .file_index import FileIndex
+
+QUOTA_FILE = os.path.join("server", "__quota__.json")
+SAVE_INTERVAL = 5.0  # Seconds between two saves of contributions
+NOBODY = ""          # The contributor of files not written through server
+
+
+def parse_quotas(value: str) -> dict[str, int | None]:
+    """ Converts `user=bytes, ...` to quotas by usernames, "none" as
+        bytes gives a user no quota.
+
+        Raises
+        ------
+        ValueError
+            If an entry has no username or bytes aren't an integer
+    """
+    quotas = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        username, separator, size = item.partition("=")
+        if not separator or not username.strip():
+            raise ValueError(f"Invalid quota {item!r}")
+        size = size.strip()
+        quotas[username.strip()] = None if size.lower() == "none" \
+            else int(size)
+    return quotas
+
+
+class QuotaManager:
+    """ Usage of storage by users and their quotas.
+
+        Attributes
+        ----------
+        path : str
+            The file where contributions are saved
+        user_quota : int | None
+            Bytes every user may store, None is unlimited
+        user_quotas : dict[str, int | None]
+            Quotas of single users, which override `user_quota`
+        global_quota : int | None
+            Bytes all files may take together, None is unlimited
+        enabled : bool
+            Whether any quota is set, usage is accounted anyway
+        files : dict[str, dict[str, int]]
+            Bytes of every file by its contributors
+        usage : Counter
+            Bytes stored by every user
+        total : int
+            Bytes of all files
+        rejected : int
+            Number of refused transfers
+        saved_at : float
+            Monotonic time when contributions were saved
+        dirty : bool
+            Whether contributions changed since they were saved
+        lock : Lock
+            The lock which protects the counters
+
+        Methods
+        -------
+        load(self, file_index: FileIndex)
+            Reads saved contributions and fits them to indexed files
+        quota_of(self, username: str)
+            Returns the quota of `username`
+        allowance(self, username: str, file_name: str, replace: bool)
+            Returns bytes which `username` may write to `file_name`
+        error(self, username: str, file_name: str, size: int,
+            replace: bool)
+            Returns an error message if `size` bytes don't fit quotas
+        record(self, username: str, file_name: str, size: int,
+            replace: bool)
+            Accounts `size` bytes written to `file_name` by `username`
+        save(self, force: bool = False)
+            Saves contributions to `path`
+        snapshot(self)
+            Returns usage of storage as a dictionary
+    """
+    def __init__(self, path: str, user_quota: int | None,
+                 user_quotas: dict[str, int | None],
+                 global_quota: int | None):
+        self.path = path
+        self.user_quota = user_quota
+        self.user_quotas = user_quotas
+        self.global_quota = global_quota
+        self.enabled = user_quota is not None or global_quota is not None \
+            or any(quota is not None for quota in user_quotas.values())
+        self.files: dict[str, dict[str, int]] = {}
+        self.usage = Counter()
+        self.total = 0
+        self.rejected = 0
+        self.saved_at = time.monotonic()
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def load(self, file_index: FileIndex) -> None:
+        """ Reads saved contributions and fits them to the files of
+            `file_index`: contributions of missing files are dropped,
+            files with other sizes than saved belong to nobody.
+        """
+        try:
+            with open(self.path, "r") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            saved = {}
+        except (OSError, ValueError) as exc:
+            logging.error("Quota usage cannot be loaded: %s", exc)
+            saved = {}
+        files = {}
+        for name, meta in list(file_index.files.items()):
+            contributors = saved.get(name)
+            if not isinstance(contributors, dict) or \
+                    sum(contributors.values()) != meta.size:
+                contributors = {NOBODY: meta.size} if meta.size else {}
+            files[name] = contributors
+        with self.lock:
+            self.files = files
+            self.usage = Counter()
+            for contributors in files.values():
+                self.usage.update(contributors)
+            self.total = sum(self.usage.values())
+            self.usage.pop(NOBODY, None)
+
+    def quota_of(self, username: str) -> int | None:
+        """ Returns the quota of `username`, None if it's unlimited.
+        """
+        return self.user_quotas.get(username, self.user_quota)
+
+    def allowance(self, username: str, file_name: str,
+                  replace: bool) -> int | None:
+        """ Returns bytes which `username` may write to `file_name`
+            within the user's and the global quota, None if both are
+            unlimited. With `replace` the bytes of the current file are
+            freed first.
+        """
+        quota = self.quota_of(username)
+        if quota is None and self.global_quota is None:
+            return None
+        with self.lock:
+            contributors = self.files.get(file_name, {})
+            freed_own = contributors.get(username, 0) if replace else 0
+            freed_all = sum(contributors.values()) if replace else 0
+            allowed = []
+            if quota is not None:
+                allowed.append(quota - self.usage[username] + freed_own)
+            if self.global_quota is not None:
+                allowed.append(self.global_quota - self.total + freed_all)
+        return max(0, min(allowed))
+
+    def error(self, username: str, file_name: str, size: int,
+              replace: bool) -> str | None:
+        """ Returns an error message if `size` bytes written to
+            `file_name` by `username` don't fit quotas, otherwise None.
+        """
+        allowed = self.allowance(username, file_name, replace)
+        if allowed is None or size <= allowed:
+            return None
+        quota = self.quota_of(username)
+        with self.lock:
+            self.rejected += 1
+            used = self.usage[username]
+            own = self.files.get(file_name, {}).get(username, 0) \
+                if replace else 0
+        if quota is not None and used - own + size > quota:
+            return (f"Error: Quota exceeded, {username} stores {used} of "
+                    f"{quota} bytes")
+        return "Error: Storage of server is full"
+
+    def record(self, username: str, file_name: str, size: int,
+               replace: bool) -> None:
+        """ Accounts `size` bytes written to `file_name` by `username`,
+            with `replace` they replace the whole file.
+        """
+        with self.lock:
+            contributors = self.files.setdefault(file_name, {})
+            if replace:
+                for contributor, old_size in contributors.items():
+                    self.usage[contributor] -= old_size
+                    self.total -= old_size
+                contributors.clear()
+            contributors[username] = contributors.get(username, 0) + size
+            self.usage[username] += size
+            self.total += size
+            self.usage.pop(NOBODY, None)
+            self.dirty = True
+        self.save()
+
+    def save(self, force: bool = False) -> None:
+        """ Saves contributions to `path`, if they changed and the last
+            save is older than `SAVE_INTERVAL` or `force` is given.
+        """
+        with self.lock:
+            if not self.dirty or (not force and time.monotonic() -
+                                  self.saved_at < SAVE_INTERVAL):
+                return None
+            data = json.dumps(self.files)
+            self.dirty = False
+            self.saved_at = time.monotonic()
+        # Worker processes may save at the same time #
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as exc:
+            logging.error("Quota usage cannot be saved: %s", exc)
+
+    def snapshot(self) -> dict:
+        """ Returns usage of storage as a dictionary.
+        """
+        with self.lock:
+            return {"total_bytes": self.total,
+                    "global_quota": self.global_quota,
+                    "rejected": self.rejected,
+                    "users": {username: {"bytes": size,
+                                         "quota": self.quota_of(username)}
+                              for username, size in sorted(self.usage.items())
+                              if size}}
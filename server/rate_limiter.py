@@ -0,0 +1,268 @@
+""" The module paces users who send too many commands or move too many
+    bytes, so that they don't starve the other users of server.
+
+    Every user gets token buckets: one for each class of commands
+    (requests per second) and one for each direction of data (bytes per
+    second received from and sent to the user). Limits are given for
+    all users and can be overridden for single users, e.g.
+    `message=20, transfer=5, bytes_out=1048576` and
+    `alice: message=5; bob: bytes_out=65536`. A bucket holds one second
+    of its rate, so short bursts are served at once.
+
+    A command waits for its request token before it's served. Bytes are
+    charged after the command was served and the user waits for them
+    before its next command, so a paced user never sleeps while holding
+    the file lock of server. Users without limits cost one check.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    time, threading, collections
+
+    Functions
+    ---------
+    parse_limits(value: str) -> dict[str, float]
+        Converts `name=rate, ...` to a dictionary of limits
+    parse_user_limits(value: str) -> dict[str, dict[str, float]]
+        Converts `user: name=rate, ...; ...` to limits by usernames
+
+    Classes
+    -------
+    Class TokenBucket:
+        Tokens which are refilled at a constant rate
+    Class RateLimiter:
+        Token buckets of users, which pace their commands and bytes
+"""
+
+import time
+import threading
+from collections import Counter
+
+# Classes of commands, commands which aren't listed are never paced #
+COMMAND_CLASSES = {
+    "MESSAGE": "message",
+    "READ": "transfer", "READIF": "transfer", "OVERREAD": "transfer",
+    "WRITE": "transfer", "OVERWRITE": "transfer", "APPEND": "transfer",
+    "APPENDFILE": "transfer", "TAIL": "transfer",
+    "LU": "list", "LF": "list", "SEARCH": "list", "WATCH": "list",
+    "STATS": "admin", "PROFILE": "admin",
+}
+DIRECTIONS = ("bytes_in", "bytes_out")
+LIMIT_NAMES = tuple(sorted(set(COMMAND_CLASSES.values()))) + DIRECTIONS
+
+
+def parse_limits(value: str) -> dict[str, float]:
+    """ Converts `name=rate, ...` to a dictionary of limits, where names
+        are classes of commands (`COMMAND_CLASSES`), `bytes_in` or
+        `bytes_out`. "none" and "" give no limits.
+
+        Raises
+        ------
+        ValueError
+            If a name is unknown or a rate isn't a positive number
+    """
+    limits = {}
+    if value.strip().lower() in ("", "none"):
+        return limits
+    for item in value.split(","):
+        name, _, rate = item.partition("=")
+        name = name.strip()
+        if name not in LIMIT_NAMES:
+            raise ValueError(f"Unknown limit {name!r}")
+        limits[name] = float(rate)
+        if limits[name] <= 0:
+            raise ValueError(f"Limit {name!r} must be positive")
+    return limits
+
+
+def parse_user_limits(value: str) -> dict[str, dict[str, float]]:
+    """ Converts `user: name=rate, ...; ...` to limits by usernames.
+        Users may also be separated by new lines, as in config files.
+
+        Raises
+        ------
+        ValueError
+            If an entry has no username or its limits are invalid
+    """
+    user_limits = {}
+    for entry in value.replace("\n", ";").split(";"):
+        if not entry.strip():
+            continue
+        username, separator, limits = entry.partition(":")
+        if not separator or not username.strip():
+            raise ValueError(f"Invalid limits of a user {entry!r}")
+        user_limits[username.strip()] = parse_limits(limits)
+    return user_limits
+
+
+class TokenBucket:
+    """ Tokens which are refilled at a constant rate up to a burst.
+
+        Taking more tokens than the bucket holds is allowed, it leaves
+        a debt which the taker has to wait out, so large transfers are
+        never refused, only paced.
+
+        Attributes
+        ----------
+        rate : float
+            Tokens added per second
+        burst : float
+            The most tokens the bucket holds
+        tokens : float
+            Tokens in the bucket, negative while in debt
+        updated : float
+            Monotonic time when `tokens` was refilled
+        lock : Lock
+            The lock which protects `tokens`
+
+        Methods
+        -------
+        take(self, amount: float)
+            Takes tokens and returns seconds to wait for them
+    """
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, amount: float) -> float:
+        """ Takes `amount` tokens and returns seconds to wait until the
+            bucket isn't in debt, 0 if there were enough tokens.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RateLimiter:
+    """ Token buckets of users, which pace their commands and bytes.
+
+        Attributes
+        ----------
+        limits : dict[str, float]
+            Limits of all users by names of `LIMIT_NAMES`
+        user_limits : dict[str, dict[str, float]]
+            Limits by usernames, which override `limits`
+        enabled : bool
+            Whether any limit is set
+        buckets : dict[tuple[str, str], TokenBucket]
+            Buckets by (username, limit name)
+        throttled : Counter
+            How many times users waited, by limit names
+        throttled_seconds : Counter
+            Seconds which users waited, by limit names
+        wake : Event
+            Is set to stop all waiting, e.g. when server shuts down
+        lock : Lock
+            The lock which protects creating buckets and counters
+
+        Methods
+        -------
+        bucket(self, username: str | None, name: str)
+            Returns the bucket of a user, None if it's not limited
+        wait(self, name: str, seconds: float)
+            Waits `seconds` and counts it
+        pace(self, username: str | None, command: str)
+            Waits until the user may send `command`
+        settle(self, username: str | None, bytes_in: int, bytes_out: int)
+            Charges bytes of a served command and waits for them
+        forget(self, username: str)
+            Drops the buckets of a user who disconnected
+        close(self)
+            Wakes up all waiting users
+        snapshot(self)
+            Returns throttle counters as a dictionary
+    """
+    def __init__(self, limits: dict[str, float],
+                 user_limits: dict[str, dict[str, float]]):
+        self.limits = limits
+        self.user_limits = user_limits
+        self.enabled = bool(limits) or any(user_limits.values())
+        self.buckets: dict[tuple[str, str], TokenBucket] = {}
+        self.throttled = Counter()
+        self.throttled_seconds = Counter()
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+
+    def bucket(self, username: str | None, name: str) -> TokenBucket | None:
+        """ Returns the bucket `name` of `username`, None if the user
+            has no such limit. Clients which haven't connected yet share
+            the buckets of username None.
+        """
+        bucket = self.buckets.get((username, name))
+        if bucket is not None:
+            return bucket
+        rate = self.user_limits.get(username, {}).get(name,
+                                                      self.limits.get(name))
+        if rate is None:
+            return None
+        with self.lock:
+            return self.buckets.setdefault((username, name),
+                                           TokenBucket(rate))
+
+    def wait(self, name: str, seconds: float) -> None:
+        """ Waits `seconds`, unless `wake` is set, and counts it under
+            the limit `name`.
+        """
+        with self.lock:
+            self.throttled[name] += 1
+            self.throttled_seconds[name] += seconds
+        self.wake.wait(seconds)
+
+    def pace(self, username: str | None, command: str) -> None:
+        """ Waits until `username` may send `command`.
+        """
+        if not self.enabled:
+            return None
+        name = COMMAND_CLASSES.get(command)
+        bucket = self.bucket(username, name) if name else None
+        if bucket is not None:
+            seconds = bucket.take(1)
+            if seconds:
+                self.wait(name, seconds)
+
+    def settle(self, username: str | None, bytes_in: int,
+               bytes_out: int) -> None:
+        """ Charges bytes received and sent while serving a command of
+            `username` and waits until its byte buckets aren't in debt.
+        """
+        if not self.enabled:
+            return None
+        for name, amount in zip(DIRECTIONS, (bytes_in, bytes_out)):
+            bucket = self.bucket(username, name) if amount else None
+            if bucket is not None:
+                seconds = bucket.take(amount)
+                if seconds:
+                    self.wait(name, seconds)
+
+    def forget(self, username: str) -> None:
+        """ Drops the buckets of a user who disconnected.
+        """
+        if not self.enabled:
+            return None
+        with self.lock:
+            for name in LIMIT_NAMES:
+                self.buckets.pop((username, name), None)
+
+    def close(self) -> None:
+        """ Wakes up all waiting users, the following waits are skipped.
+        """
+        self.wake.set()
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        """ Returns how many times and how many seconds users waited by
+            limit names.
+        """
+        with self.lock:
+            return {name: {"count": self.throttled[name],
+                           "seconds": round(self.throttled_seconds[name], 3)}
+                    for name in LIMIT_NAMES}
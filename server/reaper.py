@@ -0,0 +1,291 @@
+""" The module finds and frees dead sessions of clients.
+
+    A client which vanished without closing its sockets (a crashed
+    machine, a dropped network, a half-open TCP connection) is never
+    noticed by the thread serving it, as it waits in `recv` forever. The
+    reaper runs in one background thread, which:
+      - reads the port2 sockets of all clients, where clients answer
+        HEARTBEAT frames with PONG, and notices closed port2 sockets
+      - pushes a HEARTBEAT frame to every client each
+        `heartbeat_interval` seconds, so clients notice a dead server
+        by the silence of their port2 socket
+      - reaps clients without any command or PONG for `idle_timeout`
+        seconds, clients which closed their port2 socket and clients
+        which stopped reading it; with worker processes, PONGs are
+        reported to the hub, as port2 of a client may be held by
+        another worker than the one serving its commands
+      - forgets detached sessions which weren't resumed in time
+
+    Reaping works like losing the connection: sockets are shut down, so
+    the thread serving the client finishes, and the session is detached,
+    so the client can still resume it. Reaped sessions are counted by
+    reasons.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    time, socket, logging, selectors, threading, collections
+
+    Used custom modules
+    -------------------
+    protocol
+
+    Classes
+    -------
+    Class Reaper:
+        Sends heartbeats, reads PONGs and reaps dead sessions
+"""
+
+import time
+import socket
+import logging
+import selectors
+import threading
+from collections import Counter
+
+from protocol import HEARTBEAT
+
+REAP_REASONS = ("idle", "closed", "stalled", "expired")
+HEARTBEAT_FRAME = f"{HEARTBEAT} 0 ".encode()
+# Heartbeats are sent without blocking the reaper #
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0)
+
+
+class Reaper:
+    """ Sends heartbeats, reads PONGs and reaps dead sessions.
+
+        Attributes
+        ----------
+        server : Server
+            The server which clients are watched
+        idle_timeout : float | None
+            Seconds without commands and PONGs after which a client is
+            reaped, None never reaps idle clients
+        heartbeat_interval : float | None
+            Seconds between two HEARTBEATs pushed to a client, None
+            disables heartbeats
+        interval : float
+            Seconds between two checks of clients
+        counts : Counter
+            Reaped sessions by reasons, see `REAP_REASONS`
+        selector : BaseSelector
+            Watches the port2 sockets of clients
+        last_heartbeat : dict[socket, float]
+            Monotonic time of the last HEARTBEAT pushed to port2 sockets
+        stop_event : Event
+            Is set to stop the reaper
+        thread : Thread | None
+            The thread of the reaper
+
+        Methods
+        -------
+        start(self)
+            Starts the reaper thread
+        stop(self)
+            Stops the reaper thread
+        run(self)
+            Checks clients every `interval` seconds until stopped
+        watch_push_sockets(self)
+            Watches port2 sockets of new clients and forgets closed ones
+        read_push_sockets(self, timeout: float)
+            Reads PONGs and reaps clients who closed their port2 socket
+        send_heartbeats(self, now: float)
+            Pushes a HEARTBEAT to clients each `heartbeat_interval`
+        last_activity(self, username: str)
+            Returns monotonic time of the last command or PONG of a user
+        reap_idle(self, now: float)
+            Reaps clients idle for `idle_timeout`
+        reap(self, username: str, reason: str)
+            Frees the sockets of `username` and detaches its session
+        snapshot(self)
+            Returns the numbers of reaped sessions by reasons
+    """
+    def __init__(self, server, idle_timeout: float | None,
+                 heartbeat_interval: float | None, interval: float = 1.0):
+        self.server = server
+        self.idle_timeout = idle_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.interval = interval
+        self.counts = Counter()
+        self.selector = selectors.DefaultSelector()
+        self.last_heartbeat: dict[socket.socket, float] = {}
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """ Starts the reaper thread.
+        """
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="reaper",
+                                       daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """ Stops the reaper thread.
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.selector.close()
+
+    def run(self) -> None:
+        """ Checks clients every `interval` seconds until stopped.
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.watch_push_sockets()
+                # Waiting for PONGs is the pause between two checks #
+                self.read_push_sockets(self.interval)
+                now = time.monotonic()
+                self.send_heartbeats(now)
+                self.reap_idle(now)
+                expired = self.server.sessions.expire()
+                self.counts["expired"] += len(expired)
+            except Exception as exc:
+                logging.error("Reaper: %s", exc)
+                self.stop_event.wait(self.interval)
+
+    def watch_push_sockets(self) -> None:
+        """ Watches port2 sockets of new clients and forgets the ones
+            which were replaced or closed.
+        """
+        current = {conn: username for username, (conn, _) in
+                   list(self.server.clients_port2.items())}
+        for key in list(self.selector.get_map().values()):
+            if key.fileobj not in current:
+                self.selector.unregister(key.fileobj)
+                self.last_heartbeat.pop(key.fileobj, None)
+        watched = self.selector.get_map()
+        for conn, username in current.items():
+            if conn not in watched and conn.fileno() != -1:
+                self.selector.register(conn, selectors.EVENT_READ, username)
+
+    def read_push_sockets(self, timeout: float) -> None:
+        """ Reads PONGs (any data counts) from port2 sockets for at most
+            `timeout` seconds and reaps clients who closed them.
+        """
+        if not self.selector.get_map():
+            self.stop_event.wait(timeout)
+            return None
+        for key, _ in self.selector.select(timeout):
+            conn, username = key.fileobj, key.data
+            try:
+                data = conn.recv(4096)
+            except OSError:
+                data = b""
+            if data:
+                conn.last_activity = time.monotonic()
+                # The worker serving port1 of the client reaps it #
+                if self.server.peers is not None and \
+                        username not in self.server.clients_port1:
+                    try:
+                        self.server.peers.report_activity(username)
+                    except (OSError, EOFError, RuntimeError) as exc:
+                        logging.error("PONG of %s cannot be reported: %s",
+                                      username, exc)
+            else:
+                self.selector.unregister(conn)
+                self.reap(username, "closed")
+
+    def send_heartbeats(self, now: float) -> None:
+        """ Pushes a HEARTBEAT to clients each `heartbeat_interval`
+            seconds, counting from their connection to port2.
+        """
+        if self.heartbeat_interval is None:
+            return None
+        for username, (conn, _) in list(self.server.clients_port2.items()):
+            last = self.last_heartbeat.setdefault(conn, now)
+            if now - last < self.heartbeat_interval:
+                continue
+            # Skip the client while another thread pushes to it #
+            if not conn.lock.acquire(blocking=False):
+                continue
+            try:
+                sent = conn.send(HEARTBEAT_FRAME, MSG_DONTWAIT)
+            except BlockingIOError:
+                sent = 0
+            except OSError:
+                sent = None
+            finally:
+                conn.lock.release()
+            self.last_heartbeat[conn] = now
+            if sent is None:
+                self.reap(username, "closed")
+            elif sent < len(HEARTBEAT_FRAME):
+                # The client doesn't read pushed frames anymore #
+                self.reap(username, "stalled")
+
+    def last_activity(self, username: str) -> float:
+        """ Returns monotonic time of the last command or PONG of
+            `username`.
+        """
+        times = [entry[0].last_activity for entry in
+                 (self.server.clients_port1.get(username),
+                  self.server.clients_port2.get(username))
+                 if entry is not None]
+        return max(times, default=0.0)
+
+    def reap_idle(self, now: float) -> None:
+        """ Reaps clients without commands and PONGs for `idle_timeout`
+            seconds. PONGs received by another worker are asked from
+            the hub, only for clients which seem idle here.
+        """
+        if self.idle_timeout is None:
+            return None
+        server = self.server
+        for username in list(server.clients_port1):
+            last = self.last_activity(username)
+            if now - last > self.idle_timeout and server.peers is not None \
+                    and username not in server.clients_port2:
+                try:
+                    last = max(last, server.peers.last_activity(username))
+                except (OSError, EOFError, RuntimeError):
+                    continue
+            if now - last > self.idle_timeout:
+                self.reap(username, "idle")
+
+    def reap(self, username: str, reason: str) -> None:
+        """ Frees the sockets of `username` and detaches its session,
+            so that the thread serving it finishes and the client can
+            still resume it.
+        """
+        server = self.server
+        entry = server.clients_port1.get(username) or \
+            server.clients_port2.get(username)
+        if entry is None:
+            return None
+        conn = entry[0]
+        port1 = server.clients_port1.get(username)
+        if port1 is not None:
+            conn = port1[0]
+            try:
+                # Wakes up the thread which waits in `recv` #
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            server.detach_client(conn)
+        else:
+            server.delete_client_data(username, conn)
+            if reason == "closed" and self.logged_out(username):
+                # Port1 was served by another worker, which got DISCONNECT #
+                logging.debug("Port2 of %s was closed after DISCONNECT",
+                              username)
+                return None
+        self.counts[reason] += 1
+        logging.info("Reaped session of %s (%s)", username, reason)
+
+    def logged_out(self, username: str) -> bool:
+        """ Returns whether `username` has no session anymore, i.e. it
+            disconnected, rather than lost its connection.
+        """
+        try:
+            return not self.server.sessions.exists(username)
+        except (OSError, EOFError, RuntimeError):
+            return False
+
+    def snapshot(self) -> dict[str, int]:
+        """ Returns the numbers of reaped sessions by reasons.
+        """
+        return {reason: self.counts[reason] for reason in REAP_REASONS}
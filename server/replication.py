@@ -0,0 +1,600 @@
+""" The module replicates files of a primary server to replica servers,
+    which serve READ, READIF, OVERREAD and LF to spread the read load.
+
+    Every committed WRITE, OVERWRITE, APPEND and APPENDFILE of the
+    primary becomes a record of its replication log: the written file,
+    whether it was replaced or appended to, and the written data. The
+    log is numbered from 1 under an id which is new on every start of
+    the primary, and its last `backlog` bytes are kept in memory.
+
+    A replica connects to the primary and asks for records after its
+    checkpoint (the log id and the last applied number, which are saved
+    in `CHECKPOINT_FILE`). If the primary still keeps them, they are
+    sent; otherwise the replica gets a snapshot of all files first.
+    Records are sent asynchronously in batches of at most `BATCH_BYTES`:
+    clients of the primary never wait for replicas. Every batch is
+    acknowledged, so the primary knows how far behind each replica is.
+
+    Both sides share `secret`: before any other frame they prove that
+    they know it (see `utils.authenticate_peer`), so neither a stranger
+    can read files of the primary nor a fake primary can write files of
+    a replica. Only files of users are replicated: modules of the
+    server (`.py`) and its own files (`__...`) are never sent, removed
+    or overwritten, and names with path separators are refused.
+
+    Frames are the ones of `utils.FrameReader` (COMMAND SIZE DATA):
+      - SYNC (replica): {"log_id": ..., "seq": ...} of the checkpoint
+      - BATCH (primary): a list of records to apply
+      - SNAPSHOT (primary): a list of records which replace whole files
+      - RESET (primary): {"log_id": ..., "seq": ..., "files": [...]}
+        ends a snapshot, files which aren't listed are removed
+      - ACK (replica): the number of the last applied record
+
+    A replica which crashes after applying a batch and before saving
+    its checkpoint applies the batch again, so appended data may repeat.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    os, json, time, socket, secrets, logging, threading, collections,
+    itertools
+
+    Used custom modules
+    -------------------
+    utils
+
+    Functions
+    ---------
+    parse_address(value: str) -> tuple[str, int] | None
+        Converts `host:port` to an address, "" gives None
+    is_replicated(file_name: str) -> bool
+        Returns whether `file_name` is a file of users to replicate
+    read_from(path: str, offset: int) -> str
+        Returns the content of a file from a byte offset
+    send_frame(sock: socket, command: str, data: str)
+        Sends a frame to the other side of replication
+
+    Classes
+    -------
+    Class Primary:
+        The replication log of a primary and the replicas reading it
+    Class Replica:
+        Applies the replication log of a primary to this server
+"""
+
+import os
+import json
+import time
+import socket
+import secrets
+import logging
+import threading
+from collections import deque
+from itertools import islice
+
+from utils import FrameReader, tune_socket, authenticate_peer
+
+SYNC = "SYNC"
+BATCH = "BATCH"
+SNAPSHOT = "SNAPSHOT"
+RESET = "RESET"
+ACK = "ACK"
+CHECKPOINT_FILE = os.path.join("server", "__replica__.json")
+BATCH_BYTES = 1024 * 1024  # Data of records sent in one batch
+KEEPALIVE_INTERVAL = 5.0   # Seconds after which an empty batch is sent
+RETRY_DELAY = 1.0          # Seconds before a replica connects again
+REPLICATION_BUF_SIZE = 65536
+READ_ONLY = "Error: Server is a read-only replica"
+
+
+def parse_address(value: str) -> tuple[str, int] | None:
+    """ Converts `host:port` to an address, "" and "none" give None.
+
+        Raises
+        ------
+        ValueError
+            If there's no host or the port isn't a number
+    """
+    if value.strip().lower() in ("", "none"):
+        return None
+    host, _, port = value.strip().rpartition(":")
+    if not host:
+        raise ValueError(f"Invalid address {value!r}")
+    return host, int(port)
+
+
+def is_replicated(file_name: str) -> bool:
+    """ Returns whether `file_name` is a file of users in the server's
+        directory, which is replicated. Modules and own files of the
+        server and names which lead out of the directory are not.
+    """
+    separators = [sep for sep in ("/", os.sep, os.altsep) if sep]
+    return bool(file_name) and file_name not in (".", "..") and \
+        not file_name.startswith("__") and not file_name.endswith(".py") \
+        and not any(sep in file_name for sep in separators)
+
+
+def read_from(path: str, offset: int) -> str:
+    """ Returns the content of the file `path` from the byte `offset`.
+        Bytes which aren't UTF-8 are kept as surrogates, so they're
+        written back unchanged.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read().decode("utf-8", "surrogateescape")
+
+
+def send_frame(sock: socket.socket, command: str, data: str) -> None:
+    """ Sends the frame `command` with `data`. JSON of records is
+        ASCII, so surrogates of `read_from` are escaped in it.
+    """
+    sock.sendall(f"{command} {len(data)} {data}".encode())
+
+
+class Primary:
+    """ The replication log of a primary and the replicas reading it.
+
+        Attributes
+        ----------
+        server : Server
+            The primary server
+        address : tuple[str, int]
+            The address at which replicas connect
+        backlog : int
+            Bytes of data of the newest records kept for replicas
+        secret : str
+            The secret which replicas must know
+        log_id : str
+            The id of the log, which is new on every start
+        seq : int
+            The number of the last record
+        records : deque[dict]
+            The newest records
+        size : int
+            Bytes of data of `records`
+        replicas : dict[str, dict]
+            The acknowledged record and sent bytes by replicas
+        listener : socket | None
+            Accepts connections of replicas
+        closed : bool
+            Whether the primary was stopped
+        condition : Condition
+            Protects the log and wakes up replicas on new records
+
+        Methods
+        -------
+        start(self)
+            Starts accepting replicas
+        stop(self)
+            Stops accepting and serving replicas
+        record(self, file_name: str, offset: int, replace: bool)
+            Adds a modification of `file_name` to the log
+        records_after(self, seq: int)
+            Returns the kept records after `seq`
+        accept_replicas(self)
+            Accepts connections of replicas until stopped
+        serve_replica(self, conn: socket, name: str)
+            Sends records to a replica until it disconnects
+        send_snapshot(self, conn: socket, reader: FrameReader,
+            name: str)
+            Sends all files to a replica
+        send_batch(self, conn: socket, reader: FrameReader,
+            command: str, records: list[dict], name: str)
+            Sends records and waits for their acknowledgement
+        wait_ack(self, reader: FrameReader, name: str)
+            Waits for the acknowledgement of a replica
+        snapshot(self)
+            Returns the log and the lag of replicas as a dictionary
+    """
+    def __init__(self, server, address: tuple[str, int], backlog: int,
+                 secret: str):
+        self.server = server
+        self.address = address
+        self.backlog = backlog
+        self.secret = secret
+        self.log_id = secrets.token_hex(8)
+        self.seq = 0
+        self.records: deque[dict] = deque()
+        self.size = 0
+        self.replicas: dict[str, dict] = {}
+        self.listener: socket.socket | None = None
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def start(self) -> None:
+        """ Starts accepting replicas in a background thread, if the
+            replication port can be bound.
+        """
+        try:
+            self.listener = socket.create_server(self.address)
+        except OSError as exc:
+            logging.error("Replicas cannot be served: %s", exc)
+            return None
+        threading.Thread(target=self.accept_replicas, name="replication",
+                         daemon=True).start()
+        logging.info("Serving replicas at %s:%d", *self.address)
+
+    def stop(self) -> None:
+        """ Stops accepting and serving replicas.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.listener is not None:
+            self.listener.close()
+
+    def record(self, file_name: str, offset: int, replace: bool) -> None:
+        """ Adds a modification of `file_name` to the log: its content
+            from the byte `offset`, which replaces the file or is
+            appended to it. It's called under the file lock, so records
+            are in the order of modifications.
+        """
+        if not is_replicated(file_name):
+            return None
+        data = read_from(os.path.join("server", file_name), offset)
+        with self.condition:
+            self.seq += 1
+            self.records.append({"seq": self.seq, "file": file_name,
+                                 "op": "write" if replace else "append",
+                                 "data": data, "time": time.time()})
+            self.size += len(data)
+            # The newest record is kept even if it's larger #
+            while self.size > self.backlog and len(self.records) > 1:
+                self.size -= len(self.records.popleft()["data"])
+            self.condition.notify_all()
+
+    def records_after(self, seq: int) -> list[dict] | None:
+        """ Returns the kept records after `seq`, None if some of them
+            aren't kept anymore.
+        """
+        with self.condition:
+            if seq >= self.seq:
+                return []
+            if not self.records or self.records[0]["seq"] > seq + 1:
+                return None
+            return list(islice(self.records,
+                               seq + 1 - self.records[0]["seq"], None))
+
+    def accept_replicas(self) -> None:
+        """ Accepts connections of replicas until stopped.
+        """
+        while not self.closed:
+            try:
+                conn, addr = self.listener.accept()
+            except OSError:
+                break
+            tune_socket(conn)
+            threading.Thread(target=self.serve_replica,
+                             args=[conn, f"{addr[0]}:{addr[1]}"],
+                             daemon=True).start()
+
+    def serve_replica(self, conn: socket.socket, name: str) -> None:
+        """ Sends records to a replica until it disconnects. A replica
+            which is behind the kept records gets a snapshot.
+        """
+        reader = FrameReader(conn, REPLICATION_BUF_SIZE)
+        try:
+            conn.settimeout(KEEPALIVE_INTERVAL * 3)
+            authenticate_peer(conn, reader, self.secret, initiator=False)
+            frame = reader.read_frame()
+            if frame is None or frame[0] != SYNC:
+                return None
+            checkpoint = json.loads(frame[1])
+            acked = checkpoint.get("seq", 0) \
+                if checkpoint.get("log_id") == self.log_id else None
+            self.replicas[name] = {"acked": acked or 0, "sent_bytes": 0}
+            logging.info("Replica %s connected", name)
+            while not self.closed:
+                records = None if acked is None \
+                    else self.records_after(acked)
+                if records is None:
+                    acked = self.send_snapshot(conn, reader, name)
+                    continue
+                if not records:
+                    with self.condition:
+                        self.condition.wait_for(
+                            lambda: self.seq > acked or self.closed,
+                            KEEPALIVE_INTERVAL)
+                    records = self.records_after(acked) or []
+                batch, size = [], 0
+                for record in records:
+                    if batch and size + len(record["data"]) > BATCH_BYTES:
+                        break
+                    batch.append(record)
+                    size += len(record["data"])
+                acked = self.send_batch(conn, reader, BATCH, batch, name)
+        except (OSError, ValueError) as exc:
+            logging.info("Replica %s disconnected: %s", name, exc)
+        finally:
+            self.replicas.pop(name, None)
+            conn.close()
+
+    def send_snapshot(self, conn: socket.socket, reader: FrameReader,
+                      name: str) -> int:
+        """ Sends all files to a replica, which are read at once under
+            the file lock, and returns the number of the last record
+            which they include.
+        """
+        with self.server.file_lock:
+            seq = self.seq
+            files = {}
+            for file_name in list(self.server.file_index.files):
+                if not is_replicated(file_name):
+                    continue
+                try:
+                    files[file_name] = read_from(
+                        os.path.join("server", file_name), 0)
+                except OSError:
+                    continue
+        logging.info("Sending snapshot of %d files to replica %s",
+                     len(files), name)
+        batch, size = [], 0
+        for file_name, data in files.items():
+            if batch and size + len(data) > BATCH_BYTES:
+                self.send_batch(conn, reader, SNAPSHOT, batch, name)
+                batch, size = [], 0
+            batch.append({"seq": seq, "file": file_name, "op": "write",
+                          "data": data, "time": time.time()})
+            size += len(data)
+        if batch:
+            self.send_batch(conn, reader, SNAPSHOT, batch, name)
+        reset = json.dumps({"log_id": self.log_id, "seq": seq,
+                            "files": list(files)})
+        send_frame(conn, RESET, reset)
+        self.wait_ack(reader, name)
+        return seq
+
+    def send_batch(self, conn: socket.socket, reader: FrameReader,
+                   command: str, records: list[dict], name: str) -> int:
+        """ Sends `records` to a replica and returns the number of the
+            last record it applied.
+        """
+        data = json.dumps(records)
+        send_frame(conn, command, data)
+        self.replicas[name]["sent_bytes"] += len(data)
+        return self.wait_ack(reader, name)
+
+    def wait_ack(self, reader: FrameReader, name: str) -> int:
+        """ Waits for the acknowledgement of a replica and returns the
+            number of the last record it applied.
+
+            Raises
+            ------
+            ConnectionError
+                If the replica disconnected
+        """
+        frame = reader.read_frame()
+        if frame is None or frame[0] != ACK:
+            raise ConnectionError("no acknowledgement")
+        acked = int(frame[1])
+        self.replicas[name]["acked"] = acked
+        return acked
+
+    def snapshot(self) -> dict:
+        """ Returns the log and the lag of replicas as a dictionary: the
+            lag in records and the age of the oldest unapplied record.
+        """
+        now = time.time()
+        with self.condition:
+            first = self.records[0]["seq"] if self.records else self.seq + 1
+            replicas = {}
+            for name, state in list(self.replicas.items()):
+                acked = state["acked"]
+                index = acked + 1 - first
+                lag_seconds = now - self.records[index]["time"] \
+                    if acked < self.seq and 0 <= index < len(self.records) \
+                    else 0.0
+                replicas[name] = {"acked": acked,
+                                  "lag_records": self.seq - acked,
+                                  "lag_seconds": round(lag_seconds, 3),
+                                  "sent_bytes": state["sent_bytes"]}
+            return {"role": "primary", "log_id": self.log_id,
+                    "seq": self.seq, "backlog_records": len(self.records),
+                    "backlog_bytes": self.size, "replicas": replicas}
+
+
+class Replica:
+    """ Applies the replication log of a primary to this server.
+
+        Attributes
+        ----------
+        server : Server
+            The replica server
+        primary : tuple[str, int]
+            The replication address of the primary
+        secret : str
+            The secret which the primary must know
+        log_id : str | None
+            The id of the applied log, None until a snapshot was applied
+        seq : int
+            The number of the last applied record
+        applied : int
+            Records applied since start
+        applied_at : float | None
+            Time when the last record was applied
+        connected : bool
+            Whether the replica is connected to the primary
+        sock : socket | None
+            The connection to the primary
+        stop_event : Event
+            Is set to stop the replica
+
+        Methods
+        -------
+        start(self)
+            Starts following the primary
+        stop(self)
+            Stops following the primary
+        run(self)
+            Follows the primary, connecting again after failures
+        follow(self)
+            Applies frames of the primary until it disconnects
+        apply(self, records: list[dict], checkpoint: bool = True)
+            Writes records to files
+        reset(self, state: dict)
+            Removes files which aren't in a finished snapshot
+        load_checkpoint(self)
+            Reads the saved log id and record number
+        save_checkpoint(self)
+            Saves the log id and the last applied record number
+        snapshot(self)
+            Returns the state of the replica as a dictionary
+    """
+    def __init__(self, server, primary: tuple[str, int], secret: str):
+        self.server = server
+        self.primary = primary
+        self.secret = secret
+        self.log_id: str | None = None
+        self.seq = 0
+        self.applied = 0
+        self.applied_at: float | None = None
+        self.connected = False
+        self.sock: socket.socket | None = None
+        self.stop_event = threading.Event()
+        self.load_checkpoint()
+
+    def start(self) -> None:
+        """ Starts following the primary in a background thread.
+        """
+        threading.Thread(target=self.run, name="replica",
+                         daemon=True).start()
+
+    def stop(self) -> None:
+        """ Stops following the primary.
+        """
+        self.stop_event.set()
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def run(self) -> None:
+        """ Follows the primary, connecting again `RETRY_DELAY` seconds
+            after a failure.
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.follow()
+            except (OSError, ValueError) as exc:
+                logging.debug("Replication from %s:%d failed: %s",
+                              *self.primary, exc)
+            finally:
+                self.connected = False
+                if self.sock is not None:
+                    self.sock.close()
+                    self.sock = None
+            self.stop_event.wait(RETRY_DELAY)
+
+    def follow(self) -> None:
+        """ Sends the checkpoint to the primary and applies its frames
+            until it disconnects.
+        """
+        self.sock = socket.create_connection(self.primary,
+                                             KEEPALIVE_INTERVAL)
+        tune_socket(self.sock)
+        # The primary sends at least an empty batch every interval #
+        self.sock.settimeout(KEEPALIVE_INTERVAL * 3)
+        reader = FrameReader(self.sock, REPLICATION_BUF_SIZE)
+        try:
+            authenticate_peer(self.sock, reader, self.secret, initiator=True)
+        except ConnectionError as exc:
+            logging.error("Primary %s:%d refused: %s", *self.primary, exc)
+            raise
+        send_frame(self.sock, SYNC, json.dumps({"log_id": self.log_id,
+                                                "seq": self.seq}))
+        self.connected = True
+        logging.info("Replicating files of %s:%d", *self.primary)
+        while (frame := reader.read_frame()) is not None:
+            command, data = frame
+            if command == BATCH:
+                self.apply(json.loads(data))
+            elif command == SNAPSHOT:
+                if self.log_id is not None:
+                    # Files don't match any log until the snapshot ends #
+                    self.log_id = None
+                    self.save_checkpoint()
+                self.apply(json.loads(data), checkpoint=False)
+            elif command == RESET:
+                self.reset(json.loads(data))
+            else:
+                raise ValueError(f"Unknown frame {command}")
+            send_frame(self.sock, ACK, str(self.seq))
+
+    def apply(self, records: list[dict], checkpoint: bool = True) -> None:
+        """ Writes `records` to files under the file lock, updates their
+            metadata and, with `checkpoint`, saves the checkpoint.
+
+            Raises
+            ------
+            ValueError
+                If a record isn't of a replicated file, which ends the
+                connection to the primary
+        """
+        for record in records:
+            if not is_replicated(record["file"]):
+                raise ValueError(f"Invalid file name {record['file']!r}")
+            replace = record["op"] == "write"
+            with self.server.file_lock:
+                with open(os.path.join("server", record["file"]),
+                          "w" if replace else "a", encoding="utf-8",
+                          errors="surrogateescape") as f:
+                    f.write(record["data"])
+                self.server.file_updated(record["file"], None, replace)
+            self.applied += 1
+            self.applied_at = time.time()
+        if checkpoint and records:
+            self.seq = max(self.seq, records[-1]["seq"])
+            self.save_checkpoint()
+
+    def reset(self, state: dict) -> None:
+        """ Removes files which aren't in a finished snapshot and makes
+            the snapshot the checkpoint.
+        """
+        kept = set(state["files"])
+        with self.server.file_lock:
+            for file_name in list(self.server.file_index.files):
+                if file_name not in kept and is_replicated(file_name):
+                    try:
+                        os.remove(os.path.join("server", file_name))
+                    except FileNotFoundError:
+                        pass
+                    self.server.file_updated(file_name)
+        self.log_id = state["log_id"]
+        self.seq = state["seq"]
+        self.save_checkpoint()
+        logging.info("Snapshot of %d files was applied", len(kept))
+
+    def load_checkpoint(self) -> None:
+        """ Reads the saved log id and record number, a replica without
+            them starts from a snapshot.
+        """
+        try:
+            with open(CHECKPOINT_FILE, "r") as f:
+                checkpoint = json.load(f)
+            self.log_id = checkpoint["log_id"]
+            self.seq = int(checkpoint["seq"])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logging.error("Replication checkpoint cannot be read: %s", exc)
+
+    def save_checkpoint(self) -> None:
+        """ Saves the log id and the last applied record number.
+        """
+        tmp_path = CHECKPOINT_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"log_id": self.log_id, "seq": self.seq}, f)
+        os.replace(tmp_path, CHECKPOINT_FILE)
+
+    def snapshot(self) -> dict:
+        """ Returns the state of the replica as a dictionary.
+        """
+        age = None if self.applied_at is None \
+            else round(time.time() - self.applied_at, 3)
+        return {"role": "replica", "primary": "%s:%d" % self.primary,
+                "connected": self.connected, "log_id": self.log_id,
+                "seq": self.seq, "applied": self.applied,
+                "last_applied_s": age}
@@ -0,0 +1,375 @@
+""" The module keeps an inverted index of words in server's text files,
+    so that SEARCH finds lines of files without reading every file.
+
+    Words are runs of letters, digits and underscores, compared in
+    lower case. For every file the index keeps byte offsets where its
+    lines start and line numbers of every word, and for every word the
+    files which contain it. A query is answered by intersecting the
+    files and then the lines of its words, so only lines which contain
+    a quoted phrase are read from disk, to check that its words follow
+    each other.
+
+    The index is updated whenever a file is modified: a written file
+    is indexed again, while appended data is indexed from the start of
+    the last line, so appending to a large file costs only the new
+    lines. Files which aren't UTF-8 text, and files larger than
+    `max_file_size`, are not indexed. On start all files are indexed
+    by a background thread, queries before it finished may miss files.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    os, re, logging, threading, array
+
+    Functions
+    ---------
+    words_of(text: str) -> list[str]
+        Returns words of `text` in lower case
+    parse_query(query: str) -> tuple[list[str], list[list[str]], int]
+        Converts a query of SEARCH to words, phrases and a limit
+
+    Classes
+    -------
+    Class IndexedFile:
+        Lines and words of a single file
+    Class SearchIndex:
+        The inverted index of words in server's files
+"""
+
+import os
+import re
+import logging
+import threading
+from array import array
+
+WORD = re.compile(r"\w+")
+# A quoted phrase, a `key=value` option or a single word of a query #
+QUERY_PART = re.compile(r'"([^"]*)"?|(\S+)')
+MAX_FILE_SIZE = 16 * 1024 * 1024  # Larger files are not indexed
+SEARCH_LIMIT = 100        # Matches of SEARCH without `limit`
+MAX_SEARCH_LIMIT = 1000   # The largest `limit` of SEARCH
+
+
+def words_of(text: str) -> list[str]:
+    """ Returns words of `text` in lower case, in their order.
+    """
+    return WORD.findall(text.lower())
+
+
+def parse_query(query: str) -> tuple[list[str], list[list[str]], int]:
+    """ Converts a query of SEARCH to words, phrases and a limit.
+
+        A query consists of words, which must all be in a matching
+        line, and of phrases in double quotes, whose words must follow
+        each other there. `limit=N` sets how many matches are returned
+        (default is `SEARCH_LIMIT`).
+
+        Returns
+        -------
+        tuple[list[str], list[list[str]], int]
+            All words of the query, words of every phrase of at least
+            two words and the limit
+
+        Raises
+        ------
+        ValueError
+            If the query has no words or the limit is invalid
+    """
+    words, phrases, limit = [], [], SEARCH_LIMIT
+    for phrase, part in QUERY_PART.findall(query):
+        if part.startswith("limit="):
+            try:
+                limit = int(part.removeprefix("limit="))
+            except ValueError:
+                raise ValueError("Limit must be a number") from None
+            if not 1 <= limit <= MAX_SEARCH_LIMIT:
+                raise ValueError(f"Limit must be from 1 to "
+                                 f"{MAX_SEARCH_LIMIT}")
+            continue
+        found = words_of(phrase or part)
+        words.extend(found)
+        if phrase and len(found) > 1:
+            phrases.append(found)
+    if not words:
+        raise ValueError("Query has no words")
+    return words, phrases, limit
+
+
+class IndexedFile:
+    """ Lines and words of a single file.
+
+        The last line is the one after the last newline, it's empty if
+        the file ends with a newline.
+
+        Attributes
+        ----------
+        size : int
+            Bytes of the file which are indexed
+        lines : array
+            Byte offsets where lines start
+        words : dict[str, array]
+            Ascending numbers of lines which contain every word
+    """
+    __slots__ = ("size", "lines", "words")
+
+    def __init__(self):
+        self.size = 0
+        self.lines = array("q")
+        self.words: dict[str, array] = {}
+
+
+class SearchIndex:
+    """ The inverted index of words in server's files.
+
+        Attributes
+        ----------
+        directory : str
+            The directory whose files are indexed
+        max_file_size : int | None
+            Bytes of the largest indexed file, None indexes all files
+        files : dict[str, IndexedFile]
+            Indexed files by their names
+        postings : dict[str, set[str]]
+            Names of files which contain every word
+        ready : Event
+            Is set when all files were indexed on start
+        queries : int
+            Number of answered queries
+        lock : Lock
+            The lock which protects `files`, `postings` and `queries`
+        update_lock : Lock
+            Serializes reading of files, so an older content never
+            replaces a newer one
+
+        Methods
+        -------
+        start(self)
+            Indexes all files in a background thread
+        build(self)
+            Indexes files which weren't indexed yet
+        update(self, name: str, replace: bool = True)
+            Indexes file `name` after it was modified
+        index(self, name: str, entry: IndexedFile | None)
+            Indexes the whole file `name` or its new lines
+        drop_words(self, name: str, words)
+            Removes file `name` from postings of `words`
+        remove(self, name: str)
+            Removes file `name` from the index
+        scan_lines(data: bytes, offset: int, first_line: int)
+            Returns starts of lines and lines of words in `data`
+        search(self, words: list[str], phrases: list[list[str]],
+            limit: int)
+            Returns lines which contain `words` and `phrases`
+        contains(self, name: str, offset: int, phrases: list[list[str]])
+            Returns whether a line of file `name` contains `phrases`
+        snapshot(self)
+            Returns the size of the index as a dictionary
+    """
+    def __init__(self, directory: str, max_file_size: int | None):
+        self.directory = directory
+        self.max_file_size = max_file_size
+        self.files: dict[str, IndexedFile] = {}
+        self.postings: dict[str, set[str]] = {}
+        self.ready = threading.Event()
+        self.queries = 0
+        self.lock = threading.Lock()
+        self.update_lock = threading.Lock()
+
+    def start(self) -> None:
+        """ Indexes all files in a background thread.
+        """
+        threading.Thread(target=self.build, name="search-index",
+                         daemon=True).start()
+
+    def build(self) -> None:
+        """ Indexes files of `directory` which weren't indexed yet,
+            files modified meanwhile were indexed by `update`.
+        """
+        try:
+            names = [entry.name for entry in os.scandir(self.directory)
+                     if not entry.name.startswith("__") and entry.is_file()]
+        except OSError as exc:
+            logging.error("Files cannot be indexed for search: %s", exc)
+            names = []
+        for name in names:
+            with self.update_lock:
+                if name not in self.files:
+                    self.index(name, None)
+        self.ready.set()
+        logging.info("%d files are indexed for search", len(self.files))
+
+    def update(self, name: str, replace: bool = True) -> None:
+        """ Indexes file `name` after it was modified, with `replace`
+            it was written from scratch, otherwise data was appended.
+        """
+        with self.update_lock:
+            self.index(name, None if replace else self.files.get(name))
+
+    def index(self, name: str, entry: IndexedFile | None) -> None:
+        """ Indexes file `name`, the whole file if `entry` is None,
+            otherwise from the start of the last line of `entry`.
+            `update_lock` must be held.
+        """
+        try:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if self.max_file_size is not None and \
+                        size > self.max_file_size:
+                    return self.remove(name)
+                # A file which shrank was written, not appended to #
+                if entry is not None and size < entry.size:
+                    entry = None
+                offset = entry.lines[-1] if entry is not None else 0
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return self.remove(name)
+        except OSError as exc:
+            logging.error("%s cannot be indexed for search: %s", name, exc)
+            return self.remove(name)
+        first_line = len(entry.lines) - 1 if entry is not None else 0
+        try:
+            if b"\0" in data:
+                raise ValueError("binary data")
+            lines, words = self.scan_lines(data, offset, first_line)
+        except ValueError:
+            # Not a text file, e.g. UnicodeDecodeError #
+            return self.remove(name)
+        if entry is None:
+            new = IndexedFile()
+            new.size = offset + len(data)
+            new.lines.extend(lines)
+            new.words = {word: array("l", numbers)
+                         for word, numbers in words.items()}
+            with self.lock:
+                old = self.files.get(name)
+                self.files[name] = new
+                for word in new.words:
+                    self.postings.setdefault(word, set()).add(name)
+                if old is not None:
+                    self.drop_words(name, old.words.keys() - new.words.keys())
+            return None
+        # The old last line is indexed again together with new data #
+        old_last = set(words_of(data[:entry.size - offset].decode()))
+        with self.lock:
+            for word in old_last:
+                numbers = entry.words.get(word)
+                if numbers and numbers[-1] == first_line:
+                    numbers.pop()
+            del entry.lines[first_line:]
+            entry.lines.extend(lines)
+            for word, numbers in words.items():
+                entry.words.setdefault(word, array("l")).extend(numbers)
+                self.postings.setdefault(word, set()).add(name)
+            gone = [word for word in old_last if not entry.words.get(word)]
+            for word in gone:
+                del entry.words[word]
+            self.drop_words(name, gone)
+            entry.size = offset + len(data)
+
+    def drop_words(self, name: str, words) -> None:
+        """ Removes file `name` from postings of `words`. `lock` must be
+            held.
+        """
+        for word in words:
+            files = self.postings.get(word)
+            if files is not None:
+                files.discard(name)
+                if not files:
+                    del self.postings[word]
+
+    def remove(self, name: str) -> None:
+        """ Removes file `name` from the index.
+        """
+        with self.lock:
+            entry = self.files.pop(name, None)
+            if entry is not None:
+                self.drop_words(name, entry.words)
+
+    @staticmethod
+    def scan_lines(data: bytes, offset: int,
+                   first_line: int) -> tuple[list[int], dict[str, list[int]]]:
+        """ Returns byte offsets where lines of `data` start and line
+            numbers of every word, where `data` starts at `offset` of
+            the file with line `first_line`.
+
+            Raises
+            ------
+            UnicodeDecodeError
+                If `data` isn't UTF-8 text
+        """
+        starts, words = [], {}
+        number = first_line
+        for line in data.split(b"\n"):
+            starts.append(offset)
+            offset += len(line) + 1
+            for word in set(words_of(line.decode())):
+                words.setdefault(word, []).append(number)
+            number += 1
+        return starts, words
+
+    def search(self, words: list[str], phrases: list[list[str]],
+               limit: int) -> tuple[list[tuple[str, int, int]], bool]:
+        """ Returns lines which contain all `words` and `phrases`,
+            sorted by file names and line numbers.
+
+            Returns
+            -------
+            tuple[list[tuple[str, int, int]], bool]
+                (file name, line number from 0, byte offset of the
+                line) of at most `limit` lines, and whether more lines
+                match
+        """
+        found = []
+        with self.lock:
+            self.queries += 1
+            postings = [self.postings.get(word) for word in set(words)]
+            if not all(postings):
+                return [], False
+            postings.sort(key=len)
+            for name in sorted(set.intersection(*postings)):
+                entry = self.files[name]
+                # Lines of the rarest word are checked first #
+                numbers = sorted((entry.words[word] for word in set(words)),
+                                 key=len)
+                lines = set(numbers[0]).intersection(*numbers[1:])
+                found.extend((name, number, entry.lines[number])
+                             for number in sorted(lines))
+                if not phrases and len(found) > limit:
+                    break
+        if phrases:
+            # Lines are read only until the limit is passed #
+            checked = []
+            for match in found:
+                if self.contains(match[0], match[2], phrases):
+                    checked.append(match)
+                    if len(checked) > limit:
+                        break
+            found = checked
+        return found[:limit], len(found) > limit
+
+    def contains(self, name: str, offset: int,
+                 phrases: list[list[str]]) -> bool:
+        """ Returns whether the line at `offset` of file `name` contains
+            every phrase as words which follow each other.
+        """
+        try:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                f.seek(offset)
+                line = words_of(f.readline().decode(errors="replace"))
+        except OSError:
+            return False
+        for phrase in phrases:
+            size = len(phrase)
+            if not any(line[i:i + size] == phrase
+                       for i in range(len(line) - size + 1)):
+                return False
+        return True
+
+    def snapshot(self) -> dict:
+        """ Returns the size of the index as a dictionary.
+        """
+        with self.lock:
+            return {"files": len(self.files), "words": len(self.postings),
+                    "queries": self.queries, "ready": self.ready.is_set()}
@@ -4,11 +4,13 @@
 
     Used built-in modules
     ----------------------
-    os, logging, threading, socket
+    os, json, time, signal, logging, threading, socket
 
     Used custom modules
     --------------------
-    protocol, utils
+    protocol, utils, config, sessions, file_index, stats, metrics_http, 
+    profiler, logs, access_log, reaper, rate_limiter, quota, cluster,
+    replication, search_index, tail, watch
 
     Classes
     -------
@@ -18,23 +20,167 @@
 """
 
 import os
+import json
+import time
+import signal
 import logging
-from threading import Thread, Lock
-from socket import socket, AF_INET, SOCK_STREAM, SHUT_RD
-
-from protocol import MESSAGE
-from utils import send_msg_through_socket, receive_whole_data, receive_msg
-
-# Configure log messages #
-log_format = "%(levelname)s: %(message)s"
-logging.basicConfig(level=logging.INFO, format=log_format)
+from threading import Thread, Lock, BoundedSemaphore
+from socket import socket, AF_INET, SOCK_STREAM, SHUT_RD, SHUT_RDWR, \
+    SOL_SOCKET, SO_REUSEADDR, SO_REUSEPORT
+
+from protocol import MESSAGE, UNCHANGED, SHUTDOWN, SESSION_ATTACHED
+from utils import send_msg_through_socket, receive_whole_data, receive_msg, \
+    receive_remaining_data, skip_remaining_data, content_checksum, \
+    tune_socket
+from config import optional_int, optional_float, str_list, str_bool
+from .sessions import SessionManager
+from .file_index import FileIndex, parse_list_options, encode_cursor
+from .search_index import SearchIndex, MAX_FILE_SIZE, parse_query
+from .tail import Followers, read_last_lines, read_range, TAIL_LINES, \
+    MAX_TAIL_LINES
+from .watch import Watchers, COALESCE_DELAY
+from .stats import StatsRegistry, MeteredSocket
+from .metrics_http import MetricsServer
+from .profiler import Profiler, CLIENT_THREAD_PREFIX
+from .logs import configure_logging, start_logging, stop_logging
+from .access_log import AccessLog, ACCESS_LOG_DIR
+from .reaper import Reaper, MSG_DONTWAIT
+from .rate_limiter import RateLimiter, parse_limits, parse_user_limits
+from .quota import QuotaManager, QUOTA_FILE, NOBODY, parse_quotas
+from .cluster import Cluster, parse_peers
+from .replication import Primary, Replica, READ_ONLY, parse_address
 
 # Global Variables #
-SELF_IP = "172.20.10.4"  # IP address of server, by default it is 127.0.0.1
+SELF_IP = "127.0.0.1"    # IP address of server, by default it is 127.0.0.1
 PORT1 = 2021             # Port at which server waits clients and interacts with them
 PORT2 = 2022             # Port to which server sends messages whenever accepts them in `send` command
 BUF_SIZE = 4096          # Buffer size for receiving items
+RESUME_WINDOW = 60       # Seconds during which a lost session can be resumed
+MAX_PENDING_MESSAGES = 100  # Messages kept for a client while it's away
+PORT2_HANDSHAKE_TIMEOUT = 5  # Seconds for a client to introduce itself at port2
+MAX_WORKERS = 1024       # Clients served at the same time, others wait
+BACKLOG = 128            # Connections waiting to be accepted
+REUSE_ADDR = True        # Allows restarting on a port in TIME_WAIT state
+TCP_NODELAY = True       # Sends small replies at once, see `tune_socket`
+KEEPALIVE = True         # Detects dead clients by TCP keepalive probes
+KEEPALIVE_IDLE = 60      # Seconds of idleness before keepalive probes
+SEND_BUFFER = None       # SO_SNDBUF of clients' sockets, None is system's
+RECEIVE_BUFFER = None    # SO_RCVBUF of clients' sockets, None is system's
+IDLE_TIMEOUT = 300       # Seconds without commands and PONGs before reaping
+HEARTBEAT_INTERVAL = 30  # Seconds between HEARTBEATs pushed to port2
+REAP_INTERVAL = 1.0      # Seconds between two checks of the reaper
+DRAIN_TIMEOUT = 30       # Seconds for served commands to finish on shutdown
+RATE_LIMITS = {}         # Limits of all users, see `rate_limiter.py`
+USER_RATE_LIMITS = {}    # Limits of single users, override `RATE_LIMITS`
+USER_QUOTA = None        # Bytes every user may store, None is unlimited
+USER_QUOTAS = {}         # Quotas of single users, override `USER_QUOTA`
+GLOBAL_QUOTA = None      # Bytes all files may take, None is unlimited
+NODE_NAME = ""           # Name of the node in a cluster, "" is IP:PORT1
+CLUSTER_PORT = None      # Port of other nodes, None runs no cluster
+CLUSTER_PEERS = {}       # Other nodes of the cluster, see `cluster.py`
+GOSSIP_INTERVAL = 2.0    # Seconds between two gossips of users to nodes
+CLUSTER_SECRET = ""      # Secret shared by all nodes of a cluster
+REPLICATION_PORT = None  # Port of replicas, None replicates to none
+REPLICATE_FROM = None    # Replication address of the primary of a replica
+REPLICATION_BACKLOG = 64 * 1024 * 1024  # Bytes of records kept for replicas
+REPLICATION_SECRET = ""  # Secret shared by a primary and its replicas
+SEARCH_MAX_FILE_SIZE = MAX_FILE_SIZE  # Larger files aren't searched
+WATCH_DELAY = COALESCE_DELAY  # Seconds during which changes are coalesced
+ADMIN_USERS = []  # Usernames allowed to use STATS and PROFILE, none by default
+PROFILE_SIGNAL_SECONDS = 10  # Seconds of sampling started by SIGUSR1
+STATS_FILE = os.path.join("server", "__stats__.json")  # Stats saved on shutdown
+ACCESS_LOG_SEGMENT_BYTES = 64 * 1024 * 1024  # Size of one access log segment
+ACCESS_LOG_SEGMENTS = 20  # Number of kept access log segments
+# Index of the file name in commands which touch files #
+FILE_ARGUMENT = {"READ": 1, "READIF": 1, "WRITE": 1, "OVERWRITE": 1,
+                 "OVERREAD": 1, "APPEND": 1, "APPENDFILE": 2, "TAIL": 1,
+                 "UNTAIL": 1}
+METRICS_IP = "127.0.0.1"  # Metrics are served only locally
+METRICS_PORT = None      # Port of Prometheus metrics, None disables them
 OK = "OK"               
+SHUTTING_DOWN = "Error: Server is shutting down"
+# Settings which can be changed without editing the code, see `config.py`.
+# Every setting is (name, default, convert, help), where the name is
+# the keyword argument of `Server` #
+SETTINGS = [
+    ("ip", SELF_IP, str, "address at which server listens"),
+    ("port1", PORT1, int, "port of commands"),
+    ("port2", PORT2, int, "port of delivered messages"),
+    ("buf_size", BUF_SIZE, int, "buffer size for receiving items"),
+    ("max_workers", MAX_WORKERS, int, "clients served at the same time"),
+    ("handshake_timeout", PORT2_HANDSHAKE_TIMEOUT, float,
+     "seconds for a client to introduce itself at port2"),
+    ("resume_window", RESUME_WINDOW, float,
+     "seconds during which a lost session can be resumed"),
+    ("max_pending_messages", MAX_PENDING_MESSAGES, int,
+     "messages kept for a client while it's away"),
+    ("admin_users", ADMIN_USERS, str_list,
+     "comma separated usernames allowed to use admin commands"),
+    ("metrics_ip", METRICS_IP, str, "address of Prometheus metrics"),
+    ("metrics_port", METRICS_PORT, optional_int,
+     "port of Prometheus metrics, none disables them"),
+    ("access_log_segment_bytes", ACCESS_LOG_SEGMENT_BYTES, int,
+     "size of one access log segment"),
+    ("access_log_segments", ACCESS_LOG_SEGMENTS, int,
+     "number of kept access log segments"),
+    ("backlog", BACKLOG, int, "connections waiting to be accepted"),
+    ("reuse_addr", REUSE_ADDR, str_bool,
+     "set SO_REUSEADDR on listening sockets"),
+    ("tcp_nodelay", TCP_NODELAY, str_bool,
+     "set TCP_NODELAY on clients' sockets"),
+    ("keepalive", KEEPALIVE, str_bool, "set SO_KEEPALIVE on clients' sockets"),
+    ("keepalive_idle", KEEPALIVE_IDLE, optional_int,
+     "seconds of idleness before keepalive probes"),
+    ("send_buffer", SEND_BUFFER, optional_int,
+     "SO_SNDBUF of clients' sockets in bytes, none is system's"),
+    ("receive_buffer", RECEIVE_BUFFER, optional_int,
+     "SO_RCVBUF of clients' sockets in bytes, none is system's"),
+    ("idle_timeout", IDLE_TIMEOUT, optional_float,
+     "seconds without commands and PONGs before a session is reaped, "
+     "none never reaps idle clients"),
+    ("heartbeat_interval", HEARTBEAT_INTERVAL, optional_float,
+     "seconds between HEARTBEATs pushed to port2, none disables them"),
+    ("reap_interval", REAP_INTERVAL, float,
+     "seconds between two checks for dead sessions"),
+    ("drain_timeout", DRAIN_TIMEOUT, float,
+     "seconds for served commands to finish when shutting down"),
+    ("rate_limits", RATE_LIMITS, parse_limits,
+     "limits of every user as 'name=rate, ...', names are message, "
+     "transfer, list, admin (commands/s), bytes_in and bytes_out "
+     "(bytes/s)"),
+    ("user_rate_limits", USER_RATE_LIMITS, parse_user_limits,
+     "limits of single users as 'user: name=rate, ...; user2: ...'"),
+    ("user_quota", USER_QUOTA, optional_int,
+     "bytes every user may store, none is unlimited"),
+    ("user_quotas", USER_QUOTAS, parse_quotas,
+     "quotas of single users as 'user=bytes, ...', none is unlimited"),
+    ("global_quota", GLOBAL_QUOTA, optional_int,
+     "bytes all files may take together, none is unlimited"),
+    ("node_name", NODE_NAME, str,
+     "name of this node in a cluster, empty is IP:PORT1"),
+    ("cluster_port", CLUSTER_PORT, optional_int,
+     "port at which other nodes connect, none runs no cluster"),
+    ("cluster_peers", CLUSTER_PEERS, parse_peers,
+     "nodes of the cluster as 'name=host:port, ...'"),
+    ("gossip_interval", GOSSIP_INTERVAL, float,
+     "seconds between two gossips of users to other nodes"),
+    ("cluster_secret", CLUSTER_SECRET, str,
+     "secret shared by all nodes of the cluster, required by a node"),
+    ("replication_port", REPLICATION_PORT, optional_int,
+     "port at which replicas follow this primary, none runs no primary"),
+    ("replicate_from", REPLICATE_FROM, parse_address,
+     "host:port of the primary, which makes this server a read-only "
+     "replica, none runs no replica"),
+    ("replication_backlog", REPLICATION_BACKLOG, int,
+     "bytes of the newest records kept for replicas which fall behind"),
+    ("replication_secret", REPLICATION_SECRET, str,
+     "secret shared by the primary and its replicas, required by both"),
+    ("search_max_file_size", SEARCH_MAX_FILE_SIZE, optional_int,
+     "bytes of the largest file indexed for SEARCH, none indexes all"),
+    ("watch_delay", WATCH_DELAY, float,
+     "seconds during which changes of files are coalesced before WATCH "
+     "pushes them"),
+]
 
 
 class Server:
@@ -53,6 +199,23 @@ class Server:
         port2 : int
             The port used to deliver msg when MESSAGE command is 
             received (default is 2022)
+        buf_size : int
+            Buffer size for receiving items
+        handshake_timeout : float
+            Seconds for a client to introduce itself at port2
+        admin_users : list[str]
+            Usernames allowed to use STATS and PROFILE commands
+        workers : BoundedSemaphore
+            Limits the number of clients served at the same time
+        backlog : int
+            Connections waiting to be accepted at each port
+        reuse_addr : bool
+            Whether listening sockets are created with SO_REUSEADDR
+        reuse_port : bool
+            Whether listening sockets are created with SO_REUSEPORT, so
+            that worker processes share the ports
+        socket_options : dict
+            Keyword arguments of `tune_socket` for clients' sockets
         clients_port1 : dict[str, (tuple, socket)]
             The dictionary of clients' usernames, who are connected to 
             server's `port1` and their connection info
@@ -69,15 +232,71 @@ class Server:
         file_lock : Lock
             The lock that is used to prevent race conditions while
             performing fileoperations
+        sessions : SessionManager
+            Sessions of clients, which keep usernames and messages of
+            clients who lost connection until they resume
+        file_index : FileIndex
+            Metadata (size, mtime, version, checksum) of server's files
+        search_index : SearchIndex
+            Words of server's text files, which SEARCH looks up
+        followers : Followers
+            Users who follow data appended to files by TAIL
+        watchers : Watchers
+            Users who WATCH changes of files, with coalesced changes 
+            waiting to be pushed
+        stats : StatsRegistry
+            Counts, bytes in/out, errors and latency histograms of 
+            served commands
+        metrics_ip : str
+            The local address serving metrics over HTTP
+        metrics_port : int | None
+            The local port serving metrics over HTTP, None if disabled
+        metrics_server : MetricsServer | None
+            The HTTP server of metrics, when it's running
+        profiler : Profiler
+            Profiles the threads serving clients on demand
+        access_log : AccessLog
+            Structured log of every served command in `ACCESS_LOG_DIR`
+        reaper : Reaper
+            Pushes heartbeats and reaps idle and dead sessions
+        drain_timeout : float
+            Seconds for served commands to finish when shutting down
+        draining : bool
+            Whether server is shutting down and takes no new commands
+        serving : dict[socket, Thread]
+            Sockets of port1 with the threads serving them
+        rate_limiter : RateLimiter
+            Paces users who exceed their rates of commands and bytes
+        quota : QuotaManager
+            Storage used by users, which is checked against quotas
+        stats_file : str
+            The file where statistics are saved on shutdown
+        peers : HubClient | None
+            The connection to other worker processes, None if the 
+            server runs in one process (see `workers.py`)
+        cluster : Cluster | None
+            Users of other nodes and routing of messages to them, None
+            if the server is not a node of a cluster (see `cluster.py`)
+        replication : Primary | None
+            The log of modifications which replicas follow, None if 
+            the server isn't a primary (see `replication.py`)
+        replica : Replica | None
+            Applies modifications of the primary, None if the server 
+            isn't a read-only replica
 
         Methods:
         --------
-        __init__(self, ip=`SELF_IP`, port1=`PORT1`, port2=`PORT2`)
-            Initialization of object attributes
+        __init__(self, ip=`SELF_IP`, port1=`PORT1`, port2=`PORT2`,
+            metrics_port=`METRICS_PORT`, ...)
+            Initialization of object attributes, keyword arguments are
+            the names of `SETTINGS`
 
         configure_sockets(self)
             Create and return socket objects
 
+        tune_client_socket(self, conn: socket)
+            Sets `socket_options` of an accepted socket
+
         disconnect_clients(self):
             Disconnects all currently connected clients from server
 
@@ -87,30 +306,118 @@ class Server:
         delete_client_data(self, username: str, conn: socket)
             Removes all data from class attributes related to client
 
+        detach_client(self, conn: socket)
+            Frees the sockets of a client who lost connection, but 
+            keeps its session for resuming
+
+        serve_client(self, conn: socket, addr: tuple)
+            Communicates with a client and frees its place among 
+            `workers` when the client leaves
+
         communicate_with_client(self, conn: socket, addr: tuple)
             Communicates with connected client, receives messages
             from client and matches known received commands with 
             appropriate methods
 
+        reply_error(self, conn: socket, message: str)
+            Sends the error of a failed command, detaches the client if
+            the connection is lost
+
+        record_command(self, command: str, message: list[str], 
+            conn: MeteredSocket, started: int, 
+            before: tuple[int, int, int])
+            Records statistics and the access log of a served command
+
         accept_disconnection(self, conn: socket, addr: tuple)
             Closes connection with client and send appropriate msg
 
+        resume_session(self, username: str, token: str, conn: socket,
+            addr: tuple)
+            Reconnects a client to its detached session
+
         list_users(self, conn: socket, addr: tuple)
             Sends to client all currently connected clients' usernames
 
-        list_files(self, conn: socket, addr: tuple)
-            Sends to client all files in server's directory
+        list_files(self, conn: socket, addr: tuple, 
+            options: list[str] = ())
+            Sends to client a page of files with their metadata
+
+        search_files(self, conn: socket, addr: tuple, query: str)
+            Sends to client lines of files which match `query`
+
+        admin_error(self, conn: socket)
+            Returns an error message if `conn` is not of an admin
+
+        send_stats(self, conn: socket, addr: tuple)
+            Sends statistics of served commands to an admin client
+
+        start_profiling(self, mode: str, seconds: str, conn: socket,
+            addr: tuple)
+            Starts profiling server on the request of an admin client
+
+        handle_profile_signal(self, signum: int, frame)
+            Starts sampling server when SIGUSR1 is received
 
-        deliver_message(self, username: str, conn: socket, addr: tuple)
+        handle_shutdown_signal(self, signum: int, frame)
+            Shuts server down gracefully when SIGTERM is received
+
+        deliver_message(self, username: str, conn: socket, addr: tuple,
+            received: str = "")
             Get the sender's message and deliver it to the receiver 
             client with username=`username`
 
-        accept_connection_to_port2(self, username: str)
-            Accepts a connection request to `PORT2`
+        push_message(self, receiver_conn: socket, message: str)
+            Sends a message to the client's port2 socket
+
+        push_frame(self, receiver_conn: socket, command: str, data: str)
+            Sends a frame to the client's port2 socket
+
+        push_to_user(self, username: str, command: str, data: str)
+            Sends a frame to port2 of `username`, wherever it's held
+
+        accept_connections_to_port2(self)
+            Always accepts connection requests to `PORT2`
+
+        register_port2_connection(self, conn: socket, addr: tuple)
+            Maps the port2 socket to the client who opened it
 
         read_file(self, file_name: str, conn: socket, addr: tuple)
             Transfers file `file_name` according to protocol
 
+        conditional_read_file(self, file_name: str, version: str, 
+            conn: socket, addr: tuple)
+            Transfers file `file_name` only if its version differs from
+            `version`
+
+        tail_file(self, conn: socket, addr: tuple, args: list[str])
+            Sends the last lines of a file, in follow mode pushes data
+            appended to it later
+
+        untail_file(self, file_name: str, conn: socket, addr: tuple)
+            Stops pushing data appended to `file_name`
+
+        push_appended(self, file_name: str, start: int, end: int)
+            Queues data appended to `file_name` for its followers
+
+        watch_files(self, conn: socket, addr: tuple, args: list[str])
+            Lets the client watch changes of files matching a pattern
+
+        unwatch_files(self, conn: socket, addr: tuple, args: list[str])
+            Stops the client watching a pattern or all patterns
+
+        file_changed(self, file_name: str, username: str | None = None,
+            replace: bool = False)
+            Is called after `file_name` was modified by a client
+
+        file_updated(self, file_name: str, username: str | None = None,
+            replace: bool = False)
+            Updates metadata of `file_name` modified by this or another
+            worker
+
+        receive_upload(self, file_name: str, conn: socket, 
+            replace: bool, extra: int = 0)
+            Receives data written to `file_name` if it fits quotas
+
         receive_and_save_file(self, file_name: str, client_sock: socket)
             Receives the file content from client and saves that file 
             content to server
@@ -136,8 +443,45 @@ class Server:
         
         start(self)
             Starts the tcp server
+
+        drain(self)
+            Stops accepting clients and lets served commands finish
+
+        notify_shutdown(self)
+            Tells clients at port2 that server is shutting down
+
+        close_listeners(self)
+            Stops accepting connections at both ports
+
+        start_metrics_server(self)
+            Starts serving Prometheus metrics over HTTP
+
+        dump_stats(self)
+            Saves statistics of served commands to `stats_file`
     """
-    def __init__(self, ip=SELF_IP, port1=PORT1, port2=PORT2):
+    def __init__(self, ip=SELF_IP, port1=PORT1, port2=PORT2,
+        metrics_port=METRICS_PORT, buf_size=BUF_SIZE, 
+        max_workers=MAX_WORKERS, handshake_timeout=PORT2_HANDSHAKE_TIMEOUT,
+        resume_window=RESUME_WINDOW, 
+        max_pending_messages=MAX_PENDING_MESSAGES, admin_users=ADMIN_USERS,
+        metrics_ip=METRICS_IP, 
+        access_log_segment_bytes=ACCESS_LOG_SEGMENT_BYTES,
+        access_log_segments=ACCESS_LOG_SEGMENTS, backlog=BACKLOG,
+        reuse_addr=REUSE_ADDR, tcp_nodelay=TCP_NODELAY, keepalive=KEEPALIVE,
+        keepalive_idle=KEEPALIVE_IDLE, send_buffer=SEND_BUFFER,
+        receive_buffer=RECEIVE_BUFFER, idle_timeout=IDLE_TIMEOUT,
+        heartbeat_interval=HEARTBEAT_INTERVAL, reap_interval=REAP_INTERVAL,
+        drain_timeout=DRAIN_TIMEOUT, rate_limits=RATE_LIMITS,
+        user_rate_limits=USER_RATE_LIMITS, user_quota=USER_QUOTA,
+        user_quotas=USER_QUOTAS, global_quota=GLOBAL_QUOTA,
+        node_name=NODE_NAME, cluster_port=CLUSTER_PORT,
+        cluster_peers=CLUSTER_PEERS, gossip_interval=GOSSIP_INTERVAL,
+        cluster_secret=CLUSTER_SECRET,
+        replication_port=REPLICATION_PORT, replicate_from=REPLICATE_FROM,
+        replication_backlog=REPLICATION_BACKLOG,
+        replication_secret=REPLICATION_SECRET,
+        search_max_file_size=SEARCH_MAX_FILE_SIZE, watch_delay=WATCH_DELAY,
+        reuse_port=False):
         """ Initialization of object attributes
 
             Parameters:
@@ -150,19 +494,169 @@ class Server:
             port2 : int. optional
                 The port used to deliver msg when MESSAGE command is 
                 received (default is 2022
+            metrics_port : int | None, optional
+                The local port serving Prometheus metrics over HTTP 
+                (default is None, metrics are not served)
+            buf_size : int, optional
+                Buffer size for receiving items (default is 4096)
+            max_workers : int, optional
+                Clients served at the same time, connections over it 
+                wait until a client leaves (default is 1024)
+            handshake_timeout : float, optional
+                Seconds for a client to introduce itself at port2 
+                (default is 5)
+            resume_window : float, optional
+                Seconds during which a lost session can be resumed 
+                (default is 60)
+            max_pending_messages : int, optional
+                Messages kept for a client while it's away 
+                (default is 100)
+            admin_users : list[str], optional
+                Usernames allowed to use admin commands 
+                (default is [], no admins)
+            metrics_ip : str, optional
+                The local address serving Prometheus metrics 
+                (default is 127.0.0.1)
+            access_log_segment_bytes : int, optional
+                Size of one access log segment (default is 64 MB)
+            access_log_segments : int, optional
+                Number of kept access log segments (default is 20)
+            backlog : int, optional
+                Connections waiting to be accepted (default is 128)
+            reuse_addr : bool, optional
+                Whether to set SO_REUSEADDR on listening sockets 
+                (default is True)
+            tcp_nodelay, keepalive, keepalive_idle, send_buffer,
+            receive_buffer : optional
+                Options of clients' sockets, see `utils.tune_socket`
+                (defaults are True, True, 60, None, None)
+            idle_timeout : float | None, optional
+                Seconds without commands and PONGs after which a session
+                is reaped, None never reaps idle clients (default is 300)
+            heartbeat_interval : float | None, optional
+                Seconds between HEARTBEATs pushed to port2, None 
+                disables heartbeats (default is 30)
+            reap_interval : float, optional
+                Seconds between two checks for dead sessions 
+                (default is 1)
+            drain_timeout : float, optional
+                Seconds for served commands to finish when shutting 
+                down, clients are disconnected after it (default is 30)
+            rate_limits : dict[str, float], optional
+                Rates of command classes and bytes for every user, see
+                `rate_limiter.py` (default is {}, no limits)
+            user_rate_limits : dict[str, dict[str, float]], optional
+                Rates of single users, which override `rate_limits` 
+                (default is {})
+            user_quota : int | None, optional
+                Bytes every user may store (default is None, unlimited)
+            user_quotas : dict[str, int | None], optional
+                Quotas of single users, which override `user_quota` 
+                (default is {})
+            global_quota : int | None, optional
+                Bytes all files may take together 
+                (default is None, unlimited)
+            node_name : str, optional
+                The name of this node in a cluster (default is "", 
+                which is IP:PORT1)
+            cluster_port : int | None, optional
+                The port at which other nodes connect 
+                (default is None, no cluster)
+            cluster_peers : dict[str, tuple[str, int]], optional
+                Cluster addresses of nodes by their names, this node 
+                may be listed too (default is {})
+            gossip_interval : float, optional
+                Seconds between two gossips of users to other nodes 
+                (default is 2)
+            cluster_secret : str, optional
+                The secret shared by all nodes of the cluster, which 
+                they prove to each other (default is "")
+            replication_port : int | None, optional
+                The port at which replicas follow this server 
+                (default is None, no replicas)
+            replicate_from : tuple[str, int] | None, optional
+                The replication address of the primary, which makes 
+                this server a read-only replica (default is None)
+            replication_backlog : int, optional
+                Bytes of the newest records kept for replicas 
+                (default is 64 MiB)
+            replication_secret : str, optional
+                The secret shared by the primary and its replicas, 
+                which they prove to each other (default is "")
+            search_max_file_size : int | None, optional
+                Bytes of the largest file indexed for SEARCH, None 
+                indexes all files (default is 16 MiB)
+            watch_delay : float, optional
+                Seconds during which changes of files are coalesced 
+                before they're pushed to watchers (default is 0.2)
+            reuse_port : bool, optional
+                Whether to set SO_REUSEPORT on listening sockets, which 
+                is done for worker processes (default is False)
         """
         self.ip = ip
         self.port1 = port1
         self.port2 = port2
+        self.buf_size = buf_size
+        self.handshake_timeout = handshake_timeout
+        self.admin_users = admin_users
+        self.workers = BoundedSemaphore(max_workers)
+        self.backlog = backlog
+        self.reuse_addr = reuse_addr
+        self.reuse_port = reuse_port
+        self.socket_options = {
+            "nodelay": tcp_nodelay, "keepalive": keepalive,
+            "keepalive_idle": keepalive_idle, "send_buffer": send_buffer,
+            "receive_buffer": receive_buffer}
         self.clients_port1: dict[str, (tuple, socket)] = {}
         self.clients_port2: dict[str, (tuple, socket)] = {}
         self.active_connections: list[socket] = []
         self.com_socket, self.redirect_socket = self.configure_sockets()
         self.file_lock = Lock()
+        self.sessions = SessionManager(resume_window, max_pending_messages)
+        self.file_index = FileIndex(os.path.join(os.getcwd(), "server"))
+        self.search_index = SearchIndex(self.file_index.directory,
+                                        search_max_file_size)
+        self.followers = Followers(self.push_to_user)
+        self.watchers = Watchers(self.push_to_user, watch_delay)
+        self.stats = StatsRegistry()
+        self.metrics_ip = metrics_ip
+        self.metrics_port = metrics_port
+        self.metrics_server: MetricsServer | None = None
+        self.profiler = Profiler()
+        self.access_log = AccessLog(ACCESS_LOG_DIR, access_log_segment_bytes,
+                                    access_log_segments)
+        self.reaper = Reaper(self, idle_timeout, heartbeat_interval,
+                             reap_interval)
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self.serving: dict[socket, Thread] = {}
+        self.rate_limiter = RateLimiter(rate_limits, user_rate_limits)
+        self.quota = QuotaManager(QUOTA_FILE, user_quota, user_quotas,
+                                  global_quota)
+        self.quota.load(self.file_index)
+        self.stats_file = STATS_FILE
+        self.peers = None
+        self.cluster = None
+        if cluster_port is not None:
+            self.cluster = Cluster(self, node_name or f"{ip}:{port1}",
+                                   (ip, cluster_port), cluster_peers,
+                                   gossip_interval, cluster_secret)
+        self.replication = None
+        if replication_port is not None:
+            self.replication = Primary(self, (ip, replication_port),
+                                       replication_backlog,
+                                       replication_secret)
+        self.replica = None
+        if replicate_from is not None:
+            self.replica = Replica(self, replicate_from,
+                                   replication_secret)
 
     def configure_sockets(self) -> tuple[socket, socket] | tuple[None, None]:
         """ Create and return socket objects. 
 
+            Buffer sizes are set before listening, so the window scale
+            of accepted connections fits them.
+
             Returns
             -------
             None
@@ -174,23 +668,48 @@ class Server:
         try:
             s1 = socket(AF_INET, SOCK_STREAM)
             s2 = socket(AF_INET, SOCK_STREAM)
+            for s in (s1, s2):
+                if self.reuse_addr:
+                    s.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+                if self.reuse_port:
+                    s.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+                tune_socket(s, **self.socket_options)
             s1.bind((self.ip, self.port1))
             s2.bind((self.ip, self.port2))
-            s1.listen()
-            s2.listen()
+            s1.listen(self.backlog)
+            s2.listen(self.backlog)
             return s1, s2
         except Exception as exc:
             logging.error(exc)
             return None, None
         
+    def tune_client_socket(self, conn: socket) -> None:
+        """ Sets `socket_options` of an accepted socket, as accepted 
+            sockets don't inherit all options on every system. Errors of
+            sockets which were already reset by clients are ignored.
+        """
+        try:
+            tune_socket(conn, **self.socket_options)
+        except OSError as exc:
+            logging.debug(exc)
+
     def disconnect_clients(self) -> None:
         """ Disconnects all currently connected clients from server.
 
+            Sockets are shut down before closing, so the threads which
+            still serve them finish.
+
             Returns
             -------
             None
         """
-        for client in self.active_connections:
+        clients = list(self.serving) + list(self.active_connections) + \
+            [conn for conn, _ in list(self.clients_port2.values())]
+        for client in clients:
+            try:
+                client.shutdown(SHUT_RDWR)
+            except OSError:
+                pass
             client.close()
 
     def find_username_from_socket(self, s: socket) -> str:
@@ -235,10 +754,46 @@ class Server:
         if username in self.clients_port1.keys():
             del self.clients_port1[username]
         if username in self.clients_port2.keys():
+            self.clients_port2[username][0].close()
             del self.clients_port2[username]
+            if self.peers is not None:
+                self.peers.drop_port2(username)
         if conn in self.active_connections:
             self.active_connections.remove(conn)
 
+    def detach_client(self, conn: socket) -> None:
+        """ Frees the sockets of a client who lost connection, but keeps
+            its session, so that the client can resume it with RESUME 
+            command.
+
+            Parameters
+            ----------
+            conn : socket
+                The socket object of a client connected to server
+
+            Returns
+            -------
+            None
+        """
+        username = self.find_username_from_socket(conn)
+        self.delete_client_data(username, conn)
+        conn.close()
+        if username:
+            self.sessions.detach(username)
+            logging.info("User %s lost connection, session is kept", username)
+            if self.cluster is not None:
+                self.cluster.announce()
+
+    def serve_client(self, conn: socket, addr: tuple) -> None:
+        """ Communicates with a client and frees its place among 
+            `workers` when the client leaves.
+        """
+        try:
+            self.communicate_with_client(conn, addr)
+        finally:
+            self.serving.pop(conn, None)
+            self.workers.release()
+
     def communicate_with_client(self, conn: socket, addr: tuple) -> None:
         """ Communicates with connected client, receives messages
             from client and matches known received commands with 
@@ -252,56 +807,185 @@ class Server:
             addr : tuple
                 Contains client's ip and port
             
-            Finishes when the client has disconnected or when server 
-            lost connection with client
+            Finishes when the client has disconnected, when server 
+            lost connection with client or when server is draining
         """
         while True:
+            command = "UNKNOWN"
             try:
-                message = receive_msg(conn, BUF_SIZE).split()
+                if self.draining:
+                    self.detach_client(conn)
+                    break
+                before = (conn.bytes_in, conn.bytes_out, conn.errors)
+                raw_message = receive_msg(conn, self.buf_size)
+                if not raw_message:
+                    # Client closed the socket without DISCONNECT #
+                    self.detach_client(conn)
+                    break
+                conn.busy = True
+                conn.last_activity = time.monotonic()
+                # A command which came after draining started is refused #
+                if self.draining and raw_message:
+                    conn.busy = False
+                    send_msg_through_socket(conn, SHUTTING_DOWN)
+                    continue
+                message = raw_message.split() or [""]
                 command = message[0]
+                # Heavy users wait here, without holding any lock #
+                self.rate_limiter.pace(conn.username, command)
+                started = time.perf_counter_ns()
+                profile = self.profiler.begin_command() \
+                    if self.profiler.cprofile_enabled else None
                 params = message[1:] if len(message)>1 else []
                 params.extend([conn, addr])
-                match command:
-                    case "CONNECT":
-                        self.accept_connection(*params)
-                    case "DISCONNECT":
-                        self.accept_disconnection(*params)
-                        break
-                    case "LU":
-                        self.list_users(*params)
-                    case "LF":
-                        self.list_files(*params)
-                    case "MESSAGE":
-                        self.deliver_message(*params)
-                    case "READ":
-                        with self.file_lock:
-                            self.read_file(*params)
-                    case "WRITE":
-                        with self.file_lock:
-                            self.write_file(*params)
-                    case "OVERWRITE":
-                        with self.file_lock:
-                            self.overwrite_file(*params)
-                    case "OVERREAD":
-                        with self.file_lock:
-                            self.overread_file(*params)
-                    case "APPEND":
-                        with self.file_lock:
-                            self.append_file(*params)
-                    case "APPENDFILE":
-                        with self.file_lock:
-                            self.appendfile_file(*params)
-            except ConnectionResetError as exc:
-                username = self.find_username_from_socket(conn)
-                self.delete_client_data(username, conn)
-                logging.error(exc.strerror)
-                break
-            except IndexError:
+                # The frame of MESSAGE may arrive together with command #
+                if command == "MESSAGE":
+                    params = raw_message.split(maxsplit=2)[1:]
+                    params[1:1] = [conn, addr]
+                try:
+                    match command:
+                        case "CONNECT":
+                            self.accept_connection(*params)
+                        case "DISCONNECT":
+                            self.accept_disconnection(*params)
+                            break
+                        case "LU":
+                            self.list_users(*params)
+                        case "LF":
+                            self.list_files(params[-2], params[-1], 
+                                            params[:-2])
+                        case "SEARCH":
+                            self.search_files(conn, addr, 
+                                              raw_message.partition(" ")[2])
+                        case "MESSAGE":
+                            self.deliver_message(*params)
+                        case "READ":
+                            with self.file_lock:
+                                self.read_file(*params)
+                        case "TAIL":
+                            with self.file_lock:
+                                self.tail_file(params[-2], params[-1], 
+                                               params[:-2])
+                        case "UNTAIL":
+                            self.untail_file(*params)
+                        case "WATCH":
+                            self.watch_files(params[-2], params[-1], 
+                                             params[:-2])
+                        case "UNWATCH":
+                            self.unwatch_files(params[-2], params[-1], 
+                                               params[:-2])
+                        # Files of a replica change only by replication #
+                        case "WRITE" | "OVERWRITE" | "APPEND" | \
+                                "APPENDFILE" if self.replica is not None:
+                            send_msg_through_socket(conn, READ_ONLY)
+                        case "WRITE":
+                            with self.file_lock:
+                                self.write_file(*params)
+                        case "OVERWRITE":
+                            with self.file_lock:
+                                self.overwrite_file(*params)
+                        case "OVERREAD":
+                            with self.file_lock:
+                                self.overread_file(*params)
+                        case "APPEND":
+                            with self.file_lock:
+                                self.append_file(*params)
+                        case "APPENDFILE":
+                            with self.file_lock:
+                                self.appendfile_file(*params)
+                        case "RESUME":
+                            self.resume_session(*params)
+                        case "READIF":
+                            with self.file_lock:
+                                self.conditional_read_file(*params)
+                        case "STATS":
+                            self.send_stats(*params)
+                        case "PROFILE":
+                            self.start_profiling(*params)
+                        case _:
+                            command = "UNKNOWN"
+                finally:
+                    conn.busy = False
+                    if profile is not None:
+                        self.profiler.end_command(command, profile)
+                    self.record_command(command, message, conn, started, 
+                                        before)
+                self.rate_limiter.settle(conn.username,
+                                         conn.bytes_in - before[0],
+                                         conn.bytes_out - before[1])
+            except OSError as exc:
+                # The connection is lost, the session can be resumed #
+                self.detach_client(conn)
+                logging.error("%s", exc.strerror or exc)
                 break
+            except (TypeError, ValueError, IndexError) as exc:
+                # Wrong arguments, the client is told and keeps its session #
+                logging.error("%s", exc)
+                if not self.reply_error(conn, 
+                        f"Error: Invalid arguments of {command}"):
+                    break
             except Exception as exc:
-                logging.error(f"{exc}")
-                break
+                logging.exception("%s failed: %s", command, exc)
+                if not self.reply_error(conn, f"Error: {command} failed"):
+                    break
+
+    def reply_error(self, conn: socket, message: str) -> bool:
+        """ Sends the error `message` of a failed command to client.
+
+            Parameters
+            ----------
+            conn : socket
+                The socket object of a client
+            message : str
+                The error message
+
+            Returns
+            -------
+            bool
+                True if it was sent, False if the connection was lost 
+                and the client was detached
+        """
+        try:
+            send_msg_through_socket(conn, message)
+        except OSError:
+            self.detach_client(conn)
+            return False
+        return True
     
+    def record_command(self, command: str, message: list[str],
+        conn: MeteredSocket, started: int, 
+        before: tuple[int, int, int]) -> None:
+        """ Records statistics and the access log of a served command.
+
+            Parameters
+            ----------
+            command : str
+                The name of the served command
+            message : list[str]
+                The received command split by spaces
+            conn : MeteredSocket
+                The socket object of a client
+            started : int
+                `time.perf_counter_ns()` when the command was received
+            before : tuple[int, int, int]
+                Bytes received, bytes sent and errors of `conn` before
+                the command was received
+
+            Returns
+            -------
+            None
+        """
+        latency = time.perf_counter_ns() - started
+        bytes_in = conn.bytes_in - before[0]
+        bytes_out = conn.bytes_out - before[1]
+        errors = conn.errors - before[2]
+        self.stats.record(command, latency, bytes_in, bytes_out, errors)
+        index = FILE_ARGUMENT.get(command)
+        file_name = message[index] if index and len(message) > index \
+            else None
+        self.access_log.log(conn.username, command, file_name, bytes_in, 
+                            bytes_out, latency // 1000, not errors)
+
     def accept_connection(self, username: str, conn: socket, addr: tuple):
         """ Connect a client to server
 
@@ -319,20 +1003,28 @@ class Server:
             None
         """
         message = str()
+        self.sessions.expire()
         if conn in self.active_connections:
             message = "Error: Attemp to establish a connection even if it's \
                 already established!"
-        elif username not in self.clients_port1.keys():
+        # The session is created only if the username is free, also at
+        # other workers and nodes #
+        elif username not in self.clients_port1.keys() and \
+            (self.cluster is None or 
+             self.cluster.locate(username) is None) and \
+            (token := self.sessions.create_if_new(username)) is not None:
             self.clients_port1[username] = (conn, addr)
             self.active_connections.append(conn)
-            message = OK
-            logging.debug(f"Accepted connection to port 1")
-        elif username in self.clients_port1.keys():
+            conn.username = username
+            message = f"{OK} {token}"
+            logging.debug("Accepted connection to port 1")
+            if self.cluster is not None:
+                self.cluster.announce()
+        else:
             message = "Error: User with given username already exists!"
         send_msg_through_socket(conn, message)
-        if message == OK:
-            self.accept_connection_to_port2(username)
-            logging.info(f"User {username} is fully connected")
+        if message.startswith(OK):
+            logging.info("User %s is connected, waiting for port 2", username)
 
     def accept_disconnection(self, conn: socket, addr: tuple):
         """ Closes connection with client and send appropriate msg.
@@ -351,6 +1043,12 @@ class Server:
         if conn in self.active_connections:
             username = self.find_username_from_socket(conn)
             self.delete_client_data(username, conn)
+            self.sessions.remove(username)
+            self.rate_limiter.forget(username)
+            self.followers.forget(username)
+            self.watchers.forget(username)
+            if self.cluster is not None:
+                self.cluster.announce()
             message = f"Server closed connection with {username} successfully!"
             logging.info(message)
             send_msg_through_socket(conn, OK)
@@ -360,6 +1058,47 @@ class Server:
             message = "Error: Trying to disconnect before establishing a \
                 connection"
             send_msg_through_socket(conn, message)
+
+    def resume_session(self, username: str, token: str, conn: socket, 
+        addr: tuple):
+        """ Reconnects a client to its detached session.
+
+            Messages which were sent to the client while it was away are
+            delivered to its port2 socket once it's registered.
+
+            Parameters
+            ----------
+            username : str
+                The username of a client
+            token : str
+                The resume token which was given to client on CONNECT
+            conn : socket
+                The socket object of a client
+            addr : tuple
+                Contains client's ip and port
+
+            Returns
+            -------
+            None
+        """
+        self.sessions.expire()
+        if conn in self.active_connections:
+            message = "Error: Attemp to resume a session while connected!"
+        elif self.sessions.resume(username, token):
+            self.clients_port1[username] = (conn, addr)
+            self.active_connections.append(conn)
+            conn.username = username
+            message = OK
+            if self.cluster is not None:
+                self.cluster.announce()
+        elif self.sessions.is_attached(username, token):
+            # The old connection will be noticed as lost soon #
+            message = SESSION_ATTACHED
+        else:
+            message = "Error: Session cannot be resumed"
+        send_msg_through_socket(conn, message)
+        if message == OK:
+            logging.info("User %s resumed the session", username)
     
     def list_users(self, conn: socket, addr: tuple):
         """ Sends to client all currently connected clients' usernames
@@ -377,15 +1116,27 @@ class Server:
         """
         message = ""
         if conn in self.active_connections:
-            for client in self.clients_port1.keys():
+            clients = list(self.clients_port1.keys()) if self.peers is None \
+                else self.sessions.attached()
+            if self.cluster is not None:
+                clients += self.cluster.remote_users()
+            for client in clients:
                 message += client + " "
         else:
             message = "Error: Trying to access list of users before \
                 establishing a connection"
         send_msg_through_socket(conn, message)
 
-    def list_files(self, conn: socket, addr: tuple):
-        """ Sends to client all files in server's directory
+    def list_files(self, conn: socket, addr: tuple, 
+        options: list[str] = ()):
+        """ Sends to client one page of files in server's directory
+            with their metadata, which is taken from the file index.
+
+            The reply is `OK SIZE DATA`, where DATA is the JSON of 
+            `{"files": [{"name", "size", "mtime", "version", 
+            "checksum"}, ...], "next": CURSOR}`, and CURSOR is given as
+            `cursor=CURSOR` to get the next page, or null after the
+            last page.
 
             Parameters
             ----------
@@ -393,22 +1144,196 @@ class Server:
                 The socket object of a client
             addr : tuple
                 Contains client's ip and port
+            options : list[str], optional
+                `key=value` options, see `parse_list_options`
 
             Returns
             -------
             None
         """
         if conn in self.active_connections:
-            directory_items = os.listdir(os.path.join(os.getcwd(), "server"))
-            directory_items = [item for item in directory_items 
-                                    if not item.startswith("__")]
-            message = " ".join(directory_items)
+            try:
+                query = parse_list_options(options)
+            except ValueError as exc:
+                send_msg_through_socket(conn, f"Error: {exc}")
+                return None
+            checksums = query.pop("checksums")
+            files, more = self.file_index.page(**query)
+            entries = []
+            for meta in files:
+                entry = meta.as_dict()
+                if checksums and entry["checksum"] is None:
+                    try:
+                        entry["checksum"] = self.file_index.checksum(
+                            meta.name)
+                    except (OSError, ValueError):
+                        # Files which aren't UTF-8 text have no checksum #
+                        pass
+                entries.append(entry)
+            cursor = encode_cursor(query["sort"], files[-1]) if more \
+                else None
+            data = json.dumps({"files": entries, "next": cursor})
+            message = f"{OK} {len(data)} {data}"
         else:
             message = "Error: Trying to access list of users before \
                 establishing a connection"
         send_msg_through_socket(conn, message)
 
-    def deliver_message(self, username: str, conn: socket, addr: tuple):
+    def search_files(self, conn: socket, addr: tuple, query: str):
+        """ Sends to client lines of server's files which contain all
+            words and quoted phrases of `query`, see `parse_query`.
+
+            The reply is `OK SIZE DATA`, where DATA is the JSON of
+            `{"matches": [{"file", "line", "offset"}, ...], "more":
+            bool, "complete": bool}`: lines are numbered from 1, the
+            offset is the byte where the line starts, `more` tells that
+            the limit cut matches off and `complete` is false while
+            files are being indexed on start.
+
+            Parameters
+            ----------
+            conn : socket
+                The socket object of a client
+            addr : tuple
+                Contains client's ip and port
+            query : str
+                Words, "phrases" and `limit=N`
+
+            Returns
+            -------
+            None
+        """
+        if conn in self.active_connections:
+            try:
+                words, phrases, limit = parse_query(query)
+            except ValueError as exc:
+                send_msg_through_socket(conn, f"Error: {exc}")
+                return None
+            matches, more = self.search_index.search(words, phrases, limit)
+            data = json.dumps({
+                "matches": [{"file": name, "line": number + 1,
+                             "offset": offset}
+                            for name, number, offset in matches],
+                "more": more, "complete": self.search_index.ready.is_set()})
+            message = f"{OK} {len(data)} {data}"
+        else:
+            message = "Error: Trying to search files before \
+                establishing a connection"
+        send_msg_through_socket(conn, message)
+
+    def admin_error(self, conn: socket) -> str | None:
+        """ Returns an error message if `conn` is not of an admin.
+
+            Parameters
+            ----------
+            conn : socket
+                The socket object of a client
+
+            Returns
+            -------
+            str
+                The error message to be sent to client
+            None
+                If the client is a connected admin
+        """
+        if conn not in self.active_connections:
+            return "Error: Trying to use an admin command before \
+                establishing a connection"
+        if self.find_username_from_socket(conn) not in self.admin_users:
+            return "Error: Only admins are allowed to use this command"
+        return None
+
+    def send_stats(self, conn: socket, addr: tuple) -> None:
+        """ Sends statistics of served commands to an admin client.
+
+            The reply is `OK SIZE DATA`, where DATA is the JSON of
+            statistics.
+
+            Parameters
+            ----------
+            conn : socket
+                The socket object of a client
+            addr : tuple
+                Contains client's ip and port
+
+            Returns
+            -------
+            None
+        """
+        message = self.admin_error(conn)
+        if message is None:
+            snapshot = self.stats.snapshot()
+            snapshot["reaped"] = self.reaper.snapshot()
+            snapshot["throttled"] = self.rate_limiter.snapshot()
+            snapshot["storage"] = self.quota.snapshot()
+            snapshot["search"] = self.search_index.snapshot()
+            snapshot["tail"] = self.followers.count()
+            snapshot["watch"] = self.watchers.snapshot()
+            if self.cluster is not None:
+                snapshot["cluster"] = self.cluster.snapshot()
+            if self.replication is not None:
+                snapshot["replication"] = self.replication.snapshot()
+            elif self.replica is not None:
+                snapshot["replication"] = self.replica.snapshot()
+            data = json.dumps(snapshot)
+            message = f"{OK} {len(data)} {data}"
+        send_msg_through_socket(conn, message)
+
+    def start_profiling(self, mode: str, seconds: str, conn: socket, 
+        addr: tuple) -> None:
+        """ Starts profiling server on the request of an admin client.
+
+            The reply is `OK PATH`, where PATH is the file to which the
+            report is written after `seconds`.
+
+            Parameters
+            ----------
+            mode : str
+                "sample" for sampling stacks of client threads or 
+                "cprofile" for profiling every command with cProfile
+            seconds : str
+                Duration of profiling
+            conn : socket
+                The socket object of a client
+            addr : tuple
+                Contains client's ip and port
+
+            Returns
+            -------
+            None
+        """
+        message = self.admin_error(conn)
+        if message is None:
+            try:
+                path = self.profiler.start(mode, float(seconds))
+            except ValueError as exc:
+                message = f"Error: {exc}"
+            else:
+                message = f"{OK} {path}"
+                logging.info("Profiling (%s) for %s s to %s", mode, seconds,
+                             path)
+        send_msg_through_socket(conn, message)
+
+    def handle_profile_signal(self, signum: int, frame) -> None:
+        """ Starts sampling server for `PROFILE_SIGNAL_SECONDS` when 
+            SIGUSR1 is received.
+        """
+        try:
+            path = self.profiler.start("sample", PROFILE_SIGNAL_SECONDS)
+        except ValueError as exc:
+            logging.error("Profiling cannot be started: %s", exc)
+        else:
+            logging.info("Sampling for %s s to %s", PROFILE_SIGNAL_SECONDS,
+                         path)
+
+    def handle_shutdown_signal(self, signum: int, frame) -> None:
+        """ Shuts server down gracefully when SIGTERM is received, in
+            the same way as on KeyboardInterrupt.
+        """
+        raise KeyboardInterrupt
+
+    def deliver_message(self, username: str, conn: socket, addr: tuple,
+        received: str = ""):
         """ Get the sender's message and deliver it to the receiver 
             client with username=`username`
 
@@ -420,12 +1345,18 @@ class Server:
                 The socket object of a sender client
             addr : tuple
                 Contains sender client's ip and port
+            received : str, optional
+                The beginning of message frame, if it was received 
+                together with the command
             
             Returns
             -------
             None
         """
-        message = receive_whole_data(conn, BUF_SIZE)
+        if received:
+            message = receive_remaining_data(conn, self.buf_size, received)
+        else:
+            message = receive_whole_data(conn, self.buf_size)
         sender_conn: socket = conn
         receiver_username = username
         # If both sender and receiver are online #
@@ -439,9 +1370,7 @@ class Server:
                 send_msg_through_socket(sender_conn, error_msg)
                 return None
             try:
-                send_msg_through_socket(receiver_conn, MESSAGE)
-                msg4receiver = f"{len(message)} {message}"
-                send_msg_through_socket(receiver_conn, msg4receiver)
+                self.push_message(receiver_conn, message)
             except Exception as exc:
                 error_msg = f"Error: Lost connection with {receiver_username}"
                 send_msg_through_socket(sender_conn, error_msg)
@@ -449,6 +1378,25 @@ class Server:
                 logging.error(error_msg)
             else:
                 send_msg_through_socket(sender_conn, OK)
+        # If the receiver's port2 is at another worker, the hub pushes #
+        elif sender_conn in self.active_connections and \
+            self.peers is not None and receiver_username != conn.username \
+            and self.peers.push(receiver_username, message):
+            send_msg_through_socket(sender_conn, OK)
+        elif sender_conn in self.active_connections and \
+            receiver_username == conn.username:
+            error_msg = "Error: Sending message to yourself is prohibited."
+            send_msg_through_socket(sender_conn, error_msg)
+        # If the receiver lost connection, keep the message until resume #
+        elif sender_conn in self.active_connections and \
+            self.sessions.queue_message(receiver_username, message):
+            send_msg_through_socket(sender_conn, OK)
+        # If the receiver is at another node, that node delivers it #
+        elif sender_conn in self.active_connections and \
+            self.cluster is not None and \
+            (node := self.cluster.locate(receiver_username)) is not None:
+            reply = self.cluster.forward(node, receiver_username, message)
+            send_msg_through_socket(sender_conn, reply)
         # If the receiver is not online, send appropriate message to sender #
         elif sender_conn in self.active_connections and receiver_username not \
             in self.clients_port2.keys():
@@ -460,27 +1408,131 @@ class Server:
                 before establishing a connection with server"
             send_msg_through_socket(sender_conn, error_msg)
 
-    def accept_connection_to_port2(self, username: str) -> bool:
-        """ Accepts a connection request to `PORT2`, which was sent to
-            `self.redirect_socket`
+    def push_message(self, receiver_conn: socket, message: str) -> None:
+        """ Sends a message to the client's port2 socket.
 
             Parameters
             ----------
-            username : str
-                The username of a client who needs to send conn request
-            
+            receiver_conn : socket
+                The port2 socket object of a receiver client
+            message : str
+                The message which is going to be delivered
+
             Returns
             -------
             None
         """
-        try:
-            # Blocked until client sends connect() #
-            logging.debug("Trying to accept a connection to port 2")
-            client_conn, client_addr = self.redirect_socket.accept()
+        self.push_frame(receiver_conn, MESSAGE, message)
+
+    def push_frame(self, receiver_conn: socket, command: str, 
+        data: str) -> None:
+        """ Sends the frame `command` with `data` to the client's port2
+            socket.
+
+            Parameters
+            ----------
+            receiver_conn : socket
+                The port2 socket object of a receiver client
+            command : str
+                The command of the frame, e.g. MESSAGE
+            data : str
+                The data content of the frame
+
+            Returns
+            -------
+            None
+        """
+        frame = f"{command} {len(data)} {data}"
+        # Frames of different threads and heartbeats mustn't interleave #
+        with receiver_conn.lock:
+            send_msg_through_socket(receiver_conn, frame)
+
+    def push_to_user(self, username: str, command: str, data: str) -> bool:
+        """ Sends the frame `command` with `data` to port2 of `username`,
+            which may be held by another worker. Frames are not queued
+            for users who lost connection.
+
+            Returns
+            -------
+            bool
+                Whether the frame was sent
+        """
+        entry = self.clients_port2.get(username)
+        if entry is not None:
+            try:
+                self.push_frame(entry[0], command, data)
+                return True
+            except OSError:
+                self.delete_client_data(username, entry[0])
+                return False
+        if self.peers is not None:
+            return self.peers.push_frame(username, command, data)
+        return False
+
+    def accept_connections_to_port2(self) -> None:
+        """ Always accepts connection requests to `PORT2`, which are sent
+            to `self.redirect_socket`.
+
+            Every accepted socket is registered in a separate thread, so
+            a slow client doesn't delay the others.
+
+            Returns
+            -------
+            None
+        """
+        while True:
+            try:
+                client_conn, client_addr = self.redirect_socket.accept()
+            except OSError as exc:
+                logging.debug(exc)
+                break
+            self.tune_client_socket(client_conn)
             logging.debug("Accepted connection request to port 2")
-            self.clients_port2[username] = (client_conn, client_addr)
-        except Exception as exc:
+            t = Thread(target=self.register_port2_connection,
+                       args=[MeteredSocket(client_conn), client_addr],
+                       daemon=True)
+            t.start()
+
+    def register_port2_connection(self, conn: socket, addr: tuple) -> None:
+        """ Maps the port2 socket to the client who opened it.
+
+            The client introduces itself with `USERNAME TOKEN` message,
+            where TOKEN is the one received on CONNECT. Messages queued
+            while the client was away are delivered right after that.
+
+            Parameters
+            ----------
+            conn : socket
+                The port2 socket object of a client
+            addr : tuple
+                Contains client's ip and port
+
+            Returns
+            -------
+            None
+        """
+        try:
+            conn.settimeout(self.handshake_timeout)
+            handshake = receive_msg(conn, self.buf_size).split()
+            conn.settimeout(None)
+        except OSError as exc:
             logging.debug(exc)
+            conn.close()
+            return None
+        if len(handshake) != 2 or not self.sessions.is_attached(*handshake):
+            logging.debug("Rejected connection to port 2 from %s", addr)
+            conn.close()
+            return None
+        username = handshake[0]
+        old = self.clients_port2.get(username)
+        self.clients_port2[username] = (conn, addr)
+        if old is not None:
+            old[0].close()
+        if self.peers is not None:
+            self.peers.attach_port2(username)
+        for pending_msg in self.sessions.pop_pending(username):
+            self.push_message(conn, pending_msg)
+        logging.info("User %s is fully connected", username)
     
     def read_file(self, file_name: str, conn: socket, addr: tuple) -> None:
         """ Transfers file `file_name` according to protocol.
@@ -524,6 +1576,330 @@ class Server:
         except Exception as exc:
             send_msg_through_socket(conn, exc.__str__())
     
+    def conditional_read_file(self, file_name: str, version: str, 
+        conn: socket, addr: tuple) -> None:
+        """ Transfers file `file_name` only if its version differs from
+            `version`, which is the version cached by client.
+
+            The reply is `UNCHANGED VERSION` if the cached version is 
+            still current, otherwise `OK VERSION CHECKSUM SIZE DATA` is
+            sent as a single message.
+
+            Parameters
+            ----------
+            file_name : str
+                The name of the requested file
+            version : str
+                The version of the file cached by client, 0 if the 
+                client has no copy
+            conn : socket
+                The socket object of a client
+            addr : tuple
+                Contains client's ip and port
+            
+            Returns
+            -------
+            None
+        """
+        meta = None
+        if not file_name.startswith("__"):
+            meta = self.file_index.get(file_name)
+            if meta is None:
+                # The file might have been put to directory by hand #
+                meta = self.file_index.update(file_name)
+        if meta is None:
+            msg = f"Error: {file_name} is not found in server"
+            send_msg_through_socket(conn, msg)
+            return None
+        if version == str(meta.version):
+            send_msg_through_socket(conn, f"{UNCHANGED} {meta.version}")
+            return None
+        try:
+            with open(os.path.join("server", file_name), "r") as f:
+                file_data = f.read()
+        except UnicodeDecodeError:
+            file_type = file_name.split(".")[-1]
+            error_msg = f"Error: Requested {file_type} file cannot be delivered"
+            send_msg_through_socket(conn, error_msg)
+            return None
+        except Exception as exc:
+            send_msg_through_socket(conn, f"Error: {exc}")
+            return None
+        checksum = content_checksum(file_data)
+        self.file_index.set_checksum(file_name, meta.version, checksum)
+        msg = f"{OK} {meta.version} {checksum} {len(file_data)} {file_data}"
+        send_msg_through_socket(conn, msg)
+
+    def tail_file(self, conn: socket, addr: tuple, args: list[str]) -> None:
+        """ Sends the last lines of a file as `OK SIZE DATA`. `args` are
+            `FILE_NAME [LINES] [follow]`: LINES is the number of lines
+            (default is `TAIL_LINES`) and `follow` pushes data appended
+            to the file later as `TAIL SIZE FILE_NAME DATA` frames to 
+            port2, until UNTAIL or DISCONNECT.
+
+            The caller holds the file lock, so an append of this server
+            is neither missed nor pushed twice between the tail and the
+            first pushed frame.
+
+            Parameters
+            ----------
+            conn : socket
+                The socket object of a client
+            addr : tuple
+                Contains client's ip and port
+            args : list[str]
+                The file name, the number of lines and `follow`
+
+            Returns
+            -------
+            None
+        """
+        follow = bool(args) and args[-1] == "follow"
+        if follow:
+            args = args[:-1]
+        if conn not in self.active_connections:
+            message = "Error: Trying to read a file before establishing \
+                a connection"
+        elif not 1 <= len(args) <= 2 or (len(args) == 2 and 
+                                         not args[1].isdigit()):
+            message = "Error: Usage is TAIL FILE_NAME [LINES] [follow]"
+        elif not 1 <= (count := int(args[1]) if len(args) == 2 
+                       else TAIL_LINES) <= MAX_TAIL_LINES:
+            message = f"Error: Lines must be from 1 to {MAX_TAIL_LINES}"
+        elif self.file_index.get(args[0]) is None:
+            message = f"Error: {args[0]} is not found in server"
+        elif follow and not self.followers.follow(args[0], conn.username):
+            message = "Error: Too many files are followed"
+        else:
+            try:
+                data = read_last_lines(os.path.join("server", args[0]), 
+                                       count)
+            except OSError as exc:
+                self.followers.unfollow(args[0], conn.username)
+                message = f"Error: {args[0]} cannot be read: {exc}"
+            else:
+                message = f"{OK} {len(data)} {data}"
+        send_msg_through_socket(conn, message)
+
+    def untail_file(self, file_name: str, conn: socket, addr: tuple) -> None:
+        """ Stops pushing data appended to `file_name` to the client.
+
+            Parameters
+            ----------
+            file_name : str
+                The name of the followed file
+            conn : socket
+                The socket object of a client
+            addr : tuple
+                Contains client's ip and port
+
+            Returns
+            -------
+            None
+        """
+        if self.followers.unfollow(file_name, conn.username):
+            message = OK
+        else:
+            message = f"Error: {file_name} is not followed"
+        send_msg_through_socket(conn, message)
+
+    def push_appended(self, file_name: str, start: int, end: int) -> None:
+        """ Reads bytes from `start` to `end` of `file_name`, which 
+            were appended to it, and queues them for followers of the 
+            file. They are pushed by a thread of `followers`, so the 
+            file lock isn't held while sending.
+
+            Parameters
+            ----------
+            file_name : str
+                The name of the modified file
+            start : int
+                The size of the file before the append
+            end : int
+                The size of the file after the append
+
+            Returns
+            -------
+            None
+        """
+        followers = self.followers.of(file_name)
+        if not followers:
+            return None
+        try:
+            data = read_range(os.path.join("server", file_name), start, end)
+        except OSError as exc:
+            logging.error("Appended data of %s cannot be read: %s",
+                          file_name, exc)
+            return None
+        # It's pushed after the file lock is released #
+        self.followers.queue(file_name, followers, data)
+
+    def watch_files(self, conn: socket, addr: tuple, 
+        args: list[str]) -> None:
+        """ Lets the client watch changes of files whose names match 
+            the shell pattern in `args` (default is all files). Changes 
+            are pushed to port2 as `WATCH SIZE DATA` frames, see 
+            `watch.py`, until UNWATCH or DISCONNECT.
+
+            Parameters
+            ----------
+            conn : socket
+                The socket object of a client
+            addr : tuple
+                Contains client's ip and port
+            args : list[str]
+                The pattern, if given
+
+            Returns
+            -------
+            None
+        """
+        if conn not in self.active_connections:
+            message = "Error: Trying to watch files before establishing \
+                a connection"
+        elif len(args) > 1:
+            message = "Error: Usage is WATCH [PATTERN]"
+        elif not self.watchers.watch(conn.username, 
+                                     args[0] if args else "*"):
+            message = "Error: Too many patterns are watched"
+        else:
+            message = OK
+        send_msg_through_socket(conn, message)
+
+    def unwatch_files(self, conn: socket, addr: tuple, 
+        args: list[str]) -> None:
+        """ Stops the client watching the pattern in `args`, or all
+            its patterns if none is given.
+
+            Parameters
+            ----------
+            conn : socket
+                The socket object of a client
+            addr : tuple
+                Contains client's ip and port
+            args : list[str]
+                The pattern, if given
+
+            Returns
+            -------
+            None
+        """
+        if len(args) > 1:
+            message = "Error: Usage is UNWATCH [PATTERN]"
+        elif self.watchers.unwatch(conn.username, 
+                                   args[0] if args else None):
+            message = OK
+        else:
+            message = "Error: Nothing is watched"
+        send_msg_through_socket(conn, message)
+
+    def file_changed(self, file_name: str, username: str | None = None,
+        replace: bool = False) -> None:
+        """ Is called after `file_name` was modified by a client.
+
+            Parameters
+            ----------
+            file_name : str
+                The name of the modified file
+            username : str | None, optional
+                The user who modified the file, None for nobody
+            replace : bool, optional
+                Whether the file was written from scratch, otherwise
+                data was appended to it
+
+            Returns
+            -------
+            None
+        """
+        old = self.file_index.get(file_name)
+        self.file_updated(file_name, username, replace)
+        if self.peers is not None:
+            self.peers.file_changed(file_name, username, replace)
+        if self.replication is not None:
+            # Appended data starts at the old end of the file #
+            offset = 0 if replace or old is None else old.size
+            self.replication.record(file_name, offset, 
+                                    replace or old is None)
+
+    def file_updated(self, file_name: str, username: str | None = None,
+        replace: bool = False) -> None:
+        """ Updates metadata, usage and words of `file_name` which was 
+            modified by this worker or, when `peers` is set, by another 
+            one.
+
+            Parameters are the ones of `file_changed`.
+
+            Returns
+            -------
+            None
+        """
+        old = self.file_index.get(file_name)
+        meta = self.file_index.update(file_name)
+        self.search_index.update(file_name, replace or old is None)
+        if meta is not None and not replace and old is not None and \
+                meta.size > old.size:
+            self.push_appended(file_name, old.size, meta.size)
+        if meta is None:
+            if old is not None:
+                self.watchers.notify(file_name, "deleted", None)
+        else:
+            kind = "created" if old is None else \
+                "overwritten" if replace else "appended"
+            self.watchers.notify(file_name, kind, meta)
+        if meta is not None:
+            # Usage changes by the difference, nothing is rescanned #
+            added = meta.size if replace or old is None \
+                else meta.size - old.size
+            self.quota.record(username or NOBODY, file_name, added, 
+                              replace or old is None)
+
+    def receive_upload(self, file_name: str, conn: socket, replace: bool,
+        extra: int = 0) -> str | None:
+        """ Receives data written to `file_name`, if it fits quotas of
+            the user and server.
+
+            The size announced by client is checked before the data is
+            received, data of a refused transfer is dropped. As UTF-8 
+            characters may take more bytes, the received data is checked
+            again before it's written.
+
+            Parameters
+            ----------
+            file_name : str
+                The name of the modified file
+            conn : socket
+                The socket object of a client
+            replace : bool
+                Whether the data replaces the file or is appended to it
+            extra : int, optional
+                Bytes which are written besides the data
+
+            Returns
+            -------
+            str
+                The received data
+            None
+                If the data doesn't fit quotas, an error was sent
+        """
+        if not self.quota.enabled:
+            return receive_whole_data(conn, self.buf_size)
+        username = conn.username or NOBODY
+        received = receive_msg(conn, self.buf_size)
+        size, _, data = received.partition(" ")
+        announced = int(size) if size.isdigit() else len(received)
+        message = self.quota.error(username, file_name, announced + extra,
+                                   replace)
+        if message is None:
+            data = receive_remaining_data(conn, self.buf_size, received)
+            message = self.quota.error(username, file_name, 
+                                       len(data.encode()) + extra, replace)
+        else:
+            skip_remaining_data(conn, self.buf_size, received)
+        if message is not None:
+            send_msg_through_socket(conn, message)
+            return None
+        return data
+
     def receive_and_save_file(self, file_name: str, client_sock: socket):
         """ Receives the file content from client and saves that file 
             content to server.
@@ -540,12 +1916,15 @@ class Server:
             None
         """
         try:
-            file_content = receive_whole_data(client_sock, BUF_SIZE)
+            file_content = self.receive_upload(file_name, client_sock, True)
+            if file_content is None:
+                return None
             with open(os.path.join("server", file_name), "w") as f:
                 f.write(file_content)
         except Exception as exc:
             send_msg_through_socket(client_sock, f"Error: {exc.__str__()}")
         else:
+            self.file_changed(file_name, client_sock.username, replace=True)
             send_msg_through_socket(client_sock, OK)
         
     def write_file(self, file_name: str, conn: socket, addr: tuple):
@@ -636,7 +2015,10 @@ class Server:
             send_msg_through_socket(conn, error_msg)
         else:
             send_msg_through_socket(conn, OK)
-            new_content = receive_whole_data(conn, BUF_SIZE)
+            # A new line is written after the content #
+            new_content = self.receive_upload(file_name, conn, False, 1)
+            if new_content is None:
+                return None
             try:
                 with open(os.path.join("server", file_name), "a") as f:
                     f.write(f"{new_content}\n")
@@ -644,6 +2026,7 @@ class Server:
                 error_msg = f"Error: {exc}"
                 send_msg_through_socket(conn, error_msg)
             else:
+                self.file_changed(file_name, conn.username)
                 send_msg_through_socket(conn, OK)
 
     def overread_file(self, file_name: str, conn: socket, addr: tuple):
@@ -693,7 +2076,9 @@ class Server:
             send_msg_through_socket(conn, error_msg)
         else:
             send_msg_through_socket(conn, OK)
-            client_fcontent = receive_whole_data(conn, BUF_SIZE)
+            client_fcontent = self.receive_upload(server_fname, conn, False)
+            if client_fcontent is None:
+                return None
             try:
                 with open(os.path.join("server", server_fname), "a") as f:
                     f.write(client_fcontent)
@@ -701,6 +2086,7 @@ class Server:
                 error_msg = f"Error: {exc}"
                 send_msg_through_socket(conn, error_msg)
             else:
+                self.file_changed(server_fname, conn.username)
                 send_msg_through_socket(conn, OK)
 
     def start(self):
@@ -709,18 +2095,164 @@ class Server:
             Server's main job: always waiting connection request at 
             `PORT1`
         """
+        # Log messages are written by a background thread from now on #
+        configure_logging(logging.INFO)
+        start_logging()
+        self.access_log.start()
+        t = Thread(target=self.accept_connections_to_port2, daemon=True)
+        t.start()
+        self.start_metrics_server()
+        self.reaper.start()
+        self.search_index.start()
+        self.watchers.start()
+        self.followers.start()
+        if self.cluster is not None:
+            self.cluster.start()
+        if self.replication is not None:
+            self.replication.start()
+        if self.replica is not None:
+            self.replica.start()
+        try:
+            signal.signal(signal.SIGTERM, self.handle_shutdown_signal)
+            if hasattr(signal, "SIGUSR1"):
+                signal.signal(signal.SIGUSR1, self.handle_profile_signal)
+        except ValueError:
+            # Signals can be handled only in the main thread #
+            logging.debug("SIGTERM and SIGUSR1 are not handled")
         try:
             while True:
                 logging.info("Waiting for a new connection...")
+                # Connections over `max_workers` wait in the backlog #
+                self.workers.acquire()
                 conn, addr = self.com_socket.accept()
                 logging.debug(addr)
-                t = Thread(target=self.communicate_with_client, args=[conn, addr])
+                self.tune_client_socket(conn)
+                conn = MeteredSocket(conn)
+                t = Thread(target=self.serve_client, args=[conn, addr],
+                           name=f"{CLIENT_THREAD_PREFIX}{addr[0]}:{addr[1]}")
+                self.serving[conn] = t
                 t.start()
         except KeyboardInterrupt:
             logging.info("Server is shutting down...")
+            self.drain()
         except Exception as exc:
-            logging.error(f"{exc}")
+            logging.error("%s", exc)
         finally:
+            self.close_listeners()
+            # Waiting changes are pushed before clients are disconnected #
+            self.watchers.stop()
+            self.followers.stop()
             self.disconnect_clients()
-            if self.com_socket:
-                self.com_socket.close()
+            self.reaper.stop()
+            if self.cluster is not None:
+                self.cluster.stop()
+            if self.replication is not None:
+                self.replication.stop()
+            if self.replica is not None:
+                self.replica.stop()
+            self.profiler.stop()
+            if self.metrics_server:
+                self.metrics_server.shutdown()
+                self.metrics_server.server_close()
+            self.dump_stats()
+            self.quota.save(force=True)
+            self.access_log.close()
+            stop_logging()
+
+    def drain(self) -> None:
+        """ Stops accepting clients and lets served commands finish.
+
+            Clients are told about shutdown at port2. Idle clients are
+            disconnected at once, the others after their command was
+            served. Commands which are still served after 
+            `drain_timeout` seconds are aborted. Another SIGINT or 
+            SIGTERM aborts them at once.
+
+            Returns
+            -------
+            None
+        """
+        self.draining = True
+        deadline = time.monotonic() + self.drain_timeout
+        self.rate_limiter.close()
+        try:
+            self.close_listeners()
+            self.notify_shutdown()
+            for conn in list(self.serving):
+                if not conn.busy:
+                    # Wakes up the thread which waits for a command #
+                    try:
+                        conn.shutdown(SHUT_RD)
+                    except OSError:
+                        pass
+            for conn, t in list(self.serving.items()):
+                t.join(max(0.0, deadline - time.monotonic()))
+        except KeyboardInterrupt:
+            logging.warning("Draining was interrupted")
+        left = len(self.serving)
+        if left:
+            logging.warning("%d clients were still served after %s s, they "
+                            "are aborted", left, self.drain_timeout)
+        else:
+            logging.info("All served commands have finished")
+
+    def notify_shutdown(self) -> None:
+        """ Tells clients at port2 that server is shutting down with a
+            `SHUTDOWN SIZE SECONDS` frame. The frame isn't sent to 
+            clients which don't read their port2, so they don't delay
+            shutdown.
+
+            Returns
+            -------
+            None
+        """
+        seconds = str(self.drain_timeout)
+        frame = f"{SHUTDOWN} {len(seconds)} {seconds}".encode()
+        for conn, _ in list(self.clients_port2.values()):
+            try:
+                with conn.lock:
+                    conn.send(frame, MSG_DONTWAIT)
+            except OSError as exc:
+                logging.debug(exc)
+
+    def close_listeners(self) -> None:
+        """ Stops accepting connections at both ports, waking up the
+            threads which wait in `accept`.
+
+            Returns
+            -------
+            None
+        """
+        for listener in (self.com_socket, self.redirect_socket):
+            if listener is None:
+                continue
+            try:
+                listener.shutdown(SHUT_RDWR)
+            except OSError:
+                pass
+            listener.close()
+
+    def start_metrics_server(self) -> None:
+        """ Starts serving Prometheus metrics at `metrics_ip` and 
+            `metrics_port`, if the port is given.
+        """
+        if self.metrics_port is None:
+            return None
+        try:
+            self.metrics_server = MetricsServer(self, self.metrics_ip, 
+                                                self.metrics_port)
+        except OSError as exc:
+            logging.error("Metrics cannot be served: %s", exc)
+            return None
+        self.metrics_server.start()
+        logging.info("Serving metrics at http://%s:%d/metrics",
+                     self.metrics_ip, self.metrics_port)
+
+    def dump_stats(self) -> None:
+        """ Saves statistics of served commands to `stats_file`.
+        """
+        try:
+            self.stats.dump(self.stats_file)
+            logging.info("Statistics were saved to %s", self.stats_file)
+        except OSError as exc:
+            logging.error("Statistics cannot be saved: %s", exc)
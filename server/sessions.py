@@ -0,0 +1,216 @@
+""" The module keeps track of clients' sessions, so that a client which
+    lost its connection can resume its session instead of connecting
+    from scratch.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    time, secrets, threading, collections
+
+    Classes
+    -------
+    Class Session:
+        Holds the resume token and the undelivered messages of a client
+    Class SessionManager:
+        Creates, detaches, resumes and expires sessions of clients
+"""
+
+import time
+import secrets
+from threading import Lock
+from collections import deque
+
+
+class Session:
+    """ Holds the resume token and the undelivered messages of a client.
+
+        Attributes
+        ----------
+        username : str
+            The username of the session owner
+        token : str
+            The secret token which must be presented to resume session
+        detached_at : float | None
+            Time when the client lost its connection, None when the
+            client is online
+        pending : deque[str]
+            Messages delivered to the client while it was detached
+    """
+    def __init__(self, username: str, token: str, max_pending: int):
+        self.username = username
+        self.token = token
+        self.detached_at: float | None = None
+        self.pending: deque[str] = deque(maxlen=max_pending)
+
+
+class SessionManager:
+    """ Creates, detaches, resumes and expires sessions of clients.
+
+        Attributes
+        ----------
+        resume_window : float
+            Seconds during which a detached session can be resumed
+        max_pending : int
+            Maximum number of messages kept for a detached session
+        sessions : dict[str, Session]
+            Sessions of clients by their usernames
+        lock : Lock
+            The lock which protects `sessions`
+
+        Methods
+        -------
+        create_if_new(self, username: str)
+            Creates a session only if `username` has none
+        detach(self, username: str)
+            Marks the session of `username` as detached
+        resume(self, username: str, token: str)
+            Attaches the detached session back, if `token` is valid
+        is_attached(self, username: str, token: str)
+            Checks whether `token` belongs to the online `username`
+        exists(self, username: str)
+            Checks whether `username` has a session, online or detached
+        queue_message(self, username: str, message: str)
+            Keeps a message for a detached session
+        pop_pending(self, username: str)
+            Returns and forgets the queued messages of `username`
+        pending_count(self)
+            Returns the number of messages queued for all sessions
+        attached(self)
+            Returns usernames of online sessions
+        states(self)
+            Returns whether sessions are online by usernames
+        remove(self, username: str)
+            Forgets the session of `username`
+        expire(self)
+            Forgets detached sessions older than `resume_window`
+    """
+    def __init__(self, resume_window: float, max_pending: int):
+        self.resume_window = resume_window
+        self.max_pending = max_pending
+        self.sessions: dict[str, Session] = {}
+        self.lock = Lock()
+
+    def create_if_new(self, username: str) -> str | None:
+        """ Creates a session only if `username` has no session, online
+            or detached, and returns its resume token, otherwise None.
+        """
+        token = secrets.token_hex(16)
+        with self.lock:
+            if username in self.sessions:
+                return None
+            self.sessions[username] = Session(username, token,
+                                              self.max_pending)
+        return token
+
+    def detach(self, username: str) -> None:
+        """ Marks the session of `username` as detached.
+        """
+        with self.lock:
+            session = self.sessions.get(username)
+            if session and session.detached_at is None:
+                session.detached_at = time.monotonic()
+
+    def resume(self, username: str, token: str) -> bool:
+        """ Attaches the detached session back, if `token` is valid.
+
+            Returns
+            -------
+            bool
+                True if the session was resumed, otherwise False
+        """
+        with self.lock:
+            session = self.sessions.get(username)
+            if session is None or session.detached_at is None:
+                return False
+            if not secrets.compare_digest(session.token, token):
+                return False
+            session.detached_at = None
+            return True
+
+    def is_attached(self, username: str, token: str) -> bool:
+        """ Checks whether `token` belongs to the online `username`.
+        """
+        with self.lock:
+            session = self.sessions.get(username)
+            return session is not None and session.detached_at is None \
+                and secrets.compare_digest(session.token, token)
+
+    def exists(self, username: str) -> bool:
+        """ Checks whether `username` has a session, online or 
+            detached.
+        """
+        with self.lock:
+            return username in self.sessions
+
+    def queue_message(self, username: str, message: str) -> bool:
+        """ Keeps a message for a detached session.
+
+            Returns
+            -------
+            bool
+                True if the message was queued, False if there is no
+                detached session of `username`
+        """
+        with self.lock:
+            session = self.sessions.get(username)
+            if session is None or session.detached_at is None:
+                return False
+            session.pending.append(message)
+            return True
+
+    def pop_pending(self, username: str) -> list[str]:
+        """ Returns and forgets the queued messages of `username`.
+        """
+        with self.lock:
+            session = self.sessions.get(username)
+            if session is None:
+                return []
+            messages = list(session.pending)
+            session.pending.clear()
+            return messages
+
+    def pending_count(self) -> int:
+        """ Returns the number of messages queued for all sessions.
+        """
+        with self.lock:
+            return sum(len(session.pending)
+                       for session in self.sessions.values())
+
+    def attached(self) -> list[str]:
+        """ Returns usernames of online sessions.
+        """
+        with self.lock:
+            return [username for username, session in self.sessions.items()
+                    if session.detached_at is None]
+
+    def states(self) -> dict[str, bool]:
+        """ Returns whether sessions are online (not detached) by 
+            usernames.
+        """
+        with self.lock:
+            return {username: session.detached_at is None
+                    for username, session in self.sessions.items()}
+
+    def remove(self, username: str) -> None:
+        """ Forgets the session of `username`.
+        """
+        with self.lock:
+            self.sessions.pop(username, None)
+
+    def expire(self) -> list[str]:
+        """ Forgets detached sessions older than `resume_window`.
+
+            Returns
+            -------
+            list[str]
+                Usernames of expired sessions
+        """
+        now = time.monotonic()
+        with self.lock:
+            expired = [username for username, session in self.sessions.items()
+                       if session.detached_at is not None and
+                       now - session.detached_at > self.resume_window]
+            for username in expired:
+                del self.sessions[username]
+        return expired
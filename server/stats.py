@@ -0,0 +1,299 @@
+""" The module collects statistics of commands served by server: counts,
+    bytes received and sent, errors and latency histograms.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    os, json, time, threading, socket
+
+    Classes
+    -------
+    Class Histogram:
+        Log-linear histogram of latencies in microseconds, in the
+        manner of HDR histograms
+    Class CommandStats:
+        Counters and the latency histogram of one command
+    Class StatsRegistry:
+        Statistics of all commands served by server
+    Class MeteredSocket:
+        Wraps a socket and counts the bytes and error replies passing
+        through it
+"""
+
+import os
+import json
+import time
+from threading import Lock
+from socket import socket
+
+SUB_BUCKET_BITS = 5   # 16 buckets per power of 2, error is below 6.25%
+HALF_SUB_BUCKETS = 1 << (SUB_BUCKET_BITS - 1)
+MAX_BUCKETS = 64 * HALF_SUB_BUCKETS  # Covers values up to 2**64
+ERROR_PREFIX = b"Error:"
+
+
+class Histogram:
+    """ Log-linear histogram of latencies in microseconds, in the manner
+        of HDR histograms.
+
+        Values below 2**`SUB_BUCKET_BITS` have their own buckets, larger
+        values are put to one of `HALF_SUB_BUCKETS` buckets of their
+        power of 2. So recording costs a few integer operations and the
+        relative error of percentiles stays below 1/`HALF_SUB_BUCKETS`.
+
+        Attributes
+        ----------
+        counts : list[int]
+            Number of recorded values in each bucket
+        count : int
+            Number of recorded values
+        total : int
+            Sum of recorded values
+        max : int
+            The largest recorded value
+
+        Methods
+        -------
+        bucket_index(value: int)
+            Returns the index of the bucket which holds `value`
+        bucket_lower_bound(index: int)
+            Returns the smallest value of the bucket `index`
+        record(self, value: int)
+            Records one value
+        percentile(self, p: float)
+            Returns the value below which `p` percent of values are
+        snapshot(self)
+            Returns the summary of the histogram as a dictionary
+    """
+    def __init__(self):
+        self.counts = [0] * MAX_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @staticmethod
+    def bucket_index(value: int) -> int:
+        """ Returns the index of the bucket which holds `value`.
+        """
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+        return shift * HALF_SUB_BUCKETS + (value >> shift)
+
+    @staticmethod
+    def bucket_lower_bound(index: int) -> int:
+        """ Returns the smallest value of the bucket `index`.
+        """
+        if index < 2 * HALF_SUB_BUCKETS:
+            return index
+        shift = index // HALF_SUB_BUCKETS - 1
+        return (index - shift * HALF_SUB_BUCKETS) << shift
+
+    def record(self, value: int) -> None:
+        """ Records one value, negative values are taken as 0.
+        """
+        if value < 0:
+            value = 0
+        # `bucket_index` is inlined, as it's called for every command #
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        if shift <= 0:
+            self.counts[value] += 1
+        else:
+            self.counts[shift * HALF_SUB_BUCKETS + (value >> shift)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> int:
+        """ Returns the value below which `p` percent of values are,
+            the result is the lower bound of its bucket.
+        """
+        if self.count == 0:
+            return 0
+        rank = max(1, round(p / 100 * self.count))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self.bucket_lower_bound(index), self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        """ Returns the summary of the histogram as a dictionary.
+        """
+        return {
+            "count": self.count,
+            "mean_us": round(self.total / self.count) if self.count else 0,
+            "p50_us": self.percentile(50),
+            "p90_us": self.percentile(90),
+            "p99_us": self.percentile(99),
+            "p999_us": self.percentile(99.9),
+            "max_us": self.max,
+        }
+
+
+class CommandStats:
+    """ Counters and the latency histogram of one command.
+
+        Attributes
+        ----------
+        count : int
+            How many times the command was served
+        errors : int
+            How many times server replied with an error
+        bytes_in : int
+            Bytes received from clients while serving the command
+        bytes_out : int
+            Bytes sent to clients while serving the command
+        latency : Histogram
+            Time of serving the command in microseconds
+        lock : Lock
+            The lock which protects the counters
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.count = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency = Histogram()
+
+
+class StatsRegistry:
+    """ Statistics of all commands served by server.
+
+        Attributes
+        ----------
+        commands : dict[str, CommandStats]
+            Statistics by the names of commands
+        started_at : float
+            Time when the registry was created
+        lock : Lock
+            The lock which protects adding new commands to `commands`
+
+        Methods
+        -------
+        record(self, command: str, latency_ns: int, bytes_in: int,
+            bytes_out: int, errors: int)
+            Records that `command` was served
+        items(self)
+            Returns (command, CommandStats) pairs sorted by commands
+        snapshot(self)
+            Returns all statistics as a dictionary
+        dump(self, path: str)
+            Saves statistics to `path` as JSON
+    """
+    def __init__(self):
+        self.commands: dict[str, CommandStats] = {}
+        self.started_at = time.time()
+        self.lock = Lock()
+
+    def record(self, command: str, latency_ns: int, bytes_in: int,
+               bytes_out: int, errors: int) -> None:
+        """ Records that `command` was served in `latency_ns`
+            nanoseconds.
+        """
+        stats = self.commands.get(command)
+        if stats is None:
+            with self.lock:
+                stats = self.commands.setdefault(command, CommandStats())
+        with stats.lock:
+            stats.count += 1
+            stats.errors += errors
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+            stats.latency.record(latency_ns // 1000)
+
+    def items(self) -> list[tuple[str, CommandStats]]:
+        """ Returns (command, CommandStats) pairs sorted by commands.
+        """
+        with self.lock:
+            return sorted(self.commands.items())
+
+    def snapshot(self) -> dict:
+        """ Returns all statistics as a dictionary, which can be
+            serialized to JSON.
+        """
+        commands = {}
+        for name, stats in self.items():
+            with stats.lock:
+                commands[name] = {
+                    "count": stats.count,
+                    "errors": stats.errors,
+                    "bytes_in": stats.bytes_in,
+                    "bytes_out": stats.bytes_out,
+                    "latency": stats.latency.snapshot(),
+                }
+        uptime = time.time() - self.started_at
+        return {"uptime_s": round(uptime, 3), "commands": commands}
+
+    def dump(self, path: str) -> None:
+        """ Saves statistics to `path` as JSON.
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+class MeteredSocket:
+    """ Wraps a socket and counts the bytes and error replies passing
+        through it. All other attributes are taken from the socket.
+
+        Attributes
+        ----------
+        sock : socket
+            The wrapped socket
+        bytes_in : int
+            Bytes received from the socket
+        bytes_out : int
+            Bytes sent to the socket
+        errors : int
+            Number of sent messages which start with "Error:"
+        username : str | None
+            The username of the client, once it's connected
+        last_activity : float
+            Monotonic time of the last command or PONG of the client,
+            it's updated by server, not by every `recv`
+        lock : Lock
+            Serializes frames pushed to the socket by different threads
+        busy : bool
+            Whether a command received from the socket is being served
+    """
+    def __init__(self, sock: socket):
+        self.sock = sock
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.errors = 0
+        self.username: str | None = None
+        self.last_activity = time.monotonic()
+        self.lock = Lock()
+        self.busy = False
+
+    def __getattr__(self, name: str):
+        return getattr(self.sock, name)
+
+    def recv(self, buffer_size: int, *args) -> bytes:
+        data = self.sock.recv(buffer_size, *args)
+        self.bytes_in += len(data)
+        return data
+
+    def recv_into(self, buffer, *args) -> int:
+        received = self.sock.recv_into(buffer, *args)
+        self.bytes_in += received
+        return received
+
+    def sendall(self, data: bytes, *args) -> None:
+        self.sock.sendall(data, *args)
+        self.bytes_out += len(data)
+        if data.startswith(ERROR_PREFIX):
+            self.errors += 1
+
+    def send(self, data: bytes, *args) -> int:
+        sent = self.sock.send(data, *args)
+        self.bytes_out += sent
+        if data.startswith(ERROR_PREFIX):
+            self.errors += 1
+        return sent
@@ -0,0 +1,265 @@
+""" The module serves TAIL: the last lines of a file and, in follow mode,
+    data appended to the file afterwards.
+
+    The last lines are found by reading blocks from the end of the file
+    until enough newlines were seen, so a large log costs as much as
+    its tail. Followers of a file get every APPEND and APPENDFILE
+    through their port2 as a `TAIL SIZE FILE_NAME DATA` frame, which
+    carries only the appended bytes. Appends of other worker processes
+    and of the primary of a replica are pushed too, as they update the
+    file index of this server. A file which is written from scratch
+    isn't pushed, followers keep getting data appended to it later.
+
+    Appended data is read under the file lock, so it's exactly what was
+    appended, but it's pushed by a separate thread after the lock was
+    released: a follower which reads its port2 slowly delays other
+    followers, never writers. While more than `MAX_PENDING_BYTES` wait
+    to be pushed, further appends are not pushed to followers.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    os, logging, threading, collections
+
+    Used custom modules
+    -------------------
+    protocol
+
+    Functions
+    ---------
+    read_last_lines(path: str, count: int) -> str
+        Returns the last `count` lines of the file `path`
+    read_range(path: str, start: int, end: int) -> str
+        Returns bytes from `start` to `end` of the file `path`
+
+    Classes
+    -------
+    Class Followers:
+        Users who follow appends to files
+"""
+
+import os
+import logging
+import threading
+from collections import Counter, deque
+
+from protocol import TAIL
+
+TAIL_LINES = 10          # Lines returned by TAIL without a count
+MAX_TAIL_LINES = 10000   # The largest count of lines of TAIL
+TAIL_BLOCK = 64 * 1024   # Bytes read at once from the end of a file
+MAX_FOLLOWED = 64        # Files followed by one user at the same time
+MAX_PENDING_BYTES = 16 * 1024 * 1024  # Appended data waiting to be pushed
+STOP_TIMEOUT = 5.0       # Seconds to push waiting data when stopping
+
+
+def read_last_lines(path: str, count: int) -> str:
+    """ Returns the last `count` lines of the file `path`, reading it
+        backwards by `TAIL_BLOCK` bytes. A newline which ends the file
+        doesn't start another line.
+
+        Raises
+        ------
+        OSError
+            If the file cannot be read
+    """
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        position, blocks, newlines = end, [], 0
+        while position > 0 and newlines < count:
+            size = min(TAIL_BLOCK, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size)
+            # The last byte of the file ends a line, it doesn't start one #
+            newlines += block.count(b"\n", 0, size - 1) \
+                if position + size == end else block.count(b"\n")
+            blocks.append(block)
+    data = b"".join(reversed(blocks))
+    index = len(data) - 1 if data.endswith(b"\n") else len(data)
+    for _ in range(count):
+        index = data.rfind(b"\n", 0, index)
+        if index < 0:
+            break
+    # Lines start after a newline, so no character is cut #
+    return data[index + 1:].decode(errors="replace")
+
+
+def read_range(path: str, start: int, end: int) -> str:
+    """ Returns bytes from `start` to `end` of the file `path`.
+
+        Raises
+        ------
+        OSError
+            If the file cannot be read
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start).decode(errors="replace")
+
+
+class Followers:
+    """ Users who follow appends to files.
+
+        Attributes
+        ----------
+        push : Callable[[str, str, str], bool]
+            Sends a frame (username, command, data) to port2 of a user
+        files : dict[str, set[str]]
+            Usernames of followers by names of files
+        lock : Lock
+            The lock which protects `files`
+        pending : deque[tuple[list[str], str]]
+            Followers and TAIL frames waiting to be pushed
+        pending_bytes : int
+            Characters of `pending` frames
+        counts : Counter
+            Pushed, lost and dropped frames
+        condition : Condition
+            Protects `pending` and wakes the pushing thread
+        stopped : bool
+            Whether the pushing thread was stopped
+        thread : Thread | None
+            The thread which pushes appended data
+
+        Methods
+        -------
+        start(self)
+            Starts the pushing thread
+        stop(self)
+            Pushes waiting data and stops the thread
+        follow(self, file_name: str, username: str)
+            Lets `username` follow `file_name`
+        unfollow(self, file_name: str, username: str)
+            Stops `username` following `file_name`
+        forget(self, username: str)
+            Stops `username` following any file
+        of(self, file_name: str)
+            Returns followers of `file_name`
+        queue(self, file_name: str, followers: list[str], data: str)
+            Lets data appended to `file_name` be pushed to followers
+        run(self)
+            Pushes waiting data until stopped
+        count(self)
+            Returns the number of followed files and follows
+    """
+    def __init__(self, push):
+        self.push = push
+        self.files: dict[str, set[str]] = {}
+        self.lock = threading.Lock()
+        self.pending: deque[tuple[list[str], str]] = deque()
+        self.pending_bytes = 0
+        self.counts = Counter()
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """ Starts the thread which pushes appended data.
+        """
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name="tail",
+                                       daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """ Pushes waiting data and stops the thread, a follower which
+            doesn't read it is given up after `STOP_TIMEOUT` seconds.
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(STOP_TIMEOUT)
+            self.thread = None
+
+    def follow(self, file_name: str, username: str) -> bool:
+        """ Lets `username` follow `file_name`, returns False if the
+            user follows `MAX_FOLLOWED` other files already.
+        """
+        with self.lock:
+            followed = sum(username in users
+                           for users in self.files.values())
+            users = self.files.setdefault(file_name, set())
+            if username not in users and followed >= MAX_FOLLOWED:
+                if not users:
+                    del self.files[file_name]
+                return False
+            users.add(username)
+            return True
+
+    def unfollow(self, file_name: str, username: str) -> bool:
+        """ Stops `username` following `file_name`, returns False if it
+            didn't follow it.
+        """
+        with self.lock:
+            users = self.files.get(file_name)
+            if users is None or username not in users:
+                return False
+            users.discard(username)
+            if not users:
+                del self.files[file_name]
+            return True
+
+    def forget(self, username: str) -> None:
+        """ Stops `username` following any file.
+        """
+        with self.lock:
+            for file_name in list(self.files):
+                self.files[file_name].discard(username)
+                if not self.files[file_name]:
+                    del self.files[file_name]
+
+    def of(self, file_name: str) -> list[str]:
+        """ Returns usernames of followers of `file_name`.
+        """
+        with self.lock:
+            return list(self.files.get(file_name, ()))
+
+    def queue(self, file_name: str, followers: list[str], data: str) -> None:
+        """ Lets `data` appended to `file_name` be pushed to `followers`
+            by the pushing thread, unless `MAX_PENDING_BYTES` wait
+            already.
+        """
+        frame = f"{file_name} {data}"
+        with self.condition:
+            if self.pending_bytes + len(frame) > MAX_PENDING_BYTES:
+                self.counts["dropped"] += len(followers)
+                return None
+            self.pending.append((followers, frame))
+            self.pending_bytes += len(frame)
+            self.condition.notify()
+
+    def run(self) -> None:
+        """ Pushes waiting data in the order it was appended, until
+            stopped.
+        """
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.pending or self.stopped)
+                if not self.pending:
+                    return None
+                followers, frame = self.pending.popleft()
+                self.pending_bytes -= len(frame)
+            for username in followers:
+                try:
+                    pushed = self.push(username, TAIL, frame)
+                except Exception as exc:
+                    logging.error("Appended data cannot be pushed to %s: "
+                                  "%s", username, exc)
+                    pushed = False
+                with self.condition:
+                    self.counts["pushed" if pushed else "lost"] += 1
+
+    def count(self) -> dict:
+        """ Returns the number of followed files, of follows and of
+            pushed, lost and dropped frames.
+        """
+        with self.lock:
+            state = {"files": len(self.files),
+                     "follows": sum(map(len, self.files.values()))}
+        with self.condition:
+            state.update(self.counts, pending_bytes=self.pending_bytes)
+        return state
@@ -0,0 +1,240 @@
+""" The module pushes changes of server's files to users who WATCH them,
+    so caches and mirrors of clients stay fresh without polling LF and
+    OVERREAD.
+
+    A user watches files whose names match shell patterns. Every change
+    of a watched file becomes an event with its kind (`created`,
+    `overwritten`, `appended` or `deleted`), the new size and version.
+    Events are not pushed one by one: a burst of changes within `delay`
+    seconds is coalesced to one event per file, e.g. a hundred appends
+    to a log are pushed as one `appended` event with the final size,
+    and all events of a user go in one `WATCH SIZE DATA` frame to its
+    port2, where DATA is a JSON list of events.
+
+    Changes made by other worker processes and by the primary of a
+    replica are pushed too, as they update the file index of this
+    server. Events aren't kept for users who lost connection, they
+    should list files again after resuming.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    json, logging, threading, fnmatch, collections
+
+    Used custom modules
+    -------------------
+    protocol, file_index
+
+    Functions
+    ---------
+    merge_kinds(old: str, new: str) -> str
+        Returns the kind of two coalesced events of one file
+
+    Classes
+    -------
+    Class Watchers:
+        Patterns watched by users and events waiting to be pushed
+"""
+
+import json
+import logging
+import threading
+from fnmatch import fnmatchcase
+from collections import Counter
+
+from protocol import WATCH
+from .file_index import FileMeta
+
+COALESCE_DELAY = 0.2  # Seconds during which events of a burst are coalesced
+MAX_WATCHES = 64      # Patterns watched by one user at the same time
+
+
+def merge_kinds(old: str, new: str) -> str:
+    """ Returns the kind of two events of one file which are coalesced,
+        `old` happened before `new`.
+    """
+    if new == "deleted":
+        return "deleted"
+    if old == "created":
+        return "created"
+    # A file which was deleted and created again was overwritten #
+    if "overwritten" in (old, new) or old == "deleted" or new == "created":
+        return "overwritten"
+    return "appended"
+
+
+class Watchers:
+    """ Patterns watched by users and events waiting to be pushed.
+
+        Attributes
+        ----------
+        push : Callable[[str, str, str], bool]
+            Sends a frame (username, command, data) to port2 of a user
+        delay : float
+            Seconds during which events of a burst are coalesced
+        patterns : dict[str, set[str]]
+            Watched patterns by usernames
+        pending : dict[str, dict[str, dict]]
+            Events waiting to be pushed to users, by usernames and
+            names of files
+        counts : Counter
+            Events, coalesced events, pushed frames and lost frames
+        condition : Condition
+            Protects the dictionaries and wakes the pushing thread
+        stopped : bool
+            Whether the pushing thread was stopped
+        thread : Thread | None
+            The thread which pushes events
+
+        Methods
+        -------
+        start(self)
+            Starts the pushing thread
+        stop(self)
+            Pushes waiting events and stops the thread
+        watch(self, username: str, pattern: str)
+            Lets `username` watch files matching `pattern`
+        unwatch(self, username: str, pattern: str | None = None)
+            Stops `username` watching `pattern` or all patterns
+        forget(self, username: str)
+            Drops patterns and events of `username`
+        notify(self, file_name: str, kind: str, meta: FileMeta | None)
+            Adds an event of `file_name` for users watching it
+        run(self)
+            Pushes events after `delay` until stopped
+        flush(self)
+            Pushes all waiting events
+        snapshot(self)
+            Returns watchers and counters as a dictionary
+    """
+    def __init__(self, push, delay: float = COALESCE_DELAY):
+        self.push = push
+        self.delay = delay
+        self.patterns: dict[str, set[str]] = {}
+        self.pending: dict[str, dict[str, dict]] = {}
+        self.counts = Counter()
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """ Starts the thread which pushes events.
+        """
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name="watch",
+                                       daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """ Pushes waiting events and stops the thread.
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def watch(self, username: str, pattern: str) -> bool:
+        """ Lets `username` watch files matching `pattern`, returns
+            False if the user watches `MAX_WATCHES` patterns already.
+        """
+        with self.condition:
+            patterns = self.patterns.setdefault(username, set())
+            if pattern not in patterns and len(patterns) >= MAX_WATCHES:
+                return False
+            patterns.add(pattern)
+            return True
+
+    def unwatch(self, username: str, pattern: str | None = None) -> bool:
+        """ Stops `username` watching `pattern`, or all patterns if it's
+            None. Returns False if nothing was watched.
+        """
+        with self.condition:
+            patterns = self.patterns.get(username)
+            if not patterns or (pattern is not None and
+                                pattern not in patterns):
+                return False
+            if pattern is None:
+                patterns.clear()
+            else:
+                patterns.discard(pattern)
+            if not patterns:
+                del self.patterns[username]
+                self.pending.pop(username, None)
+            return True
+
+    def forget(self, username: str) -> None:
+        """ Drops patterns and waiting events of `username`.
+        """
+        with self.condition:
+            self.patterns.pop(username, None)
+            self.pending.pop(username, None)
+
+    def notify(self, file_name: str, kind: str,
+               meta: FileMeta | None) -> None:
+        """ Adds the event `kind` of `file_name` with its new metadata
+            (None if it was deleted) for users watching the file, and
+            coalesces it with their waiting event of the file.
+        """
+        with self.condition:
+            if not self.patterns:
+                return None
+            size = meta.size if meta is not None else None
+            version = meta.version if meta is not None else None
+            for username, patterns in self.patterns.items():
+                if not any(fnmatchcase(file_name, pattern)
+                           for pattern in patterns):
+                    continue
+                self.counts["events"] += 1
+                events = self.pending.setdefault(username, {})
+                old = events.get(file_name)
+                if old is not None:
+                    self.counts["coalesced"] += 1
+                    kind_now = merge_kinds(old["event"], kind)
+                else:
+                    kind_now = kind
+                events[file_name] = {"file": file_name, "event": kind_now,
+                                     "size": size, "version": version}
+            if self.pending:
+                self.condition.notify()
+
+    def run(self) -> None:
+        """ Waits for events and pushes them `delay` seconds after the
+            first one came, so a burst is pushed at once, until
+            stopped.
+        """
+        stopped = False
+        while not stopped:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.pending or self.stopped)
+                # Events which come meanwhile are coalesced #
+                self.condition.wait_for(lambda: self.stopped, self.delay)
+                stopped = self.stopped
+            self.flush()
+
+    def flush(self) -> None:
+        """ Pushes all waiting events, one frame per user.
+        """
+        with self.condition:
+            pending, self.pending = self.pending, {}
+        for username, events in pending.items():
+            data = json.dumps(list(events.values()))
+            try:
+                pushed = self.push(username, WATCH, data)
+            except Exception as exc:
+                logging.error("Changes cannot be pushed to %s: %s",
+                              username, exc)
+                pushed = False
+            with self.condition:
+                self.counts["pushed" if pushed else "lost"] += 1
+
+    def snapshot(self) -> dict:
+        """ Returns watchers and counters as a dictionary.
+        """
+        with self.condition:
+            return {"watchers": len(self.patterns),
+                    "patterns": sum(map(len, self.patterns.values())),
+                    "counts": dict(self.counts)}
@@ -0,0 +1,681 @@
+""" The module runs server in several worker processes, so that clients
+    are served by more than one CPU core.
+
+    Every worker is a whole `Server` which listens at the same ports
+    with SO_REUSEPORT, so the kernel spreads new connections among
+    workers. State which must be shared lives in a hub of the
+    supervisor process, which workers reach over a Unix socket:
+      - sessions of all clients, so a username is taken only once and
+        a session can be resumed at any worker
+      - the worker which holds the port2 socket of every client, so a
+        MESSAGE (or a frame like TAIL) is routed to the worker which 
+        can push it
+      - the last PONG of every client, as the worker which reaps idle
+        clients (the one serving port1) often doesn't hold port2
+      - changes of files, which are broadcast to the other workers, so
+        their file indexes and quota usage stay in sync
+
+    Files are written under a lock which is shared by all workers.
+    Every worker saves its own statistics and access log, and serves
+    metrics at `metrics_port` + its index.
+
+    This module is not intended to be runned!
+
+    Used built-in modules
+    ---------------------
+    os, time, fcntl, signal, shutil, logging, secrets, tempfile,
+    threading, multiprocessing
+
+    Used custom modules
+    -------------------
+    sessions, server, access_log, logs
+
+    Functions
+    ---------
+    run_worker(index: int, settings: dict, address: str, authkey: bytes)
+        Runs one worker process
+
+    Classes
+    -------
+    Class ProcessLock:
+        A lock which is shared by threads and processes
+    Class RemoteSessions:
+        Calls methods of the sessions kept by the hub
+    Class HubClient:
+        The connection of a worker to the hub
+    Class Hub:
+        Sessions and routes shared by all workers
+    Class Supervisor:
+        Starts the hub and the workers and restarts crashed workers
+"""
+
+import os
+import time
+import fcntl
+import signal
+import shutil
+import logging
+import secrets
+import tempfile
+import threading
+import multiprocessing
+from multiprocessing.connection import Listener, Client, Connection, wait
+
+from .sessions import SessionManager
+from .server import Server, RESUME_WINDOW, MAX_PENDING_MESSAGES, \
+    DRAIN_TIMEOUT
+from .access_log import ACCESS_LOG_DIR
+from . import logs
+
+WORKERS = 1              # Processes serving clients, 1 runs no supervisor
+LOCK_FILE = os.path.join("server", "__lock__")
+RESPAWN_DELAY = 1.0      # Seconds before a crashed worker is started again
+MIN_UPTIME = 5.0         # Workers dying sooner aren't started again
+# Methods of `SessionManager` which workers may call #
+SESSION_METHODS = frozenset({
+    "create_if_new", "detach", "resume", "is_attached", "exists",
+    "queue_message", "pop_pending", "pending_count", "attached", "remove",
+    "expire",
+})
+
+
+class ProcessLock:
+    """ A lock which is shared by threads and processes: a thread holds
+        the lock of its process and then the `flock` of a file.
+
+        Attributes
+        ----------
+        path : str
+            The locked file
+        lock : Lock
+            The lock of threads of this process
+        fd : int
+            The descriptor of the locked file
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        except BaseException:
+            self.lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.lock.release()
+
+
+class RemoteSessions:
+    """ Calls methods of the sessions kept by the hub, it's used by a
+        worker instead of its own `SessionManager`.
+
+        Attributes
+        ----------
+        hub : HubClient
+            The connection to the hub
+    """
+    def __init__(self, hub: "HubClient"):
+        self.hub = hub
+
+    def __getattr__(self, name: str):
+        if name not in SESSION_METHODS:
+            raise AttributeError(name)
+        return lambda *args: self.hub.call("sessions", name, *args)
+
+
+class HubClient:
+    """ The connection of a worker to the hub.
+
+        Requests are sent over `calls` and wait for their replies, while
+        events of other workers come over `events` and are handled by a
+        background thread.
+
+        Attributes
+        ----------
+        index : int
+            The index of the worker
+        calls : Connection
+            The connection of requests and replies
+        events : Connection
+            The connection of events sent by the hub
+        lock : Lock
+            Serializes requests of different threads
+        sessions : RemoteSessions
+            Sessions kept by the hub
+        server : Server | None
+            The server of the worker, which handles events
+        thread : Thread | None
+            The thread which handles events
+
+        Methods
+        -------
+        call(self, *request)
+            Sends a request to the hub and returns its reply
+        push(self, username: str, message: str)
+            Lets the worker which holds port2 of `username` push it
+        push_frame(self, username: str, command: str, data: str)
+            Lets the worker which holds port2 of `username` push a frame
+        report_activity(self, username: str)
+            Tells that a PONG of `username` was received
+        last_activity(self, username: str)
+            Returns monotonic time of the last reported PONG
+        attach_port2(self, username: str)
+            Tells that port2 of `username` is held by this worker
+        drop_port2(self, username: str)
+            Tells that port2 of `username` was closed
+        file_changed(self, file_name: str, username: str | None,
+            replace: bool)
+            Tells the other workers that `file_name` was modified
+        serve_events(self, server: Server)
+            Starts handling events for `server`
+        handle_events(self)
+            Handles events until the hub closes the connection
+        handle_push(self, username: str, message: str)
+            Pushes a message routed from another worker
+        handle_push_frame(self, username: str, command: str, data: str)
+            Pushes a frame routed from another worker
+        close(self)
+            Closes the connections to the hub
+    """
+    def __init__(self, index: int, address: str, authkey: bytes):
+        self.index = index
+        self.calls = Client(address, "AF_UNIX", authkey=authkey)
+        self.calls.send(("calls", index))
+        self.events = Client(address, "AF_UNIX", authkey=authkey)
+        self.events.send(("events", index))
+        self.lock = threading.Lock()
+        self.sessions = RemoteSessions(self)
+        self.server: Server | None = None
+        self.thread: threading.Thread | None = None
+
+    def call(self, *request):
+        """ Sends a request to the hub and returns its reply.
+
+            Raises
+            ------
+            RuntimeError
+                If the hub failed to serve the request
+        """
+        with self.lock:
+            self.calls.send(request)
+            ok, reply = self.calls.recv()
+        if not ok:
+            raise RuntimeError(reply)
+        return reply
+
+    def push(self, username: str, message: str) -> bool:
+        """ Lets the worker which holds port2 of `username` push
+            `message`, returns False if no worker holds it.
+        """
+        return self.call("push", username, message)
+
+    def push_frame(self, username: str, command: str, data: str) -> bool:
+        """ Lets the worker which holds port2 of `username` push the
+            frame `command` with `data`, returns False if no worker 
+            holds it.
+        """
+        return self.call("push_frame", username, command, data)
+
+    def report_activity(self, username: str) -> None:
+        """ Tells that a PONG of `username` was received at port2 held
+            by this worker.
+        """
+        self.call("activity", username)
+
+    def last_activity(self, username: str) -> float:
+        """ Returns monotonic time of the last PONG of `username`
+            reported by any worker, 0 if there was none.
+        """
+        return self.call("last_activity", username)
+
+    def attach_port2(self, username: str) -> None:
+        """ Tells that port2 of `username` is held by this worker.
+        """
+        self.call("attach_port2", username)
+
+    def drop_port2(self, username: str) -> None:
+        """ Tells that port2 of `username` was closed.
+        """
+        self.call("drop_port2", username)
+
+    def file_changed(self, file_name: str, username: str | None,
+                     replace: bool) -> None:
+        """ Tells the other workers that `file_name` was modified.
+        """
+        self.call("file_changed", file_name, username, replace)
+
+    def serve_events(self, server: Server) -> None:
+        """ Starts handling events for `server` in a background thread.
+        """
+        self.server = server
+        self.thread = threading.Thread(target=self.handle_events,
+                                       name="hub-events", daemon=True)
+        self.thread.start()
+
+    def handle_events(self) -> None:
+        """ Handles events until the hub closes the connection.
+        """
+        while True:
+            try:
+                event = self.events.recv()
+            except (EOFError, OSError):
+                break
+            try:
+                if event[0] == "push":
+                    self.handle_push(*event[1:])
+                elif event[0] == "push_frame":
+                    self.handle_push_frame(*event[1:])
+                elif event[0] == "file_changed":
+                    self.server.file_updated(*event[1:])
+            except Exception as exc:
+                logging.error("Event %s failed: %s", event[0], exc)
+
+    def handle_push(self, username: str, message: str) -> None:
+        """ Pushes a message routed from another worker. If port2 of
+            the receiver was lost meanwhile, the message is queued for
+            its session.
+        """
+        entry = self.server.clients_port2.get(username)
+        if entry is not None:
+            try:
+                self.server.push_message(entry[0], message)
+                return None
+            except OSError:
+                self.server.delete_client_data(username, entry[0])
+        if not self.sessions.queue_message(username, message):
+            logging.error("Message to %s was lost", username)
+
+    def handle_push_frame(self, username: str, command: str, 
+                          data: str) -> None:
+        """ Pushes a frame routed from another worker. Unlike messages,
+            frames are dropped if port2 of the receiver was lost.
+        """
+        entry = self.server.clients_port2.get(username)
+        if entry is None:
+            return None
+        try:
+            self.server.push_frame(entry[0], command, data)
+        except OSError:
+            self.server.delete_client_data(username, entry[0])
+
+    def close(self) -> None:
+        """ Closes the connections to the hub.
+        """
+        self.calls.close()
+        self.events.close()
+
+
+class Hub:
+    """ Sessions and routes shared by all workers, it runs in threads of
+        the supervisor.
+
+        Attributes
+        ----------
+        listener : Listener
+            Accepts connections of workers at a Unix socket
+        sessions : SessionManager
+            Sessions of all clients
+        owners : dict[str, int]
+            Workers serving port1 of attached sessions by usernames
+        port2 : dict[str, int]
+            Workers holding port2 sockets by usernames
+        activity : dict[str, float]
+            Monotonic time of the last PONG of clients by usernames,
+            the clock is shared by processes of one host
+        events : dict[int, tuple[Connection, Lock]]
+            Connections of events by indexes of workers
+        lock : Lock
+            The lock which protects the dictionaries
+        closed : bool
+            Whether the hub was closed
+
+        Methods
+        -------
+        start(self)
+            Starts accepting workers
+        accept_workers(self)
+            Accepts connections of workers until the hub is closed
+        serve_worker(self, index: int, conn: Connection)
+            Serves requests of a worker until it exits
+        handle(self, index: int, request: tuple)
+            Serves one request of a worker
+        call_sessions(self, index: int, method: str, args: tuple)
+            Calls a method of `sessions` and tracks owners
+        send_event(self, index: int, event: tuple)
+            Sends an event to a worker
+        worker_lost(self, index: int)
+            Detaches sessions and drops routes of an exited worker
+        close(self)
+            Stops accepting workers
+    """
+    def __init__(self, address: str, authkey: bytes, resume_window: float,
+                 max_pending: int):
+        self.listener = Listener(address, "AF_UNIX", authkey=authkey)
+        self.sessions = SessionManager(resume_window, max_pending)
+        self.owners: dict[str, int] = {}
+        self.port2: dict[str, int] = {}
+        self.activity: dict[str, float] = {}
+        self.events: dict[int, tuple[Connection, threading.Lock]] = {}
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def start(self) -> None:
+        """ Starts accepting workers in a background thread.
+        """
+        threading.Thread(target=self.accept_workers, name="hub",
+                         daemon=True).start()
+
+    def accept_workers(self) -> None:
+        """ Accepts connections of workers until the hub is closed. A
+            worker opens one connection of requests and one of events.
+        """
+        while True:
+            try:
+                conn = self.listener.accept()
+                kind, index = conn.recv()
+            except Exception as exc:
+                if self.closed:
+                    break
+                logging.error("Hub refused a worker: %s", exc)
+                continue
+            if kind == "events":
+                with self.lock:
+                    self.events[index] = (conn, threading.Lock())
+            else:
+                threading.Thread(target=self.serve_worker,
+                                 args=[index, conn], name=f"hub-{index}",
+                                 daemon=True).start()
+
+    def serve_worker(self, index: int, conn: Connection) -> None:
+        """ Serves requests of a worker until it exits.
+        """
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                break
+            try:
+                reply = (True, self.handle(index, request))
+            except Exception as exc:
+                logging.error("Request %s of worker %d failed: %s",
+                              request[0], index, exc)
+                reply = (False, str(exc))
+            try:
+                conn.send(reply)
+            except OSError:
+                break
+        conn.close()
+        self.worker_lost(index)
+
+    def handle(self, index: int, request: tuple):
+        """ Serves one request of the worker `index` and returns the
+            reply.
+        """
+        kind, *args = request
+        if kind == "sessions":
+            return self.call_sessions(index, args[0], args[1:])
+        if kind == "attach_port2":
+            with self.lock:
+                self.port2[args[0]] = index
+        elif kind == "drop_port2":
+            with self.lock:
+                if self.port2.get(args[0]) == index:
+                    del self.port2[args[0]]
+                    self.activity.pop(args[0], None)
+        elif kind == "activity":
+            with self.lock:
+                self.activity[args[0]] = time.monotonic()
+        elif kind == "last_activity":
+            with self.lock:
+                return self.activity.get(args[0], 0.0)
+        elif kind in ("push", "push_frame"):
+            target = self.port2.get(args[0])
+            return target is not None and \
+                self.send_event(target, (kind, *args))
+        elif kind == "file_changed":
+            for other in list(self.events):
+                if other != index:
+                    self.send_event(other, ("file_changed", *args))
+        else:
+            raise ValueError(f"Unknown request {kind!r}")
+        return None
+
+    def call_sessions(self, index: int, method: str, args: tuple):
+        """ Calls `method` of `sessions` for the worker `index` and
+            tracks which worker owns attached sessions.
+        """
+        if method not in SESSION_METHODS:
+            raise ValueError(f"Unknown method {method!r}")
+        result = getattr(self.sessions, method)(*args)
+        with self.lock:
+            if method in ("create_if_new", "resume") and result:
+                self.owners[args[0]] = index
+            elif method in ("detach", "remove"):
+                self.owners.pop(args[0], None)
+        return result
+
+    def send_event(self, index: int, event: tuple) -> bool:
+        """ Sends `event` to the worker `index`, returns False if the
+            worker is gone.
+        """
+        entry = self.events.get(index)
+        if entry is None:
+            return False
+        conn, lock = entry
+        try:
+            with lock:
+                conn.send(event)
+        except OSError:
+            return False
+        return True
+
+    def worker_lost(self, index: int) -> None:
+        """ Detaches sessions and drops routes of the worker `index`,
+            which exited, so that its clients can resume elsewhere.
+        """
+        with self.lock:
+            entry = self.events.pop(index, None)
+            lost = [username for username, owner in self.owners.items()
+                    if owner == index]
+            for username in lost:
+                del self.owners[username]
+            for username, owner in list(self.port2.items()):
+                if owner == index:
+                    del self.port2[username]
+        if entry is not None:
+            entry[0].close()
+        for username in lost:
+            self.sessions.detach(username)
+        if lost:
+            logging.info("Worker %d exited, detached %d sessions", index,
+                         len(lost))
+
+    def close(self) -> None:
+        """ Stops accepting workers.
+        """
+        self.closed = True
+        self.listener.close()
+
+
+def run_worker(index: int, settings: dict, address: str,
+               authkey: bytes) -> None:
+    """ Runs one worker process: a server which shares its ports,
+        sessions and the file lock with the other workers.
+
+        Parameters
+        ----------
+        index : int
+            The index of the worker
+        settings : dict
+            Keyword arguments of `Server`
+        address : str
+            The address of the hub
+        authkey : bytes
+            The secret which workers present to the hub
+
+        Returns
+        -------
+        None
+    """
+    # Ctrl+C reaches the whole group, the supervisor stops workers #
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logs.stream_handler.setFormatter(
+        logging.Formatter(f"[worker-{index}] {logs.LOG_FORMAT}"))
+    settings = dict(settings)
+    if settings.get("metrics_port") is not None:
+        settings["metrics_port"] += index
+    server = Server(reuse_port=True, **settings)
+    hub = HubClient(index, address, authkey)
+    server.peers = hub
+    server.sessions = hub.sessions
+    server.file_lock = ProcessLock(LOCK_FILE)
+    server.stats_file = os.path.join("server",
+                                     f"__stats__.worker-{index}.json")
+    server.access_log.directory = os.path.join(ACCESS_LOG_DIR,
+                                               f"worker-{index}")
+    hub.serve_events(server)
+    try:
+        server.start()
+    finally:
+        hub.close()
+
+
+class Supervisor:
+    """ Starts the hub and the workers and restarts crashed workers.
+
+        Workers are started with the "spawn" method, as forking a
+        process which runs the threads of the hub could copy locks held
+        by them.
+
+        Attributes
+        ----------
+        settings : dict
+            Keyword arguments of `Server`
+        count : int
+            The number of workers
+        drain_timeout : float
+            Seconds which workers have to drain on shutdown
+        directory : str
+            The temporary directory of the hub's socket
+        address : str
+            The address of the hub
+        authkey : bytes
+            The secret which workers present to the hub
+        hub : Hub
+            Sessions and routes shared by workers
+        context : SpawnContext
+            Creates worker processes
+        processes : dict[int, Process]
+            Workers by their indexes
+        started_at : dict[int, float]
+            Monotonic time when workers were started
+
+        Methods
+        -------
+        start(self)
+            Runs workers until SIGINT or SIGTERM
+        spawn(self, index: int)
+            Starts the worker `index`
+        monitor(self)
+            Restarts workers which exited
+        stop(self)
+            Stops workers, letting them drain, and the hub
+        handle_shutdown_signal(self, signum: int, frame)
+            Stops the supervisor on SIGTERM
+    """
+    def __init__(self, settings: dict, count: int):
+        self.settings = settings
+        self.count = count
+        self.drain_timeout = settings.get("drain_timeout", DRAIN_TIMEOUT)
+        self.directory = tempfile.mkdtemp(prefix="os-server-")
+        self.address = os.path.join(self.directory, "hub.sock")
+        self.authkey = secrets.token_bytes(32)
+        self.hub = Hub(self.address, self.authkey,
+                       settings.get("resume_window", RESUME_WINDOW),
+                       settings.get("max_pending_messages",
+                                    MAX_PENDING_MESSAGES))
+        self.context = multiprocessing.get_context("spawn")
+        self.processes: dict[int, multiprocessing.Process] = {}
+        self.started_at: dict[int, float] = {}
+
+    def start(self) -> None:
+        """ Runs workers until SIGINT or SIGTERM, then stops them.
+        """
+        logs.configure_logging(logging.INFO)
+        logs.start_logging()
+        try:
+            signal.signal(signal.SIGTERM, self.handle_shutdown_signal)
+        except ValueError:
+            logging.debug("SIGTERM is not handled")
+        self.hub.start()
+        try:
+            for index in range(self.count):
+                self.spawn(index)
+            logging.info("Supervisor runs %d workers", self.count)
+            self.monitor()
+        except KeyboardInterrupt:
+            logging.info("Supervisor is shutting down...")
+        except Exception as exc:
+            logging.error("%s", exc)
+        finally:
+            self.stop()
+            logs.stop_logging()
+
+    def spawn(self, index: int) -> None:
+        """ Starts the worker `index`.
+        """
+        process = self.context.Process(
+            target=run_worker, name=f"worker-{index}",
+            args=(index, self.settings, self.address, self.authkey))
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.monotonic()
+
+    def monitor(self) -> None:
+        """ Restarts workers which exited. A worker which exits right
+            after its start (e.g. its port is taken) stops the
+            supervisor instead.
+        """
+        while True:
+            sentinels = {process.sentinel: index for index, process in
+                         self.processes.items()}
+            for sentinel in wait(list(sentinels)):
+                index = sentinels[sentinel]
+                process = self.processes[index]
+                process.join()
+                uptime = time.monotonic() - self.started_at[index]
+                logging.error("Worker %d exited with code %s", index,
+                              process.exitcode)
+                if uptime < MIN_UPTIME:
+                    raise RuntimeError(f"Worker {index} failed to start")
+                time.sleep(RESPAWN_DELAY)
+                self.spawn(index)
+
+    def stop(self) -> None:
+        """ Stops workers with SIGTERM, so that they drain, kills the
+            ones which don't exit in time and stops the hub.
+        """
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.drain_timeout + 5
+        for process in self.processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logging.error("Worker %s didn't drain, it's killed",
+                              process.name)
+                process.kill()
+                process.join()
+        self.hub.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def handle_shutdown_signal(self, signum: int, frame) -> None:
+        """ Stops the supervisor on SIGTERM, like on Ctrl+C.
+        """
+        raise KeyboardInterrupt
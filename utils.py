@@ -5,20 +5,59 @@
 
     Used built-in modules
     ---------------------
-    socket
+    hmac, socket, codecs, hashlib, secrets
 
     Defined functions
     -----------------
     send_msg_through_socket(sock: socket, message: str)
         Sends a given `message` through a given `sock` object
+    missing_bytes(data: bytes) -> int
+        Returns how many bytes are missing to the last UTF-8 character
+        of `data`
     receive_msg(sock: socket, buffer_size: int)
         Receives `BUF_SIZE` bytes from `sock`
     receive_whole_data(sock: socket, buffer_size: int) -> str:
         Receives whole data sent from `sock` with size of 
         (data + space + data content)
+    receive_remaining_data(sock: socket, buffer_size: int, msg: str) -> str
+        Receives the rest of (data size + space + data content), when
+        `msg` is its already received beginning
+    receive_exactly(sock: socket, buffer_size: int, size: int, 
+        decoder: IncrementalDecoder) -> list[str]
+        Receives `size` characters with chunks adapted to the transfer
+    skip_remaining_data(sock: socket, buffer_size: int, msg: str)
+        Receives and drops the rest of (data size + space + data 
+        content), when `msg` is its already received beginning
+    content_checksum(content: str) -> str
+        Returns the checksum of a file content as it is transferred
+    tune_socket(sock: socket, nodelay: bool, keepalive: bool,
+        keepalive_idle: int | None, send_buffer: int | None,
+        receive_buffer: int | None)
+        Sets TCP options of `sock`
+    authenticate_peer(sock: socket, reader: FrameReader, secret: str,
+        initiator: bool)
+        Proves to the other side of a connection between servers that
+        the shared `secret` is known and checks that it knows it too
+
+    Defined classes
+    ---------------
+    FrameReader
+        Reads (command + space + data size + space + data content) 
+        frames one by one from a socket
 """
 
-from socket import socket
+import hmac
+import codecs
+import hashlib
+import secrets
+import socket as socket_module
+from socket import socket, SOL_SOCKET, SO_KEEPALIVE, SO_SNDBUF, SO_RCVBUF, \
+    IPPROTO_TCP, TCP_NODELAY
+
+# The first chunk of a transfer is at most `MAX_INITIAL_CHUNK` bytes and
+# it is doubled up to `MAX_CHUNK` while `recv` keeps filling it #
+MAX_INITIAL_CHUNK = 256 * 1024
+MAX_CHUNK = 4 * 1024 * 1024
 
 
 def send_msg_through_socket(sock: socket, message: str):
@@ -36,8 +75,43 @@ def send_msg_through_socket(sock: socket, message: str):
     sock.sendall(message.encode())
 
 
+def missing_bytes(data: bytes) -> int:
+    """ Returns how many bytes are missing to the last UTF-8 character
+        of `data`, 0 if it ends with a whole character.
+
+        Parameters
+        ----------
+        data : bytes
+            Received UTF-8 data
+
+        Returns
+        -------
+        int
+            Number of bytes which complete the last character
+    """
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte & 0xC0 == 0x80:
+            # A continuation byte, the first byte of the character is
+            # further back #
+            continue
+        if byte >> 5 == 0b110:
+            length = 2
+        elif byte >> 4 == 0b1110:
+            length = 3
+        elif byte >> 3 == 0b11110:
+            length = 4
+        else:
+            length = 1
+        return max(length - back, 0)
+    return 0
+
+
 def receive_msg(sock: socket, buffer_size: int) -> str:
-    """ Receives `BUF_SIZE` bytes from `sock`.
+    """ Receives `BUF_SIZE` bytes from `sock`. A character which is
+        split by the end of the buffer is completed by receiving its
+        missing bytes, so the message is counted in whole characters
+        and data which follows it is not broken.
 
         Parameters
         ----------
@@ -51,8 +125,16 @@ def receive_msg(sock: socket, buffer_size: int) -> str:
         str
             the encoded message.
     """
-    msg = sock.recv(buffer_size).decode()
-    return msg
+    data = sock.recv(buffer_size)
+    # Checked only if the message doesn't end with an ASCII byte #
+    missing = missing_bytes(data) if data and data[-1] > 0x7F else 0
+    while missing:
+        rest = sock.recv(missing)
+        if not rest:
+            break
+        data += rest
+        missing -= len(rest)
+    return data.decode()
 
 
 def receive_whole_data(sock: socket, buffer_size: int) -> str:
@@ -71,19 +153,297 @@ def receive_whole_data(sock: socket, buffer_size: int) -> str:
         str
             the whole received data.
     """
-    msg = sock.recv(buffer_size).decode().split(maxsplit=1)
+    msg = receive_msg(sock, buffer_size)
+    return receive_remaining_data(sock, buffer_size, msg)
+
+
+def receive_remaining_data(sock: socket, buffer_size: int, msg: str) -> str:
+    """ Receives the rest of (data size + space + data content), when 
+        `msg` is its already received beginning.
+
+        Parameters
+        ----------
+        sock : str
+            the socket object from which we're receiving data
+        buffer_size : int
+            The buffer size of a receiver
+        msg : str
+            The beginning of data which was received before
+
+        Returns
+        -------
+        str
+            the whole received data.
+    """
+    msg = msg.split(" ", 1)
     try:
         msg_size = int(msg[0])
         msg_data = msg[1]
     except ValueError:
         return " ".join(msg)
-        
-    received_bytes = len(msg_data)
-    total_received_bytes = received_bytes
-    whole_message = msg_data
-    while total_received_bytes < msg_size:
-        msg = sock.recv(buffer_size).decode()
-        received_bytes = len(msg)
-        whole_message += msg
-        total_received_bytes += received_bytes      
-    return whole_message
+    if len(msg_data) >= msg_size:
+        return msg_data
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = receive_exactly(sock, buffer_size, msg_size - len(msg_data),
+                             decoder)
+    chunks.insert(0, msg_data)
+    return "".join(chunks)
+
+
+def receive_exactly(sock: socket, buffer_size: int, size: int,
+                    decoder: codecs.IncrementalDecoder) -> list[str]:
+    """ Receives `size` characters from `sock`, without reading bytes
+        which follow them.
+
+        Sizes of chunks are adapted to the transfer: the first chunk 
+        fits the expected data (at least `buffer_size` and at most
+        `MAX_INITIAL_CHUNK` bytes), and the chunk is doubled up to
+        `MAX_CHUNK` whenever `recv` fills it, i.e. data comes faster
+        than it's read. So a short reply costs one small `recv`, while
+        a large file is read with a few large ones. Data is received to
+        one reused buffer and decoded incrementally, so characters
+        split between two chunks are decoded correctly.
+
+        Parameters
+        ----------
+        sock : socket
+            The socket object from which we're receiving data
+        buffer_size : int
+            The buffer size of a receiver, the smallest chunk
+        size : int
+            Number of characters to receive
+        decoder : IncrementalDecoder
+            The UTF-8 decoder of received bytes
+
+        Returns
+        -------
+        list[str]
+            Decoded chunks, which together have `size` characters
+
+        Raises
+        ------
+        ConnectionError
+            If the connection is closed before all data is received
+    """
+    # A character takes at least one byte, so receiving at most as many
+    # bytes as the remaining characters never reads the next message #
+    chunk_size = min(max(size, buffer_size), MAX_INITIAL_CHUNK)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    chunks = []
+    while size > 0:
+        requested = min(size, chunk_size)
+        received = sock.recv_into(view[:requested])
+        if not received:
+            raise ConnectionError("Connection closed during transfer")
+        chunk = decoder.decode(view[:received])
+        chunks.append(chunk)
+        size -= len(chunk)
+        if received == chunk_size and chunk_size < MAX_CHUNK:
+            chunk_size = min(chunk_size * 2, MAX_CHUNK)
+            buffer = bytearray(chunk_size)
+            view = memoryview(buffer)
+    return chunks
+
+
+def skip_remaining_data(sock: socket, buffer_size: int, msg: str) -> None:
+    """ Receives and drops the rest of (data size + space + data 
+        content), when `msg` is its already received beginning, so that
+        a refused transfer doesn't break the next message.
+
+        Data is dropped in parts of at most `MAX_CHUNK` characters, so 
+        a large transfer doesn't fill the memory.
+
+        Raises
+        ------
+        ConnectionError
+            If the connection is closed before all data is received
+    """
+    msg = msg.split(" ", 1)
+    try:
+        remaining = int(msg[0]) - len(msg[1])
+    except (ValueError, IndexError):
+        return None
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while remaining > 0:
+        part = min(remaining, MAX_CHUNK)
+        receive_exactly(sock, buffer_size, part, decoder)
+        remaining -= part
+
+
+def content_checksum(content: str) -> str:
+    """ Returns the checksum of a file content as it is transferred.
+
+        Parameters
+        ----------
+        content : str
+            The content of a file
+
+        Returns
+        -------
+        str
+            Hexadecimal digest of the encoded content
+    """
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+def tune_socket(sock: socket, nodelay: bool = True, keepalive: bool = True,
+                keepalive_idle: int | None = None,
+                send_buffer: int | None = None,
+                receive_buffer: int | None = None) -> None:
+    """ Sets TCP options of `sock`.
+
+        Commands and replies are small and often sent as two writes
+        (e.g. MESSAGE), so Nagle's algorithm would hold the second write
+        until the first one is acknowledged, and delayed ACKs make it
+        wait tens of milliseconds. `nodelay` turns Nagle's algorithm off.
+        Buffer sizes are left to the system when they're None; on Linux
+        this keeps the automatic tuning of buffers, which is disabled
+        once a size is set.
+
+        Parameters
+        ----------
+        sock : socket
+            A TCP socket
+        nodelay : bool, optional
+            Whether to set TCP_NODELAY (default is True)
+        keepalive : bool, optional
+            Whether to set SO_KEEPALIVE, so dead peers are detected
+            (default is True)
+        keepalive_idle : int | None, optional
+            Seconds of idleness before keepalive probes are sent, where
+            the system supports TCP_KEEPIDLE (default is None, the 
+            system's value)
+        send_buffer : int | None, optional
+            SO_SNDBUF in bytes (default is None, the system's value)
+        receive_buffer : int | None, optional
+            SO_RCVBUF in bytes (default is None, the system's value)
+
+        Returns
+        -------
+        None
+    """
+    sock.setsockopt(IPPROTO_TCP, TCP_NODELAY, int(nodelay))
+    sock.setsockopt(SOL_SOCKET, SO_KEEPALIVE, int(keepalive))
+    if keepalive and keepalive_idle and \
+            hasattr(socket_module, "TCP_KEEPIDLE"):
+        sock.setsockopt(IPPROTO_TCP, socket_module.TCP_KEEPIDLE, 
+                        keepalive_idle)
+    if send_buffer:
+        sock.setsockopt(SOL_SOCKET, SO_SNDBUF, send_buffer)
+    if receive_buffer:
+        sock.setsockopt(SOL_SOCKET, SO_RCVBUF, receive_buffer)
+
+
+def authenticate_peer(sock: socket, reader: "FrameReader", secret: str,
+                      initiator: bool) -> None:
+    """ Proves to the other side of a connection between servers that
+        the shared `secret` is known and checks that it knows it too.
+
+        Both sides send a CHALLENGE frame with a random nonce and answer
+        the nonce of the other side by an AUTH frame with its HMAC, so
+        the secret itself is never sent. The side which connected
+        (`initiator`) and the side which accepted answer with different
+        digests, so a challenge cannot be reflected back.
+
+        Parameters
+        ----------
+        sock : socket
+            The connection to the other server
+        reader : FrameReader
+            Reads frames from `sock`
+        secret : str
+            The secret shared by both servers
+        initiator : bool
+            Whether this side opened the connection
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ConnectionError
+            If the other side doesn't know the secret or disconnected
+    """
+    key = secret.encode()
+
+    def answer(nonce: str, role: str) -> str:
+        return hmac.new(key, f"{role} {nonce}".encode(),
+                        hashlib.sha256).hexdigest()
+
+    nonce = secrets.token_hex(16)
+    sock.sendall(f"CHALLENGE {len(nonce)} {nonce}".encode())
+    frame = reader.read_frame()
+    if frame is None or frame[0] != "CHALLENGE":
+        raise ConnectionError("no challenge")
+    digest = answer(frame[1], "connect" if initiator else "accept")
+    sock.sendall(f"AUTH {len(digest)} {digest}".encode())
+    frame = reader.read_frame()
+    expected = answer(nonce, "accept" if initiator else "connect")
+    if frame is None or frame[0] != "AUTH" or \
+            not hmac.compare_digest(frame[1], expected):
+        raise ConnectionError("authentication failed")
+
+
+class FrameReader:
+    """ Reads (command + space + data size + space + data content) 
+        frames one by one from a socket.
+
+        Unlike `receive_whole_data`, bytes received after the end of a
+        frame are kept for the next frame, so frames which were sent 
+        back to back are not mixed up.
+
+        Attributes
+        ----------
+        sock : socket
+            The socket object from which frames are received
+        buffer_size : int
+            The buffer size of a receiver
+        decoder : IncrementalDecoder
+            Decodes received bytes, even if a character is split 
+            between two `recv` calls
+        buffer : str
+            Received data which doesn't belong to returned frames yet
+
+        Methods
+        -------
+        read_frame(self)
+            Receives the next frame from `sock`
+    """
+    def __init__(self, sock: socket, buffer_size: int):
+        self.sock = sock
+        self.buffer_size = buffer_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+
+    def read_frame(self) -> tuple[str, str] | None:
+        """ Receives the next frame from `sock`.
+
+            Returns
+            -------
+            tuple[str, str]
+                The command and the data content of the frame
+            None
+                If the connection was closed
+        """
+        header = self.buffer.split(" ", 2)
+        while len(header) < 3:
+            data = self.sock.recv(self.buffer_size)
+            if not data:
+                return None
+            self.buffer += self.decoder.decode(data)
+            header = self.buffer.split(" ", 2)
+        command, size, rest = header
+        size = int(size)
+        if len(rest) >= size:
+            self.buffer = rest[size:]
+            return command, rest[:size]
+        try:
+            chunks = receive_exactly(self.sock, self.buffer_size, 
+                                     size - len(rest), self.decoder)
+        except ConnectionError:
+            return None
+        chunks.insert(0, rest)
+        self.buffer = ""
+        return command, "".join(chunks)